@@ -0,0 +1,419 @@
+"""
+SSH load benchmark for the honeypot.
+Starts the honeypot in a child process (AI off or backed by a fake streaming LLM),
+drives it with concurrent paramiko clients and prints the results as JSON.
+
+usage: python3 benchmark/ssh_load.py [--mode threaded|async] [--scenarios auth_spray,recon]
+                                     [--sessions 200] [--concurrency 50] [--output results.json]
+"""
+import argparse, json, logging, multiprocessing, os, shutil, signal, socket, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+# add parent directory to sys.path for imports
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+sys.path.append(parent_dir)
+
+import paramiko
+from config import USERNAME, PASSWORD
+from utils.command_utils import NATIVE_COMMANDS
+
+SCENARIO_NAMES = ["auth_spray", "recon", "interactive", "ping", "ai_stream"]
+
+# commands a typical bot runs right after logging in
+RECON_COMMANDS = ["uname -a", "whoami", "pwd", "ls -la", "cat /etc/passwd", "ps", "ifconfig"]
+# a slower human-like session cycles through these
+INTERACTIVE_COMMANDS = ["ls", "cd /tmp", "pwd", "echo hello > notes.txt", "cat notes.txt", "cd ~", "ls -la", "date"]
+# non-native commands answered by the (fake) LLM
+AI_COMMANDS = ["netstat -tulpn", "lsof -i", "df -h"]
+SPRAY_PASSWORDS = ["123456", "admin", "root", "password1", "qwerty"]
+
+
+class FakeLLM:
+    """Stands in for the AI backend, streams a canned answer at a fixed token rate"""
+    def __init__(self, tokens, interval, known_commands):
+        self.tokens = tokens
+        self.interval = interval
+        self.known_commands = known_commands
+        self.initialized = True
+
+    def is_native_command(self, command):
+        # same split as the AI integration, unknown commands get "command not found" natively
+        parts = command.split()
+        return not parts or parts[0] in NATIVE_COMMANDS or parts[0] not in self.known_commands
+
+    def execute_command(self, session_id, command, token_callback=None, cancel_token=None):
+        output = []
+        for i in range(self.tokens):
+            if cancel_token is not None and cancel_token.cancelled:
+                break
+            token = f"tok{i}\n" if i % 8 == 7 else f"tok{i} "
+            output.append(token)
+            if token_callback:
+                token_callback(token)
+            time.sleep(self.interval)
+        return "".join(output)
+
+
+def run_server(port, mode, llm, llm_tokens, llm_interval, work_dir):
+    """Child process entry point running the honeypot on localhost"""
+    import core.database as database
+    from utils.log_setup import logger
+
+    # keep benchmark sessions out of the real database and the console quiet
+    database.DB_FILE = os.path.join(work_dir, "bench.db")
+    logger.setLevel(logging.WARNING)
+    database.init_db()
+
+    from core.virtual_filesystem import VirtualFilesystem
+    from core.command_processor import CommandProcessor
+    from core.capture import CaptureStore
+
+    # session directories, the base image and captured payloads stay out of the repo too
+    filesystem = VirtualFilesystem(os.path.join(work_dir, "fake_filesystem"))
+    filesystem.captures = CaptureStore(os.path.join(work_dir, "captures"))
+    command_processor = CommandProcessor(filesystem)
+    if llm == "fake":
+        # the session loop streams any command the smart_rag hook marks as non-native,
+        # native ones keep going to the real handlers like with the AI integration
+        fake = FakeLLM(llm_tokens, llm_interval, command_processor.known_commands)
+        command_processor.smart_rag = fake
+        original_execute = command_processor.execute_command
+
+        def execute_command(session_id, command, token_callback=None, cancel_token=None):
+            if fake.is_native_command(command):
+                return original_execute(session_id, command)
+            return fake.execute_command(session_id, command, token_callback, cancel_token)
+
+        command_processor.execute_command = execute_command
+
+    host_key = paramiko.RSAKey.generate(2048)
+    if mode == "async":
+        from core.async_server import start_async_server as target
+    else:
+        from core.server import start_server as target
+    target("127.0.0.1", port, command_processor, host_key)
+
+
+def read_process_stats(pid):
+    """Resident memory (MB) and thread count of a process, None where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["VmRSS"].split()[0]) / 1024, int(fields["Threads"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+class StatsSampler:
+    """Samples server RSS and threads in the background, keeps the peaks"""
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.rss_peak = None
+        self.threads_peak = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            rss, threads = read_process_stats(self.pid)
+            if rss is not None:
+                self.rss_peak = max(self.rss_peak or 0, rss)
+                self.threads_peak = max(self.threads_peak or 0, threads)
+            self.stop_event.wait(self.interval)
+
+
+def source_address(index):
+    # spread clients over loopback addresses so per-IP admission limits behave like real traffic
+    return f"127.0.{1 + (index // 250) % 250}.{1 + index % 250}"
+
+
+def connect(port, index, timeout):
+    """Open a TCP connection from a distinct loopback source address"""
+    return socket.create_connection(("127.0.0.1", port), timeout, source_address=(source_address(index), 0))
+
+
+def login(port, index, timeout):
+    """Connect and authenticate, returns (client, handshake seconds)"""
+    start = time.perf_counter()
+    sock = connect(port, index, timeout)
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect("127.0.0.1", port, USERNAME, PASSWORD, sock=sock, timeout=timeout,
+                   banner_timeout=timeout, auth_timeout=timeout, look_for_keys=False, allow_agent=False)
+    return client, time.perf_counter() - start
+
+
+class Shell:
+    """Interactive shell channel that knows when the prompt is back"""
+    def __init__(self, client, timeout):
+        self.channel = client.invoke_shell()
+        self.channel.settimeout(timeout)
+        self.timeout = timeout
+        self.read_until_prompt()  # banner
+
+    def read_until_prompt(self, on_data=None):
+        output = b""
+        deadline = time.monotonic() + self.timeout
+        while not output.rstrip(b" ").endswith(b"$"):
+            if time.monotonic() > deadline:
+                raise TimeoutError("prompt not seen")
+            data = self.channel.recv(65536)
+            if not data:
+                raise EOFError("channel closed")
+            if on_data:
+                on_data(output, data)
+            output += data
+        return output
+
+    def run(self, command):
+        """Run a command, returns (round trip seconds, seconds until the first output byte)"""
+        start = time.perf_counter()
+        first_output = []
+        # the echo of the typed command comes back first, output starts after its CRLF
+        echo = (command + "\r\n").encode()
+
+        def on_data(previous, data):
+            if not first_output and len(previous) + len(data) > len(echo):
+                first_output.append(time.perf_counter() - start)
+
+        self.channel.send(command + "\r")
+        self.read_until_prompt(on_data)
+        return time.perf_counter() - start, (first_output[0] if first_output else None)
+
+    def close(self):
+        try:
+            self.channel.send("exit\r")
+        except Exception:
+            pass
+
+
+def scenario_auth_spray(port, index, args):
+    """Bot that only tries a few passwords on one connection and leaves"""
+    result = {"handshake": None, "rtts": [], "ttfb": [], "auth_attempts": 0}
+    start = time.perf_counter()
+    transport = paramiko.Transport(connect(port, index, args.timeout))
+    try:
+        transport.start_client(timeout=args.timeout)
+        result["handshake"] = time.perf_counter() - start
+        for password in SPRAY_PASSWORDS[:args.spray_attempts]:
+            attempt_start = time.perf_counter()
+            try:
+                transport.auth_password("root", password)
+            except paramiko.AuthenticationException:
+                pass
+            result["rtts"].append(time.perf_counter() - attempt_start)
+            result["auth_attempts"] += 1
+    finally:
+        transport.close()
+    return result
+
+
+def _shell_scenario(port, index, args, body):
+    client, handshake = login(port, index, args.timeout)
+    result = {"handshake": handshake, "rtts": [], "ttfb": []}
+    try:
+        shell = Shell(client, args.timeout)
+        body(shell, result)
+        shell.close()
+    finally:
+        client.close()
+    return result
+
+
+def scenario_recon(port, index, args):
+    """Bot that logs in, runs a short recon script and disconnects"""
+    def body(shell, result):
+        for command in RECON_COMMANDS:
+            result["rtts"].append(shell.run(command)[0])
+    return _shell_scenario(port, index, args, body)
+
+
+def scenario_interactive(port, index, args):
+    """Long session with think time between commands"""
+    def body(shell, result):
+        for i in range(args.interactive_commands):
+            result["rtts"].append(shell.run(INTERACTIVE_COMMANDS[i % len(INTERACTIVE_COMMANDS)])[0])
+            time.sleep(args.think_time)
+    return _shell_scenario(port, index, args, body)
+
+
+def scenario_ping(port, index, args):
+    """Continuous ping left running, then interrupted"""
+    def body(shell, result):
+        shell.channel.send("ping -i 0.2 10.0.0.1\r")
+        deadline = time.monotonic() + args.ping_duration
+        # each read is bounded by the time left, the ping may go quiet before the deadline
+        while (remaining := deadline - time.monotonic()) > 0:
+            shell.channel.settimeout(remaining)
+            try:
+                shell.channel.recv(65536)
+            except socket.timeout:
+                break
+        shell.channel.settimeout(args.timeout)
+        # time from Ctrl+C to the statistics and prompt
+        start = time.perf_counter()
+        shell.channel.send("\x03")
+        shell.read_until_prompt()
+        result["rtts"].append(time.perf_counter() - start)
+    return _shell_scenario(port, index, args, body)
+
+
+def scenario_ai_stream(port, index, args):
+    """Commands answered by the streaming LLM backend"""
+    def body(shell, result):
+        for command in AI_COMMANDS:
+            total, ttfb = shell.run(command)
+            result["rtts"].append(total)
+            if ttfb is not None:
+                result["ttfb"].append(ttfb)
+    return _shell_scenario(port, index, args, body)
+
+
+SCENARIOS = {
+    "auth_spray": scenario_auth_spray,
+    "recon": scenario_recon,
+    "interactive": scenario_interactive,
+    "ping": scenario_ping,
+    "ai_stream": scenario_ai_stream,
+}
+
+
+def percentiles(values):
+    """p50/p95/p99/max in milliseconds"""
+    if not values:
+        return None
+    values = sorted(values)
+
+    def pick(p):
+        return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 2)
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(values[-1] * 1000, 2)}
+
+
+def run_scenario(name, port, args, server_pid):
+    """Run one scenario with the configured number of sessions and concurrency"""
+    def guarded(index):
+        try:
+            return SCENARIOS[name](port, index, args)
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+
+    start = time.perf_counter()
+    with StatsSampler(server_pid) as sampler:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(guarded, range(args.sessions)))
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if "error" not in r]
+    errors = [r["error"] for r in results if "error" in r]
+    rss_end, threads_end = read_process_stats(server_pid)
+    summary = {
+        "scenario": name,
+        "sessions": len(results),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:3],
+        "duration_s": round(elapsed, 3),
+        "sessions_per_s": round(len(ok) / elapsed, 2) if elapsed else None,
+        "handshake_ms": percentiles([r["handshake"] for r in ok if r.get("handshake") is not None]),
+        "command_rtt_ms": percentiles([t for r in ok for t in r["rtts"]]),
+        "server": {
+            "rss_peak_mb": round(sampler.rss_peak, 1) if sampler.rss_peak else None,
+            "rss_end_mb": round(rss_end, 1) if rss_end else None,
+            "threads_peak": sampler.threads_peak,
+            "threads_end": threads_end,
+        },
+    }
+    if name == "auth_spray":
+        attempts = sum(r["auth_attempts"] for r in ok)
+        summary["auth_attempts_per_s"] = round(attempts / elapsed, 2) if elapsed else None
+    if name == "ai_stream":
+        summary["ai_ttfb_ms"] = percentiles([t for r in ok for t in r["ttfb"]])
+    return summary
+
+
+def wait_for_port(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="SSH load benchmark for the honeypot")
+    parser.add_argument("--mode", choices=["threaded", "async"], default="threaded", help="server front end")
+    parser.add_argument("--port", type=int, default=2299)
+    parser.add_argument("--scenarios", default=",".join(SCENARIO_NAMES), help="comma separated: " + ", ".join(SCENARIO_NAMES))
+    parser.add_argument("--sessions", type=int, default=100, help="sessions per scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--timeout", type=float, default=30.0, help="client socket and read timeout")
+    parser.add_argument("--llm", choices=["off", "fake"], default="fake", help="AI backend used by the server")
+    parser.add_argument("--llm-tokens", type=int, default=80, help="tokens per fake LLM answer")
+    parser.add_argument("--llm-interval", type=float, default=0.015, help="seconds between fake LLM tokens")
+    parser.add_argument("--spray-attempts", type=int, default=3, help="passwords tried per auth_spray connection")
+    parser.add_argument("--interactive-commands", type=int, default=20)
+    parser.add_argument("--think-time", type=float, default=0.5, help="pause between interactive commands")
+    parser.add_argument("--ping-duration", type=float, default=5.0, help="seconds each continuous ping runs")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)}")
+    if "ai_stream" in names and args.llm == "off":
+        sys.exit("The ai_stream scenario needs --llm fake")
+
+    work_dir = tempfile.mkdtemp(prefix="honeypot-bench-")
+    context = multiprocessing.get_context("fork")
+    server = context.Process(
+        target=run_server,
+        args=(args.port, args.mode, args.llm, args.llm_tokens, args.llm_interval, work_dir),
+        daemon=True
+    )
+    server.start()
+
+    try:
+        if not wait_for_port(args.port, 30):
+            sys.exit("Honeypot did not start listening")
+        rss_start, threads_start = read_process_stats(server.pid)
+
+        report = {
+            "config": vars(args),
+            "server_start": {"rss_mb": round(rss_start, 1) if rss_start else None, "threads": threads_start},
+            "scenarios": [],
+        }
+        for name in names:
+            print(f"[*] Running {name}...", file=sys.stderr)
+            report["scenarios"].append(run_scenario(name, args.port, args, server.pid))
+    finally:
+        os.kill(server.pid, signal.SIGTERM)
+        server.join(5)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"[*] Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
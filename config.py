@@ -9,12 +9,69 @@ PORT = 2222
 USERNAME = "haskoli"
 PASSWORD = "password"
 
+# connection handling
+SERVER_MODE = "threaded"  # Options: "threaded" (one thread per connection) or "async" (event loop)
+# in both modes paramiko still runs one transport thread per connection, async mode only
+# saves the handler thread of idle sessions, so threads still grow with open connections
+SERVER_WORKERS = 1  # listener processes, more than 1 forks workers sharing the port with SO_REUSEPORT
+ASYNC_EXECUTOR_WORKERS = 64  # worker threads for input, commands and timers in async mode
+ASYNC_STREAM_WORKERS = 64  # separate threads for streamed LLM commands, so input and timers never wait behind them
+ASYNC_LISTEN_BACKLOG = 1024  # listen backlog used in async mode
+TIMER_CALLBACK_WORKERS = 32  # threads running ping lines, streaming checks and output flushes in threaded mode
+PING_MIN_INTERVAL = 0.2  # shortest ping -i accepted, the limit ping applies to non-root users (seconds)
+
+# connection admission limits (checked before the SSH handshake)
+MAX_CONCURRENT_SESSIONS = 500  # concurrent connections across all clients
+MAX_SESSIONS_PER_IP = 10  # concurrent connections from a single source IP
+MAX_PENDING_CONNECTIONS = 100  # connections allowed to wait for a free slot
+PENDING_CONNECTION_TIMEOUT = 10.0  # seconds a queued connection may wait before being dropped
+HANDSHAKE_TIMEOUT = 10.0  # seconds a client gets to send its banner and finish key exchange
+AUTH_TIMEOUT = 10.0  # seconds a client gets to finish authentication
+ADMISSION_STATS_INTERVAL = 60.0  # seconds between admission counter log lines
+
+# session output buffering
+OUTPUT_BUFFER_SIZE = 32768  # pending bytes that force a send (about one SSH packet)
+OUTPUT_FLUSH_DELAY = 0.01  # longest time output may wait in the buffer (seconds)
+BANNER_CACHE_SECONDS = 60  # how long the rendered login banner is reused
+STREAM_FLUSH_BYTES = 512  # streamed LLM output is sent once this many bytes are pending
+STREAM_FLUSH_INTERVAL = 0.03  # or at least this often while tokens keep arriving (seconds)
+FILE_CHUNK_SIZE = 16384  # file content is read, appended and sent to the channel in chunks of this many characters
+
+# database write batching, every write goes through one writer thread
+DB_WRITE_BATCH = 500  # queued writes committed in one transaction
+DB_WRITE_INTERVAL = 0.2  # longest time a write waits for its batch to fill (seconds)
+DB_WRITE_QUEUE_SIZE = 100000  # pending writes before callers block until the writer catches up
+
+# response store, what the honeypot answered is kept once per distinct output
+RESPONSE_MAX_BYTES = 1048576  # larger responses are not stored, their commands get no response hash
+RESPONSE_COMPRESS_LEVEL = 6  # zlib level of stored response bodies
+
+# session teardown, done off the connection threads
+RECLAIM_QUEUE_SIZE = 1000  # closed sessions waiting for teardown, a full queue makes the closing thread do its own
+RECLAIM_BATCH = 200  # closed sessions torn down together, their end times are written in one transaction
+RECLAIM_SUBMIT_TIMEOUT = 0.5  # seconds a closing connection waits for room in a full queue
+
+# per-session filesystem quotas, writes beyond them fail with "No space left on device"
+SESSION_QUOTA_BYTES = 64 * 1024 * 1024  # file content a session may hold in its layer
+SESSION_QUOTA_INODES = 10000  # files and directories a session may create
+MAX_FILE_SIZE = 16 * 1024 * 1024  # largest single file a session may write
+
+# emulated host, rendered into the generated files of /proc, /sys and /dev
+KERNEL_RELEASE = "6.8.0-54-generic"
+KERNEL_BUILD = "#56-Ubuntu SMP PREEMPT_DYNAMIC Sat Feb  8 00:37:57 UTC 2025"
+HOST_CPU_MODEL = "Intel(R) Xeon(R) CPU E5-2680 v4 @ 2.40GHz"
+HOST_CPU_COUNT = 4
+HOST_MEMORY_MB = 8192
+
 # file paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_FILE = os.path.join(BASE_DIR, 'honeypot.log')
 DB_FILE = os.path.join(BASE_DIR, './frontend/honeypot.db')
 HOST_KEY_FILE = os.path.join(BASE_DIR, 'host_key.pem')
 FILESYSTEM_DIR = os.path.join(BASE_DIR, 'fake_filesystem')
+BASE_IMAGE_NAME = 'base_image.db'  # compiled files.json inside FILESYSTEM_DIR, rebuilt when it, USERNAME or HOSTNAME changes
+CAPTURE_DIR = os.path.join(BASE_DIR, 'captures')  # files written by attackers, one compressed copy per SHA-256
+CAPTURE_KNOWN_HASHES = 10000  # stored payload hashes remembered, older ones fall back to a check on disk
 
 # hostname for the honeypot
 HOSTNAME = "ubuntu01"
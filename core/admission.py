@@ -0,0 +1,125 @@
+"""
+Connection admission control for the SSH honeypot.
+Caps concurrent sessions globally and per source IP before the expensive
+paramiko handshake starts, with a small bounded queue for bursts.
+"""
+import threading, time, collections
+from utils.log_setup import logger
+
+# admission decisions
+ADMITTED = "admitted"
+QUEUED = "queued"
+REJECTED = "rejected"
+
+
+class AdmissionController:
+    def __init__(self, max_sessions, max_per_ip, max_pending, pending_timeout):
+        self.max_sessions = max_sessions
+        self.max_per_ip = max_per_ip
+        self.max_pending = max_pending
+        self.pending_timeout = pending_timeout
+
+        self.lock = threading.Lock()
+        self.active_total = 0
+        self.per_ip = collections.Counter()  # active + queued connections per source IP
+        self.pending = collections.deque()   # (client, addr, queued_at) waiting for a free slot
+
+        # counters for monitoring
+        self.stats = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_global": 0,
+            "rejected_per_ip": 0,
+            "expired": 0
+        }
+
+    def admit(self, client, addr):
+        """
+        Decide what to do with a freshly accepted socket.
+        Rejected sockets are closed here, queued ones are handed out later by release().
+        """
+        ip = addr[0]
+        with self.lock:
+            if self.per_ip[ip] >= self.max_per_ip:
+                self.stats["rejected_per_ip"] += 1
+                decision = REJECTED
+            elif self.active_total < self.max_sessions:
+                self.active_total += 1
+                self.per_ip[ip] += 1
+                self.stats["admitted"] += 1
+                decision = ADMITTED
+            elif len(self.pending) < self.max_pending:
+                self.pending.append((client, addr, time.time()))
+                self.per_ip[ip] += 1
+                self.stats["queued"] += 1
+                decision = QUEUED
+            else:
+                self.stats["rejected_global"] += 1
+                decision = REJECTED
+
+        if decision == REJECTED:
+            self._drop(client)
+        return decision
+
+    def release(self, ip):
+        """
+        Free the slot held by a finished connection.
+        Returns the next queued (client, addr) that now owns the slot, or None.
+        """
+        expired = []
+        next_connection = None
+        with self.lock:
+            self._forget(ip)
+            self.active_total -= 1
+
+            now = time.time()
+            while self.pending:
+                client, addr, queued_at = self.pending.popleft()
+                if now - queued_at > self.pending_timeout:
+                    # waited too long, the client has most likely given up
+                    self._forget(addr[0])
+                    self.stats["expired"] += 1
+                    expired.append(client)
+                    continue
+
+                self.active_total += 1
+                self.stats["admitted"] += 1
+                next_connection = (client, addr)
+                break
+
+        for client in expired:
+            self._drop(client)
+        return next_connection
+
+    def expire_pending(self):
+        """Close queued connections that have waited longer than the pending timeout"""
+        expired = []
+        with self.lock:
+            now = time.time()
+            while self.pending and now - self.pending[0][2] > self.pending_timeout:
+                client, addr, _ = self.pending.popleft()
+                self._forget(addr[0])
+                self.stats["expired"] += 1
+                expired.append(client)
+
+        for client in expired:
+            self._drop(client)
+
+    def snapshot(self):
+        """Return current counters for logging or monitoring"""
+        with self.lock:
+            return dict(self.stats, active=self.active_total, pending=len(self.pending))
+
+    def _forget(self, ip):
+        # caller holds the lock
+        self.per_ip[ip] -= 1
+        if self.per_ip[ip] <= 0:
+            del self.per_ip[ip]
+
+    @staticmethod
+    def _drop(client):
+        """Close a socket before any SSH negotiation happens"""
+        try:
+            client.close()
+        except Exception as e:
+            logger.error(f"Error closing rejected connection: {e}")
@@ -0,0 +1,206 @@
+"""
+Event-loop SSH front end for the honeypot.
+Idle sessions are parked on the event loop instead of holding a handler thread,
+blocking work (database writes, command dispatch, timers) runs on a bounded executor
+and streamed LLM commands on a pool of their own.
+Paramiko still runs a transport thread for every connection, so this saves the
+handler thread of each session, not every thread a connection costs.
+"""
+import asyncio, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from utils.log_setup import logger
+from core.server import HoneypotServer, ShellSession, stop_event, end_session, finish_connection, create_transport
+from core.server import create_admission_controller, log_admission_stats, create_listen_socket
+from core.admission import QUEUED, REJECTED
+from core.scheduler import get_scheduler
+from config import ASYNC_EXECUTOR_WORKERS, ASYNC_STREAM_WORKERS, ASYNC_LISTEN_BACKLOG
+
+# how long a client has after connecting to open a shell channel (matches transport.accept(20))
+CHANNEL_TIMEOUT = 20.0
+
+
+class _TransportEvent(threading.Event):
+    """
+    Completion event handed to paramiko that also wakes the event loop.
+    paramiko sets it when negotiation finishes and again when the transport dies,
+    so connections that only try a password free their slot right away.
+    """
+    def __init__(self, wake):
+        super().__init__()
+        self.wake = wake
+
+    def set(self):
+        super().set()
+        self.wake()
+
+
+async def _wait_for_shell(transport, server, changed):
+    """Wait for the client to request a shell without blocking a thread"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CHANNEL_TIMEOUT
+    while loop.time() < deadline:
+        # clear before checking so a wake-up between the check and the wait is not lost
+        changed.clear()
+        if server.event.is_set():
+            return True
+        # give up once the transport has died (failed auth, disconnect)
+        if not transport.is_active():
+            return False
+        try:
+            # the timeout is only a safety net, state changes wake the wait
+            await asyncio.wait_for(changed.wait(), 1.0)
+        except asyncio.TimeoutError:
+            pass
+    return server.event.is_set()
+
+
+async def handle_connection_async(client, addr, command_processor, host_key, executor, stream_executor):
+    loop = asyncio.get_running_loop()
+    transport = None
+    channel = None
+    server = None
+    session = None
+    session_closed = False
+    fd = None
+
+    try:
+        transport = create_transport(client, host_key)
+        # only reserves a session id, the row is written once a channel opens
+        server = HoneypotServer(addr[0])
+        # wake the connection task whenever the shell is requested or the transport changes state
+        changed = asyncio.Event()
+        wake = lambda: loop.call_soon_threadsafe(changed.set)
+        server.on_shell = wake
+
+        # passing an event makes paramiko negotiate in its own transport thread
+        transport.start_server(event=_TransportEvent(wake), server=server)
+
+        if not await _wait_for_shell(transport, server, changed):
+            logger.info(f"No channel from {addr[0]}")
+            return
+
+        # the channel is queued before the shell request, so this returns immediately
+        channel = await loop.run_in_executor(executor, transport.accept, 1)
+        if channel is None:
+            logger.info(f"No channel from {addr[0]}")
+            return
+
+        logger.info(f"Channel accepted from {addr[0]}")
+        await loop.run_in_executor(executor, server.log_session)
+
+        # initialize session in command processor
+        await loop.run_in_executor(executor, command_processor.initialize_session, server.session_id)
+        logger.info(f"Initialized session {server.session_id} for client {addr[0]}")
+
+        # timers fire on the shared scheduler thread and hand the session work to the executor,
+        # streamed commands run for seconds and get their own pool so keystrokes never queue behind them
+        timers = get_scheduler()
+        session = ShellSession(
+            channel, command_processor, server, addr[0],
+            spawn=stream_executor.submit,
+            schedule=lambda delay, callback: timers.call_later(delay, executor.submit, callback)
+        )
+        await loop.run_in_executor(executor, session.send_banner)
+
+        # the channel pipe becomes readable when data arrives or the channel hits EOF
+        readable = asyncio.Event()
+        fd = channel.fileno()
+        loop.add_reader(fd, readable.set)
+        channel.setblocking(0)
+
+        while not stop_event.is_set():
+            # idle until there is input, ping lines and streaming timeouts run off the scheduler
+            await readable.wait()
+            readable.clear()
+
+            data = ""
+            if channel.recv_ready():
+                data = channel.recv(1024).decode('utf-8', errors='ignore')
+            elif channel.eof_received or channel.closed:
+                logger.info(f"Client {addr[0]} disconnected")
+                session_closed = end_session(server, session_closed, "due to client disconnect")
+                break
+
+            if data:
+                keep_open = await loop.run_in_executor(executor, session.feed, data, time.monotonic())
+                if not keep_open:
+                    break
+
+    except Exception as e:
+        logger.error(f"Error handling connection from {addr[0]}: {str(e)}")
+    finally:
+        # the pipe fd is closed together with the channel, stop watching it first
+        if fd is not None:
+            loop.remove_reader(fd)
+        await loop.run_in_executor(
+            executor, finish_connection, addr, server, transport, channel, command_processor, session_closed, session
+        )
+
+
+async def serve(host, port, command_processor, host_key, reuse_port=False):
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=ASYNC_EXECUTOR_WORKERS, thread_name_prefix="honeypot-worker")
+    stream_executor = ThreadPoolExecutor(max_workers=ASYNC_STREAM_WORKERS, thread_name_prefix="honeypot-stream")
+
+    server_socket = create_listen_socket(reuse_port)
+    server_socket.setblocking(False)
+
+    # keep references to running connection tasks so they are not garbage collected
+    connection_tasks = set()
+    admission = create_admission_controller()
+    stats_logged = time.time()
+
+    def start_connection(client, addr):
+        # paramiko drives the socket from its own transport thread
+        client.setblocking(True)
+        task = loop.create_task(handle_connection_async(client, addr, command_processor, host_key, executor, stream_executor))
+        connection_tasks.add(task)
+        task.add_done_callback(connection_tasks.discard)
+        task.add_done_callback(lambda _: release(addr))
+
+    def release(addr):
+        # hand the freed slot to the next queued connection, if any
+        next_connection = admission.release(addr[0])
+        if next_connection:
+            logger.info(f"Dequeued connection from {next_connection[1][0]}:{next_connection[1][1]}")
+            start_connection(*next_connection)
+
+    try:
+        server_socket.bind((host, port))
+        server_socket.listen(ASYNC_LISTEN_BACKLOG)
+        logger.info(f"SSH server running on {host}:{port} (event loop, {ASYNC_EXECUTOR_WORKERS} workers)")
+
+        while not stop_event.is_set():
+            admission.expire_pending()
+            stats_logged = log_admission_stats(admission, stats_logged)
+            try:
+                # wake up once a second to notice the stop event
+                client, addr = await asyncio.wait_for(loop.sock_accept(server_socket), 1.0)
+            except asyncio.TimeoutError:
+                continue
+            except Exception as e:
+                if not stop_event.is_set():
+                    logger.error(f"Error accepting connection: {e}")
+                continue
+
+            # admission control happens before any SSH negotiation
+            decision = admission.admit(client, addr)
+            if decision == REJECTED:
+                continue
+            logger.info(f"Connection from {addr[0]}:{addr[1]} ({decision})")
+            if decision == QUEUED:
+                continue
+
+            start_connection(client, addr)
+    except Exception as e:
+        logger.error(f"Error starting server: {e}")
+    finally:
+        logger.info("Server shutting down...")
+        server_socket.close()
+        executor.shutdown(wait=False)
+        stream_executor.shutdown(wait=False)
+
+
+def start_async_server(host, port, command_processor, host_key, reuse_port=False):
+    """Start the SSH honeypot server on an asyncio event loop"""
+    asyncio.run(serve(host, port, command_processor, host_key, reuse_port))
@@ -0,0 +1,180 @@
+"""
+Compiled base image for the virtual filesystem.
+files.json is compiled once into a single SQLite file with ownership, permissions,
+timestamps and normalized content worked out ahead of time. Later starts only read
+the node table, file content is loaded the first time a file is read.
+"""
+import hashlib
+import os
+import posixpath
+import sqlite3
+import stat
+import threading
+import time
+import zlib
+from utils.log_setup import logger
+from utils.filesystem_data import JSON_FILE, load_file_system, sample_files
+from core.host_profile import GENERATED_FILES
+from config import USERNAME, HOSTNAME
+
+IMAGE_FORMAT = "3"  # bump when the build rules below change, so existing images are rebuilt
+
+# ownership and permissions of base image nodes, files.json only holds names and content
+BASE_PERMISSIONS = {
+    "/root": 0o700,
+    "/proc": 0o555,
+    "/sys": 0o555,
+    "/tmp": 0o1777,
+    "/var/tmp": 0o1777,
+    f"/home/{USERNAME}": 0o750,
+    f"/home/{USERNAME}/.ssh": 0o700,
+    "/etc/shadow": 0o640,
+    "/etc/gshadow": 0o640,
+}
+BASE_GROUPS = {"/etc/shadow": "shadow", "/etc/gshadow": "shadow"}
+EXECUTABLE_DIRS = ("/bin", "/sbin", "/usr/bin", "/usr/sbin", "/usr/local/bin", "/usr/local/sbin")
+PRIVATE_FILES = (".bash_history", ".mysql_history", ".viminfo")  # created 0600 by their programs
+BASE_TIME_SPREAD = 90 * 24 * 3600  # timestamps are spread over the 90 days before the files.json date
+DIR_SIZE = 4096
+
+SCHEMA = """
+CREATE TABLE manifest (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE nodes (
+    path TEXT PRIMARY KEY,
+    is_dir INTEGER NOT NULL,
+    mode INTEGER NOT NULL,
+    owner TEXT NOT NULL,
+    grp TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    nlink INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    content TEXT
+);
+"""
+
+
+def _node_metadata(path, is_dir):
+    """(mode, owner, group) of a base image path"""
+    home = f"/home/{USERNAME}"
+    owner = USERNAME if path == home or path.startswith(home + "/") else "root"
+    parent, name = posixpath.split(path)
+    if path in BASE_PERMISSIONS:
+        permissions = BASE_PERMISSIONS[path]
+    elif is_dir or parent in EXECUTABLE_DIRS:
+        permissions = 0o755
+    elif name in PRIVATE_FILES or (parent.endswith("/.ssh") and not name.endswith(".pub")):
+        permissions = 0o600
+    else:
+        permissions = 0o644
+    mode = (stat.S_IFDIR if is_dir else stat.S_IFREG) | permissions
+    return mode, owner, BASE_GROUPS.get(path, owner)
+
+
+class BaseImage:
+    """The compiled image file, shared read-only by every session"""
+    def __init__(self, image_file):
+        self.image_file = image_file
+        self.lock = threading.Lock()
+        self.conn = None      # connection for lazy content reads
+        self.conn_pid = None  # process that opened it, a connection is never used across a fork
+
+    def manifest(self):
+        """What the image has to be built from, any difference triggers a rebuild"""
+        try:
+            with open(JSON_FILE, 'rb') as f:
+                source_hash = hashlib.sha256(f.read()).hexdigest()
+        except FileNotFoundError:
+            source_hash = "missing"
+        return {"format": IMAGE_FORMAT, "source_sha256": source_hash, "username": USERNAME, "hostname": HOSTNAME}
+
+    def ensure(self):
+        """Build the image unless the one on disk matches files.json, USERNAME and HOSTNAME"""
+        manifest = self.manifest()
+        if self._stored_manifest() == manifest:
+            logger.info(f"Using compiled base image {self.image_file}")
+            return
+        self.build(manifest)
+
+    def _stored_manifest(self):
+        if not os.path.exists(self.image_file):
+            return None
+        try:
+            conn = sqlite3.connect(f"file:{self.image_file}?mode=ro", uri=True)
+            try:
+                return dict(conn.execute("SELECT key, value FROM manifest").fetchall())
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Unreadable base image {self.image_file}, rebuilding: {e}")
+            return None
+
+    def build(self, manifest):
+        """Compile files.json into the image file, replacing it atomically"""
+        start = time.perf_counter()
+        tree = load_file_system()
+        # generated files get an empty node, their content is rendered when they are read
+        for path, content in [*sample_files.items(), *((path, "") for path in GENERATED_FILES)]:
+            *parents, name = path.strip("/").split("/")
+            current = tree
+            for part in parents:
+                current = current.setdefault(part, {})
+            current[name] = content
+
+        image_time = os.path.getmtime(JSON_FILE) if os.path.exists(JSON_FILE) else time.time()
+        rows = []
+        self._collect("/", tree, image_time, rows)
+
+        os.makedirs(os.path.dirname(self.image_file), exist_ok=True)
+        temp_file = self.image_file + ".tmp"
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        conn = sqlite3.connect(temp_file)
+        try:
+            conn.executescript(SCHEMA)
+            conn.executemany("INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany("INSERT INTO manifest VALUES (?, ?)", manifest.items())
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(temp_file, self.image_file)
+
+        with self.lock:
+            self.conn = None
+        logger.info(f"Compiled base image {self.image_file} with {len(rows)} nodes "
+                    f"in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def _collect(self, path, value, image_time, rows):
+        """Append the node rows for path and everything below it, parents before children"""
+        is_dir = isinstance(value, dict)
+        mode, owner, group = _node_metadata(path, is_dir)
+        mtime = image_time - zlib.crc32(path.encode('utf-8')) % BASE_TIME_SPREAD
+        if is_dir:
+            nlink = 2 + sum(1 for child in value.values() if isinstance(child, dict))
+            rows.append((path, 1, mode, owner, group, DIR_SIZE, nlink, mtime, None))
+            for name, child in value.items():
+                self._collect(posixpath.join(path, name), child, image_time, rows)
+        else:
+            # files.json stores some line breaks as a literal backslash-n
+            content = value.replace('\\n', '\n')
+            size = len(content.encode('utf-8'))
+            if path in GENERATED_FILES:
+                mode, size = GENERATED_FILES[path][:2]
+            rows.append((path, 0, mode, owner, group, size, 1, mtime, content))
+
+    def nodes(self):
+        """(path, is_dir, mode, owner, group, size, nlink, mtime) for every node, parents first"""
+        conn = sqlite3.connect(f"file:{self.image_file}?mode=ro", uri=True)
+        try:
+            return conn.execute(
+                "SELECT path, is_dir, mode, owner, grp, size, nlink, mtime FROM nodes ORDER BY rowid").fetchall()
+        finally:
+            conn.close()
+
+    def read_content(self, path):
+        """Content of a file in the image"""
+        with self.lock:
+            if self.conn is None or self.conn_pid != os.getpid():
+                self.conn = sqlite3.connect(f"file:{self.image_file}?mode=ro", uri=True, check_same_thread=False)
+                self.conn_pid = os.getpid()
+            row = self.conn.execute("SELECT content FROM nodes WHERE path = ?", (path,)).fetchone()
+        return row[0] if row and row[0] is not None else ""
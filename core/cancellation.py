@@ -0,0 +1,54 @@
+"""
+Per-command cancellation for the SSH honeypot
+"""
+import threading
+from utils.log_setup import logger
+
+
+class CancellationToken:
+    """
+    Cancellation flag for one running command.
+    Backends register callbacks (for example closing an HTTP stream) so that
+    cancelling aborts blocking I/O right away instead of at the next token.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """Mark the command as cancelled and run the registered callbacks once"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in cancellation callback: {e}")
+
+    def on_cancel(self, callback):
+        """
+        Register a callback to run on cancellation, runs it immediately if already cancelled.
+        Returns a function that unregisters the callback.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._discard(callback)
+
+        callback()
+        return lambda: None
+
+    def _discard(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
@@ -0,0 +1,62 @@
+"""
+Content-addressed store for files written by attackers.
+Every payload is kept once, gzip compressed under its SHA-256, and each write is
+recorded in the database with the session, path and hash. The same dropper
+pushed by thousands of bots costs one file on disk and a row per drop.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from utils.log_setup import logger
+from core.database import log_capture
+from config import CAPTURE_DIR, CAPTURE_KNOWN_HASHES
+
+
+class CaptureStore:
+    def __init__(self, store_dir=CAPTURE_DIR, max_known=CAPTURE_KNOWN_HASHES):
+        self.store_dir = store_dir
+        self.lock = threading.Lock()
+        # recently stored hashes in LRU order, saves the exists check for repeated payloads
+        self.known = OrderedDict()
+        self.max_known = max_known
+
+    def blob_path(self, digest):
+        """Location of a stored payload, spread over subdirectories by hash prefix"""
+        return os.path.join(self.store_dir, digest[:2], f"{digest}.gz")
+
+    def record(self, session_id, path, content):
+        """Store a written file and log the drop, returns its SHA-256"""
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        digest = hashlib.sha256(data).hexdigest()
+        try:
+            self._store(digest, data)
+        except OSError as e:
+            logger.error(f"Error storing capture {digest} for session {session_id}: {e}")
+        log_capture(session_id, path, digest, len(data))
+        return digest
+
+    def _store(self, digest, data):
+        with self.lock:
+            if digest in self.known:
+                self.known.move_to_end(digest)
+                return
+        target = self.blob_path(digest)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # written under a unique name and renamed, so concurrent writers of one payload never collide
+            temp_file = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(gzip.compress(data, mtime=0))
+            os.replace(temp_file, target)
+            logger.info(f"Captured new payload {digest} ({len(data)} bytes)")
+        with self.lock:
+            self.known[digest] = None
+            if len(self.known) > self.max_known:
+                self.known.popitem(last=False)
+
+    def load(self, digest):
+        """Original bytes of a stored payload"""
+        with open(self.blob_path(digest), 'rb') as f:
+            return gzip.decompress(f.read())
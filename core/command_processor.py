@@ -8,7 +8,10 @@ import random
 import time
 import ipaddress
 from utils.log_setup import logger
-from config import HOSTNAME, BASE_DIR, USERNAME, HOME_DIRECTORY
+from core.listing import format_columns, format_long, format_stat, format_size, disk_blocks
+from core.output_buffer import StreamedOutput
+from core.expansion import GlobExpander
+from config import HOSTNAME, BASE_DIR, USERNAME, HOME_DIRECTORY, KERNEL_RELEASE, KERNEL_BUILD, PING_MIN_INTERVAL
 
 class CommandProcessor:
     def __init__(self, filesystem):
@@ -20,6 +23,8 @@ class CommandProcessor:
         self.known_commands = set()  # set of commands known to exist
         self.ping_active = {}  # track active ping sessions
         self.env_vars = {}  # track environment variables per session
+        self.redirect_targets = {}  # file the running command's output is redirected to, per session
+        self.expander = GlobExpander(filesystem)  # brace and wildcard expansion of arguments
         self.load_known_commands()
         
     def load_known_commands(self):
@@ -105,32 +110,50 @@ class CommandProcessor:
             # Get the command without redirection
             cmd_without_redirect = " ".join(cmd_parts)
             
-            # Execute the command to get its output
-            response = self.execute_command(session_id, cmd_without_redirect)
-            
-            # Check if there was an error in the command execution
-            if "No such file or directory" in response or "not found" in response:
-                # If there was an error, return it without doing redirection
-                self.last_exit_code[session_id] = 1
-                return response
-            
             # Resolve path for output file
             current_dir = self.current_dirs.get(session_id, f"/home/{USERNAME}")
             if not redirect_file.startswith('/'):
                 output_path = os.path.normpath(os.path.join(current_dir, redirect_file))
             else:
-                output_path = redirect_file
+                output_path = os.path.normpath(redirect_file)
             
-            # For append mode, read existing content first
-            content_to_write = response
-            if redirect_type == '>>' and self.filesystem.file_exists(output_path, session_id):
-                existing_content = self.filesystem.read_file(output_path, session_id)
-                if existing_content and not existing_content.endswith('\n'):
-                    existing_content += '\n'
-                content_to_write = existing_content + response
+            # like the shell, truncate the target before the command runs, cat f > f reads an empty f
+            if redirect_type == '>':
+                try:
+                    created = self.filesystem.write_file(output_path, "", session_id)
+                except OSError as e:
+                    self.last_exit_code[session_id] = 1
+                    return f"bash: {redirect_file}: {e.strerror}"
+                if not created:
+                    self.last_exit_code[session_id] = 1
+                    return f"bash: {redirect_file}: Permission denied"
+            
+            # Execute the command to get its output
+            self.redirect_targets[session_id] = output_path
+            try:
+                response = self.execute_command(session_id, cmd_without_redirect)
+            finally:
+                self.redirect_targets.pop(session_id, None)
+            
+            # Check if there was an error in the command execution
+            if isinstance(response, str) and ("No such file or directory" in response or "not found" in response
+                                              or "input file is output file" in response):
+                # If there was an error, return it without doing redirection
+                self.last_exit_code[session_id] = 1
+                return response
             
             # Write to the file (append or overwrite)
-            result = self.filesystem.write_file(output_path, content_to_write, session_id)
+            try:
+                if isinstance(response, StreamedOutput):
+                    result = self._redirect_stream(output_path, response, session_id, redirect_type == '>>')
+                elif redirect_type == '>>':
+                    # appended output starts on a new line, the file is never read back
+                    result = self.filesystem.append_file(output_path, response, session_id, separator='\n')
+                else:
+                    result = self.filesystem.write_file(output_path, response, session_id)
+            except OSError as e:
+                self.last_exit_code[session_id] = 1
+                return f"bash: {redirect_file}: {e.strerror}"
             
             if result:
                 self.last_exit_code[session_id] = 0
@@ -149,6 +172,16 @@ class CommandProcessor:
         # Execute the command normally if no redirection was detected
         return self.execute_command(session_id, command)
     
+    def _redirect_stream(self, output_path, output, session_id, append):
+        """Write streamed output into a file one chunk at a time, raises ENOSPC over the session quota.
+        A file overwritten with > was already truncated before the command ran"""
+        separator = '\n' if append else ""
+        for chunk in output:
+            if not self.filesystem.append_file(output_path, chunk, session_id, separator):
+                return False
+            separator = ""
+        return True
+
     def _parse_command_with_redirection(self, command):
         """
         Parse a command string, handling quotes and redirection.
@@ -265,7 +298,12 @@ class CommandProcessor:
         
         # Extract the command name and arguments
         cmd = parts[0].lower()
-        
+
+        # expand braces and wildcards against the session's view of the filesystem
+        if len(parts) > 1:
+            current_dir = self.current_dirs.get(session_id, f"/home/{USERNAME}")
+            parts = parts[:1] + self.expander.expand(parts[1:], session_id, current_dir)
+
         # Process quotes in arguments for commands that need it
         if cmd in ["cat", "echo", "touch", "mkdir", "rm", "mv", "cp"]:
             args = []
@@ -295,6 +333,10 @@ class CommandProcessor:
             return self.cmd_rm(session_id, args)
         elif cmd == "touch":
             return self.cmd_touch(session_id, args)
+        elif cmd == "stat":
+            return self.cmd_stat(session_id, args)
+        elif cmd == "du":
+            return self.cmd_du(session_id, args)
         elif cmd == "whoami":
             return self.cmd_whoami(session_id)
         elif cmd == "uname":
@@ -436,6 +478,12 @@ class CommandProcessor:
             self.last_exit_code[session_id] = 1
             return "ping: usage error: Destination address required"
         
+        if not interval > 0:
+            self.last_exit_code[session_id] = 1
+            return f"ping: bad timing interval: {args[args.index('-i') + 1]}"
+        # non-root users can't go below 200ms, which also keeps the shared timers light
+        interval = max(interval, PING_MIN_INTERVAL)
+        
         # attempt to resolve the hostname
         try:
             # determine if the destination is an IP address or hostname
@@ -459,10 +507,15 @@ class CommandProcessor:
                 'hostname': hostname,
                 'ip': resolved_ip,
                 'ttl': ttl,
+                'interval': interval,
                 'sequence': 0,
                 'transmitted': 0,
                 'received': 0,
-                'times': []
+                # running round-trip statistics, a ping left running for days stays small
+                'rtt_min': None,
+                'rtt_max': None,
+                'rtt_sum': 0.0,
+                'rtt_sum_squares': 0.0
             }
             
             # create the initial response with header
@@ -475,10 +528,7 @@ class CommandProcessor:
                         break
                     
                     time_ms = self._generate_ping_time(resolved_ip)
-                    self.ping_active[session_id]['sequence'] += 1
-                    self.ping_active[session_id]['transmitted'] += 1
-                    self.ping_active[session_id]['received'] += 1
-                    self.ping_active[session_id]['times'].append(time_ms)
+                    self._record_ping(self.ping_active[session_id], time_ms)
                     
                     seq = self.ping_active[session_id]['sequence'] - 1
                     response.append(f"64 bytes from {resolved_ip}: icmp_seq={seq} ttl={ttl} time={time_ms:.3f} ms")
@@ -511,10 +561,7 @@ class CommandProcessor:
         
         ping_data = self.ping_active[session_id]
         time_ms = self._generate_ping_time(ping_data['ip'])
-        ping_data['sequence'] += 1
-        ping_data['transmitted'] += 1
-        ping_data['received'] += 1
-        ping_data['times'].append(time_ms)
+        self._record_ping(ping_data, time_ms)
         
         seq = ping_data['sequence'] - 1
         return f"64 bytes from {ping_data['ip']}: icmp_seq={seq} ttl={ping_data['ttl']} time={time_ms:.3f} ms"
@@ -544,6 +591,16 @@ class CommandProcessor:
         
         return base + (random.random() * jitter)
 
+    def _record_ping(self, ping_data, time_ms):
+        """Count one answered ping in the running statistics"""
+        ping_data['sequence'] += 1
+        ping_data['transmitted'] += 1
+        ping_data['received'] += 1
+        ping_data['rtt_min'] = time_ms if ping_data['rtt_min'] is None else min(ping_data['rtt_min'], time_ms)
+        ping_data['rtt_max'] = time_ms if ping_data['rtt_max'] is None else max(ping_data['rtt_max'], time_ms)
+        ping_data['rtt_sum'] += time_ms
+        ping_data['rtt_sum_squares'] += time_ms * time_ms
+
     def _generate_ping_stats(self, ping_data):
         """Generate ping statistics summary"""
         stats = []
@@ -560,17 +617,14 @@ class CommandProcessor:
         stats.append(f"{transmitted} packets transmitted, {received} packets received, {loss_pct:.1f}% packet loss")
         
         # calculate min/avg/max/stddev if we have times
-        if ping_data['times']:
-            min_time = min(ping_data['times'])
-            max_time = max(ping_data['times'])
-            avg_time = sum(ping_data['times']) / len(ping_data['times'])
+        if received:
+            min_time = ping_data['rtt_min']
+            max_time = ping_data['rtt_max']
+            avg_time = ping_data['rtt_sum'] / received
             
             # calculate standard deviation
-            if len(ping_data['times']) > 1:
-                variance = sum((t - avg_time) ** 2 for t in ping_data['times']) / len(ping_data['times'])
-                stddev = variance ** 0.5
-            else:
-                stddev = 0
+            variance = max(ping_data['rtt_sum_squares'] / received - avg_time ** 2, 0)
+            stddev = variance ** 0.5
             
             stats.append(f"round-trip min/avg/max/stddev = {min_time:.3f}/{avg_time:.3f}/{max_time:.3f}/{stddev:.3f} ms")
         
@@ -602,7 +656,11 @@ class CommandProcessor:
         if not targets:
             targets = [current_dir]
         
-        results = []
+        # like GNU ls: errors first, then every file operand in one listing,
+        # then each directory in its own block
+        errors = []
+        files = []
+        directories = []
         for target in targets:
             # resolve the path
             if not target.startswith('/'):
@@ -610,82 +668,45 @@ class CommandProcessor:
             else:
                 target_path = target
             
-            # if multiple targets, show directory names
-            if len(targets) > 1:
-                results.append(f"{target_path}:")
-            
-            # get directory contents
-            dir_listing = self.filesystem.list_directory(target_path, session_id)
-            
-            # process directory listing
-            if isinstance(dir_listing, str) and "cannot access" not in dir_listing:
-                # remove ansi color codes for processing
-                plain_listing = dir_listing.replace("\033[1;34m", "").replace("\033[1;32m", "").replace("\033[0m", "")
-                
-                # split into individual files
-                files = [f.rstrip('*/') for f in plain_listing.split("  ") if f]
-                
+            try:
+                entries = self.filesystem.scandir(target_path, session_id)
                 # filter hidden files if not showing hidden
                 if not show_hidden:
-                    files = [f for f in files if not f.startswith('.')]
-                
-                # process according to format
-                if long_format:
-                    # long format (-l)
-                    long_results = []
-                    for filename in sorted(files):
-                        # check if it's a directory
-                        file_path = os.path.join(target_path, filename)
-                        is_dir = self.filesystem.is_directory(file_path, session_id)
-                        
-                        # simulate permissions, size, date
-                        perm = "drwxr-xr-x" if is_dir else "-rw-r--r--"
-                        size = "4096" if is_dir else str(random.randint(100, 10000))
-                        date = datetime.datetime.now().strftime("%b %d %H:%M")
-                        owner = USERNAME
-                        group = USERNAME
-                        
-                        # form the long listing line
-                        display_name = filename
-                        if is_dir and show_indicators:
-                            display_name += "/"
-                        
-                        # add color if it's a directory (maintained for visual output)
-                        if is_dir:
-                            display_name = f"\033[1;34m{display_name}\033[0m"
-                            
-                        line = f"{perm} 1 {owner} {group} {size.rjust(8)} {date} {display_name}"
-                        long_results.append(line)
-                    
-                    results.append("\n".join(long_results))
-                else:
-                    # regular format
-                    formatted_files = []
-                    for filename in sorted(files):
-                        file_path = os.path.join(target_path, filename)
-                        is_dir = self.filesystem.is_directory(file_path, session_id)
-                        
-                        display_name = filename
-                        # add indicator if requested
-                        if is_dir and show_indicators:
-                            display_name += "/"
-                        
-                        # add color for directories (maintained for visual output)
-                        if is_dir:
-                            display_name = f"\033[1;34m{display_name}\033[0m"
-                        
-                        formatted_files.append(display_name)
-                    
-                    results.append("  ".join(formatted_files))
+                    entries = [entry for entry in entries if not entry.name.startswith('.')]
+                directories.append((target, entries))
+            except FileNotFoundError:
+                errors.append(f"ls: cannot access '{target}': No such file or directory")
+            except NotADirectoryError:
+                # a file is listed under the name it was given as
+                entry = self.filesystem.get_entry(target_path, session_id)
+                entry.name = target
+                files.append(entry)
+        
+        results = list(errors)
+        blocks = []
+        if files:
+            files.sort(key=lambda entry: entry.name)
+            if long_format:
+                blocks.append(format_long(files, indicators=show_indicators))
             else:
-                # error message or empty directory
-                results.append(dir_listing)
-            
-            if len(targets) > 1 and target != targets[-1]:
-                results.append("")
+                blocks.append(format_columns(files, indicators=show_indicators))
         
-        self.last_exit_code[session_id] = 0
-        return "\n".join(results)
+        # directories get a header once there is more than one operand
+        headers = len(targets) > 1
+        for target, entries in sorted(directories, key=lambda directory: directory[0]):
+            if long_format:
+                listing = format_long(entries, indicators=show_indicators, total=True)
+            else:
+                listing = format_columns(entries, indicators=show_indicators)
+            if headers:
+                listing = f"{target}:\n{listing}" if listing else f"{target}:"
+            blocks.append(listing)
+        
+        # blank lines only between blocks
+        results.append("\n\n".join(blocks))
+        
+        self.last_exit_code[session_id] = 2 if errors else 0
+        return "\n".join(result for result in results if result)
     
     def cmd_ifconfig(self, session_id, args=None):
         """Handle ifconfig command with realistic output"""
@@ -858,9 +879,15 @@ class CommandProcessor:
                 # for simplicity, we don't handle recursive copying in this basic implementation
                 results.append(f"cp: omitting directory '{source}'")
             else:
-                # copy file (read content from source and write to destination)
+                # copy file (read content from source and write to destination),
+                # copies of untouched base image files are nothing worth capturing
                 content = self.filesystem.read_file(source_path, session_id)
-                success = self.filesystem.write_file(target_path, content, session_id)
+                capture = not self.filesystem.is_base_file(source_path, session_id)
+                try:
+                    success = self.filesystem.write_file(target_path, content, session_id, capture)
+                except OSError as e:
+                    results.append(f"cp: error writing '{target_path}': {e.strerror}")
+                    continue
                 if not success:
                     results.append(f"cp: cannot create regular file '{target_path}': Permission denied")
         
@@ -927,33 +954,35 @@ class CommandProcessor:
                 if not self.filesystem.file_exists(target_path, session_id):
                     self.filesystem.create_directory(target_path, session_id)
                 
-                # get all files in the source directory
-                dir_contents = self.filesystem.list_directory(source_path, session_id)
-                if isinstance(dir_contents, str) and "cannot access" not in dir_contents:
-                    # clean up ANSI color codes and process files
-                    dir_contents = dir_contents.replace("\033[1;34m", "").replace("\033[1;32m", "").replace("\033[0m", "")
-                    files = [f.rstrip('*/') for f in dir_contents.split("  ") if f]
+                # move each entry of the source directory to the target directory
+                for entry in self.filesystem.scandir(source_path, session_id):
+                    dst_file = os.path.join(target_path, entry.name)
                     
-                    # move each file to the target directory
-                    for filename in files:
-                        src_file = os.path.join(source_path, filename)
-                        dst_file = os.path.join(target_path, filename)
-                        
-                        if self.filesystem.is_directory(src_file, session_id):
-                            self.filesystem.create_directory(dst_file, session_id)
-                        else:
-                            # copy file contents
-                            content = self.filesystem.read_file(src_file, session_id)
-                            self.filesystem.write_file(dst_file, content, session_id)
-                            # remove source file
-                            self.filesystem.remove_file(src_file, session_id)
-                    
-                    # remove the source directory
-                    self.filesystem.remove_file(source_path, session_id)
+                    if entry.is_dir:
+                        self.filesystem.create_directory(dst_file, session_id)
+                    else:
+                        # copy file contents
+                        content = self.filesystem.read_file(entry.path, session_id)
+                        capture = not self.filesystem.is_base_file(entry.path, session_id)
+                        try:
+                            self.filesystem.write_file(dst_file, content, session_id, capture)
+                        except OSError as e:
+                            results.append(f"mv: error writing '{dst_file}': {e.strerror}")
+                            continue
+                        # remove source file
+                        self.filesystem.remove_file(entry.path, session_id)
+                
+                # remove the source directory
+                self.filesystem.remove_file(source_path, session_id)
             else:
                 # move file (copy + remove)
                 content = self.filesystem.read_file(source_path, session_id)
-                success = self.filesystem.write_file(target_path, content, session_id)
+                capture = not self.filesystem.is_base_file(source_path, session_id)
+                try:
+                    success = self.filesystem.write_file(target_path, content, session_id, capture)
+                except OSError as e:
+                    results.append(f"mv: error writing '{target_path}': {e.strerror}")
+                    continue
                 if success:
                     # remove the source file
                     self.filesystem.remove_file(source_path, session_id)
@@ -969,14 +998,15 @@ class CommandProcessor:
         return self.current_dirs.get(session_id, f"/home/{USERNAME}")
     
     def cmd_cat(self, session_id, args):
-        """Handle cat command"""
+        """Handle cat command, file content is streamed in chunks instead of read whole"""
         if not args:
             self.last_exit_code[session_id] = 1
             return "cat: missing operand"
         
         current_dir = self.current_dirs.get(session_id, f"/home/{USERNAME}")
+        output_path = self.redirect_targets.get(session_id)
         
-        results = []
+        parts = []
         error_found = False
         
         for filename in args:
@@ -986,28 +1016,46 @@ class CommandProcessor:
             else:
                 file_path = filename
             
-            # Check if file exists
-            if not self.filesystem.file_exists(file_path, session_id):
-                error_found = True
-                results.append(f"cat: {filename}: No such file or directory")
-                continue
+            # like GNU cat, never read a non-empty file into itself, cat f >> f would not end
+            if output_path is not None and os.path.normpath(file_path) == output_path:
+                entry = self.filesystem.get_entry(file_path, session_id)
+                if entry is not None and not entry.is_dir and entry.size:
+                    error_found = True
+                    parts.append(f"cat: {filename}: input file is output file")
+                    continue
             
-            # Check if it's a directory
-            if self.filesystem.is_directory(file_path, session_id):
+            try:
+                parts.append(self.filesystem.iter_file(file_path, session_id))
+            except FileNotFoundError:
                 error_found = True
-                results.append(f"cat: {filename}: Is a directory")
+                parts.append(f"cat: {filename}: No such file or directory")
+            except IsADirectoryError:
+                error_found = True
+                parts.append(f"cat: {filename}: Is a directory")
+        
+        self.last_exit_code[session_id] = 0 if not error_found else 1
+        output = self._cat_output(parts)
+        # error messages are checked by redirection, so output with errors is returned as text
+        return "".join(output) if error_found else StreamedOutput(output)
+
+    def _cat_output(self, parts):
+        """Chunks of cat output, parts are error messages or chunk iterators of files, one per line"""
+        for index, part in enumerate(parts):
+            if index:
+                yield "\n"
+            if isinstance(part, str):
+                yield part
                 continue
-                
-            content = self.filesystem.read_file(file_path, session_id)
             
             # make sure multiline content is properly formatted
-            if '\n' in content and not content.endswith('\n'):
-                content += '\n'
-                
-            results.append(content)
-        
-        self.last_exit_code[session_id] = 0 if not error_found else 1
-        return "\n".join(results)
+            multiline = False
+            last = ""
+            for chunk in part:
+                multiline = multiline or '\n' in chunk
+                last = chunk
+                yield chunk
+            if multiline and not last.endswith('\n'):
+                yield "\n"
     
     def cmd_echo(self, session_id, args):
         """Handle echo command with proper handling of quotes and escapes"""
@@ -1139,8 +1187,7 @@ class CommandProcessor:
             # check if it's a directory
             if self.filesystem.is_directory(target_path, session_id):
                 # check if directory is empty
-                dir_listing = self.filesystem.list_directory(target_path, session_id)
-                is_empty = isinstance(dir_listing, str) and not dir_listing.strip()
+                is_empty = not self.filesystem.scandir(target_path, session_id)
                 
                 if not recursive and not is_empty:
                     results.append(f"rm: cannot remove '{target}': Is a directory")
@@ -1175,6 +1222,7 @@ class CommandProcessor:
         
         current_dir = self.current_dirs.get(session_id, f"/home/{USERNAME}")
         
+        results = []
         for filename in args:
             # resolve the path
             if not filename.startswith('/'):
@@ -1182,12 +1230,90 @@ class CommandProcessor:
             else:
                 file_path = filename
             
-            # create or update the file
-            if not self.filesystem.file_exists(file_path, session_id):
-                self.filesystem.write_file(file_path, "", session_id)
+            # create the file or update its timestamps
+            try:
+                self.filesystem.touch_file(file_path, session_id)
+            except OSError as e:
+                results.append(f"touch: cannot touch '{filename}': {e.strerror}")
         
-        self.last_exit_code[session_id] = 0
-        return ""
+        self.last_exit_code[session_id] = 0 if not results else 1
+        return "\n".join(results)
+    
+    def cmd_stat(self, session_id, args):
+        """Handle stat command, rendered from the stored inode metadata"""
+        targets = [arg for arg in args if not arg.startswith('-')]
+        if not targets:
+            self.last_exit_code[session_id] = 1
+            return "stat: missing operand\nTry 'stat --help' for more information."
+        
+        current_dir = self.current_dirs.get(session_id, f"/home/{USERNAME}")
+        
+        results = []
+        error_found = False
+        for target in targets:
+            # resolve the path
+            if not target.startswith('/'):
+                target_path = os.path.normpath(os.path.join(current_dir, target))
+            else:
+                target_path = target
+            
+            entry = self.filesystem.get_entry(target_path, session_id)
+            if entry is None:
+                error_found = True
+                results.append(f"stat: cannot statx '{target}': No such file or directory")
+            else:
+                results.append(format_stat(entry, target))
+        
+        self.last_exit_code[session_id] = 0 if not error_found else 1
+        return "\n".join(results)
+    
+    def cmd_du(self, session_id, args):
+        """Handle du command, sizes are summed from the stored inode metadata"""
+        flags = "".join(arg[1:] for arg in args if arg.startswith('-') and not arg.startswith('--'))
+        summarize = 's' in flags or "--summarize" in args
+        human = 'h' in flags or "--human-readable" in args
+        show_files = 'a' in flags or "--all" in args
+        targets = [arg for arg in args if not arg.startswith('-')] or ["."]
+        
+        current_dir = self.current_dirs.get(session_id, f"/home/{USERNAME}")
+        
+        results = []
+        error_found = False
+        for target in targets:
+            # resolve the path
+            if not target.startswith('/'):
+                target_path = os.path.normpath(os.path.join(current_dir, target))
+            else:
+                target_path = target
+            
+            entry = self.filesystem.get_entry(target_path, session_id)
+            if entry is None:
+                error_found = True
+                results.append(f"du: cannot access '{target}': No such file or directory")
+                continue
+            
+            lines = []
+            total = self._disk_usage(session_id, entry, target, lines, summarize, show_files)
+            lines.append((total, target))
+            results.extend(f"{format_size(size, human)}\t{path}" for size, path in lines)
+        
+        self.last_exit_code[session_id] = 0 if not error_found else 1
+        return "\n".join(results)
+    
+    def _disk_usage(self, session_id, entry, display_path, lines, summarize, show_files):
+        """Blocks used by an entry and everything below it, appends (size, path) rows for du"""
+        total = disk_blocks(entry)
+        if not entry.is_dir:
+            return total
+        
+        for child in self.filesystem.scandir(entry.path, session_id):
+            child_path = f"{display_path.rstrip('/')}/{child.name}"
+            size = self._disk_usage(session_id, child, child_path, lines, summarize, show_files)
+            total += size
+            # subdirectories are listed after their contents, files only with -a
+            if not summarize and (child.is_dir or show_files):
+                lines.append((size, child_path))
+        return total
     
     def cmd_whoami(self, session_id):
         """Handle whoami command"""
@@ -1196,19 +1322,16 @@ class CommandProcessor:
     
     def cmd_uname(self, session_id, args):
         """Handle uname command"""
-        # get current time for system information
-        current_time = datetime.datetime.now()
-        current_time_str = current_time.strftime("%a %b %d %I:%M:%S %p %Z %Y")
-        # check for any of the flags below
+        # kernel release and build match /proc/version
         if "-a" in args:
             self.last_exit_code[session_id] = 0
-            return f"Linux server01 5.4.0-107-generic #121-Ubuntu SMP {current_time_str} x86_64 x86_64 x86_64 GNU/Linux"
+            return f"Linux {self.hostname} {KERNEL_RELEASE} {KERNEL_BUILD} x86_64 x86_64 x86_64 GNU/Linux"
         if "-r" in args:
             self.last_exit_code[session_id] = 0
-            return "5.4.0-107-generic"
+            return KERNEL_RELEASE
         if "-n" in args:
             self.last_exit_code[session_id] = 0
-            return "ubuntu01"
+            return self.hostname
         
         # default behavior
         self.last_exit_code[session_id] = 0
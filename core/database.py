@@ -1,37 +1,183 @@
 """
 Database operations for the SSH honeypot
 """
+import os
 import sqlite3
 import datetime
+import queue
+import threading
+import time
+import multiprocessing
 from utils.log_setup import logger
-from config import DB_FILE
+from config import DB_FILE, DB_WRITE_BATCH, DB_WRITE_INTERVAL, DB_WRITE_QUEUE_SIZE
+from core.responses import decompress
+
+# set in worker processes so every write goes through the supervisor's single writer
+_write_queue = None
+# session id counter, shared between processes with the shared writer and created on first use otherwise
+_session_counter = None
+
+_counter_lock = threading.Lock()
+
+# writes of this process when there is no shared writer, applied by one thread in batches
+_local_queue = queue.Queue(DB_WRITE_QUEUE_SIZE)
+_writer_thread = None
+_writer_pid = None
+_writer_lock = threading.Lock()
 
 def get_db_connection():
     """Create a new SQLite connection"""
     return sqlite3.connect(DB_FILE)
 
-def init_db():
-    """Initialize database tables"""
+def configure_shared_writer(write_queue, session_counter):
+    """Route this process's writes through a shared writer queue"""
+    global _write_queue, _session_counter
+    _write_queue = write_queue
+    _session_counter = session_counter
+
+def create_session_counter(context):
+    """Create a process-shared session id counter seeded from the database"""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # first check if tables exist
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sessions'")
-    sessions_table_exists = cursor.fetchone() is not None
-    
-    # create tables if they don't exist
-    if not sessions_table_exists:
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ip TEXT NOT NULL,
-            username TEXT NOT NULL,
-            start_time TEXT NOT NULL,
-            end_time TEXT,
-            success BOOLEAN NOT NULL
-        )
-        ''')
-        logger.info("Created sessions table")
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM sessions")
+        max_id = cursor.fetchone()[0]
+        # AUTOINCREMENT never reuses ids, so also respect the stored sequence
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'sessions'")
+        row = cursor.fetchone()
+        if row and row[0] > max_id:
+            max_id = row[0]
+    finally:
+        conn.close()
+    return context.Value('q', max_id)
+
+def _writer_queue():
+    """Queue this process's writes go to, starting the local writer thread on first use"""
+    global _writer_thread, _writer_pid
+    if _write_queue is not None:
+        return _write_queue
+    if _writer_pid != os.getpid():
+        with _writer_lock:
+            # a forked process gets its own thread, the parent's does not exist there
+            if _writer_pid != os.getpid():
+                _writer_thread = threading.Thread(target=run_writer, args=(_local_queue,), name="honeypot-db-writer")
+                _writer_thread.daemon = True
+                _writer_thread.start()
+                _writer_pid = os.getpid()
+    return _local_queue
+
+def _execute_write(sql, params):
+    """Queue a write for the writer thread, returns without waiting for the database"""
+    _writer_queue().put((sql, params))
+
+def _execute_batch(batch):
+    """Queue several writes, the writer applies them in order and usually in one transaction"""
+    write_queue = _writer_queue()
+    for op in batch:
+        write_queue.put(op)
+
+def flush_buffered_writes(timeout=10):
+    """Wait until every write queued so far is committed, used on shutdown.
+    Writes handed to the shared writer are flushed by the supervisor instead"""
+    if _write_queue is not None or _writer_pid != os.getpid():
+        return
+    done = threading.Event()
+    _local_queue.put(done)
+    if not done.wait(timeout):
+        logger.warning("Timed out waiting for queued database writes")
+
+def allocate_session_id():
+    """Reserve the next session id without touching the database"""
+    global _session_counter
+    if _session_counter is None:
+        with _counter_lock:
+            if _session_counter is None:
+                _session_counter = create_session_counter(multiprocessing)
+    with _session_counter.get_lock():
+        _session_counter.value += 1
+        return _session_counter.value
+
+def _apply_writes(conn, batch):
+    """Commit a batch in one transaction, a failing statement only costs its own row"""
+    try:
+        cursor = conn.cursor()
+        for op in batch:
+            cursor.execute(*op)
+        conn.commit()
+        return
+    except sqlite3.Error as e:
+        logger.error(f"Database error writing batch of {len(batch)}, retrying one by one: {e}")
+        conn.rollback()
+    for op in batch:
+        try:
+            conn.execute(*op)
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Database error, dropped write: {e}")
+            conn.rollback()
+
+def run_writer(write_queue):
+    """
+    Apply queued writes until a None sentinel arrives.
+    Writes are committed together once DB_WRITE_BATCH are pending or the oldest has
+    waited DB_WRITE_INTERVAL, so one fsync covers many commands and auth attempts.
+    Runs as a thread of its own process, or in the supervisor for all worker processes.
+    """
+    conn = get_db_connection()
+    # readers such as the JSON exporter no longer block the writer, and commits skip most fsyncs
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    running = True
+    logger.info("Database writer started")
+    while running:
+        batch = []
+        waiters = []
+        item = write_queue.get()
+        deadline = time.monotonic() + DB_WRITE_INTERVAL
+        while True:
+            if item is None:
+                running = False
+            elif isinstance(item, tuple):
+                batch.append(item)
+            else:
+                # a flush marker, set once everything queued before it is committed
+                waiters.append(item)
+            remaining = deadline - time.monotonic()
+            if not running or waiters or len(batch) >= DB_WRITE_BATCH or remaining <= 0:
+                break
+            try:
+                item = write_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+        if batch:
+            _apply_writes(conn, batch)
+        for waiter in waiters:
+            waiter.set()
+    conn.close()
+    logger.info("Database writer stopped")
+
+def run_shared_writer(write_queue):
+    """Apply writes queued by worker processes, runs in the supervisor"""
+    run_writer(write_queue)
+
+def _add_column(cursor, table, column, declaration):
+    """Add a column unless an earlier, unversioned run already added it"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+def _create_tables(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ip TEXT NOT NULL,
+        username TEXT NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT,
+        success BOOLEAN NOT NULL
+    )
+    ''')
     
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS commands (
@@ -55,6 +201,107 @@ def init_db():
         FOREIGN KEY (session_id) REFERENCES sessions(id)
     )
     ''')
+
+def _create_captures(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS captures (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        path TEXT NOT NULL,
+        sha256 TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        timestamp TEXT NOT NULL,
+        FOREIGN KEY (session_id) REFERENCES sessions(id)
+    )
+    ''')
+
+def _create_indexes(cursor):
+    # per-session lookups in get_recent_sessions and the exporter, already in timestamp order
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_commands_session ON commands(session_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_auth_attempts_session ON auth_attempts(session_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_captures_session ON captures(session_id)")
+    # newest-first listings
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions(start_time)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_commands_timestamp ON commands(timestamp)")
+    # repair_auth_attempts matches attempts to sessions by ip and time
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_ip ON sessions(ip, start_time)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_auth_attempts_ip ON auth_attempts(ip, timestamp)")
+
+def _add_command_telemetry(cursor):
+    _add_column(cursor, "commands", "handler", "TEXT")
+    _add_column(cursor, "commands", "queue_wait_ms", "REAL")
+    _add_column(cursor, "commands", "ttfb_ms", "REAL")
+    _add_column(cursor, "commands", "latency_ms", "REAL")
+    _add_column(cursor, "commands", "output_bytes", "INTEGER")
+    _add_column(cursor, "commands", "llm_tokens", "INTEGER")
+    _add_column(cursor, "commands", "exit_code", "INTEGER")
+    # slowest command families per handler
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_commands_handler ON commands(handler, latency_ms)")
+
+def _create_responses(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS responses (
+        hash TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        body BLOB NOT NULL,
+        first_seen TEXT NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    _add_column(cursor, "commands", "response_hash", "TEXT REFERENCES responses(hash)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_commands_response ON commands(response_hash)")
+
+# schema changes in order, the database's user_version is the last one applied.
+# add new steps at the end and never edit one that has shipped. Steps must also work
+# on databases created before versioning, hence IF NOT EXISTS and _add_column
+MIGRATIONS = [
+    (1, "base tables", _create_tables),
+    (2, "captures table", _create_captures),
+    (3, "indexes for session, ip and time lookups", _create_indexes),
+    (4, "per-command telemetry", _add_command_telemetry),
+    (5, "deduplicated response store", _create_responses),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def migrate(conn):
+    """Apply every migration newer than the database, each in its own transaction"""
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA user_version")
+    current = cursor.fetchone()[0]
+    if current > SCHEMA_VERSION:
+        logger.warning(f"Database schema version {current} is newer than this honeypot ({SCHEMA_VERSION})")
+        return current
+    
+    for version, description, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            apply(cursor)
+            cursor.execute(f"PRAGMA user_version = {version}")
+            cursor.execute("COMMIT")
+        except sqlite3.Error:
+            cursor.execute("ROLLBACK")
+            logger.error(f"Database migration {version} ({description}) failed")
+            raise
+        logger.info(f"Applied database migration {version}: {description}")
+        current = version
+    return current
+
+def init_db():
+    """Bring the schema up to date and close sessions left open by the last run"""
+    conn = get_db_connection()
+    # transactions are managed explicitly, DDL and user_version commit together
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    # persistent for the file, lets the writer commit while the exporter and frontend read
+    cursor.execute("PRAGMA journal_mode=WAL")
+    
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sessions'")
+    sessions_table_exists = cursor.fetchone() is not None
+    
+    version = migrate(conn)
+    logger.info(f"Database schema at version {version}")
     
     # only try to update sessions if the table exists
     if sessions_table_exists:
@@ -95,12 +342,12 @@ def init_db():
     except Exception as e:
         logger.error(f"Error repairing auth attempts: {e}")
     
-    conn.commit()
     conn.close()
     logger.info("Database initialized")
 
-def log_auth_attempt(ip, username, password, success, session_id=None):
-    """Log an authentication attempt"""
+def log_auth_attempt(ip, username, password, success, session_id=None, session_start=None):
+    """Log an authentication attempt, written with the next batch.
+    session_start is given for the first attempt of a connection and queues its session row"""
     try:
         # make sure we have a valid session_id
         if session_id is None:
@@ -108,84 +355,100 @@ def log_auth_attempt(ip, username, password, success, session_id=None):
             return
             
         timestamp = datetime.datetime.now().isoformat()
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        writes = []
+        if session_start is not None:
+            # queued right ahead of the attempt, a committed attempt always has its session
+            writes.append(('''
+            INSERT OR IGNORE INTO sessions (id, ip, username, start_time, success)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (session_id, ip, "unknown", session_start, False)))
+        writes.append(('''
         INSERT INTO auth_attempts (ip, username, password, timestamp, success, session_id)
         VALUES (?, ?, ?, ?, ?, ?)
-        ''', (ip, username, password, timestamp, success, session_id))
-        conn.commit()
-        conn.close()
+        ''', (ip, username, password, timestamp, success, session_id)))
+        _execute_batch(writes)
         logger.info(f"Logged auth attempt: {username}:{password} from {ip} (success={success}, session_id={session_id})")
     except sqlite3.Error as e:
         logger.error(f"Database error in log_auth_attempt: {e}")
 
-def log_session_start(ip, username, success):
-    """Log the start of a session and return its ID"""
+def log_session_start(session_id, ip, username, success, start_time):
+    """Fill in the row of a session that has opened a channel"""
     try:
-        timestamp = datetime.datetime.now().isoformat()
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-        INSERT INTO sessions (ip, username, start_time, success)
-        VALUES (?, ?, ?, ?)
-        ''', (ip, username, timestamp, success))
-        conn.commit()
-        session_id = cursor.lastrowid
-        return session_id
+        # the row normally exists since the first auth attempt
+        _execute_batch([('''
+        INSERT OR IGNORE INTO sessions (id, ip, username, start_time, success)
+        VALUES (?, ?, ?, ?, ?)
+        ''', (session_id, ip, username, start_time, success)), ('''
+        UPDATE sessions SET username = ?, success = ? WHERE id = ?
+        ''', (username, success, session_id))])
     except sqlite3.Error as e:
         logger.error(f"Database error in log_session_start: {e}")
-        return None
-    finally:
-        conn.close()
+
+def log_auth_only_session(session_id, ip, username, success, start_time):
+    """Record a connection that ended without opening a channel, written with the next batch"""
+    end_time = datetime.datetime.now().isoformat()
+    _execute_batch([('''
+    INSERT OR IGNORE INTO sessions (id, ip, username, start_time, end_time, success)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ''', (session_id, ip, username, start_time, end_time, success)), ('''
+    UPDATE sessions SET username = ?, end_time = ?, success = ? WHERE id = ?
+    ''', (username, end_time, success, session_id))])
 
 def log_session_end(session_id):
     """Update the session with its end time if it doesn't already have one"""
+    log_session_ends([(session_id, datetime.datetime.now().isoformat())])
+
+def log_session_ends(ends):
+    """Write the end times of several sessions in one transaction, ends holds (session_id, end_time)"""
+    # the end_time check is part of the update so it also works through the shared writer
+    _execute_batch([('''
+    UPDATE sessions SET end_time = ? WHERE id = ? AND end_time IS NULL
+    ''', (end_time, session_id)) for session_id, end_time in ends])
+    for session_id, end_time in ends:
+        logger.info(f"Updated session {session_id} with end time: {end_time}")
+
+def log_command(session_id, command, telemetry=None, timestamp=None):
+    """Log a command associated with a session, with its CommandTelemetry once it has finished"""
     try:
-        # first, we check if the session already has an end time
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT end_time FROM sessions WHERE id = ?', (session_id,))
-        result = cursor.fetchone()
-        
-        # if there's no result or end_time is already set, we can return
-        if not result:
-            logger.warning(f"Attempted to end non-existent session: {session_id}")
-            conn.close()
-            return
-            
-        if result[0] is not None:
-            logger.info(f"Session {session_id} already has end time: {result[0]}")
-            conn.close()
+        timestamp = timestamp or datetime.datetime.now().isoformat()
+        if telemetry is None:
+            _execute_write('''
+            INSERT INTO commands (session_id, command, timestamp)
+            VALUES (?, ?, ?)
+            ''', (session_id, command, timestamp))
+        else:
+            columns = telemetry.columns()
+            batch = [(f'''
+            INSERT INTO commands (session_id, command, timestamp, {", ".join(columns)})
+            VALUES (?, ?, ?{", ?" * len(columns)})
+            ''', (session_id, command, timestamp, *columns.values()))]
+            if telemetry.response:
+                # the body goes in the same transaction, ahead of the row referencing it,
+                # a hash already stored is ignored by the insert itself
+                digest, size, body = telemetry.response
+                batch.insert(0, ('''
+                INSERT OR IGNORE INTO responses (hash, size, body, first_seen)
+                VALUES (?, ?, ?, ?)
+                ''', (digest, size, body, timestamp)))
+            _execute_batch(batch)
+            logger.info(f"Logged command for session {session_id}: {command} "
+                        f"({columns['handler']}, {columns['latency_ms']} ms, {columns['output_bytes']} bytes)")
             return
-        
-        # set the end time
-        timestamp = datetime.datetime.now().isoformat()
-        cursor.execute('''
-        UPDATE sessions SET end_time = ? WHERE id = ?
-        ''', (timestamp, session_id))
-        conn.commit()
-        logger.info(f"Updated session {session_id} with end time: {timestamp}")
-        conn.close()
+        logger.info(f"Logged command for session {session_id}: {command}")
     except sqlite3.Error as e:
-        logger.error(f"Database error in log_session_end: {e}")
+        logger.error(f"Database error in log_command: {e}")
 
-def log_command(session_id, command):
-    """Log a command associated with a session"""
+def log_capture(session_id, path, sha256, size):
+    """Record a file written in a session, the content itself is kept by the capture store"""
     try:
         timestamp = datetime.datetime.now().isoformat()
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-        INSERT INTO commands (session_id, command, timestamp)
-        VALUES (?, ?, ?)
-        ''', (session_id, command, timestamp))
-        conn.commit()
-        logger.info(f"Logged command for session {session_id}: {command}")
+        _execute_write('''
+        INSERT INTO captures (session_id, path, sha256, size, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+        ''', (session_id, path, sha256, size, timestamp))
+        logger.info(f"Logged capture for session {session_id}: {path} ({sha256})")
     except sqlite3.Error as e:
-        logger.error(f"Database error in log_command: {e}")
-    finally:
-        conn.close()
+        logger.error(f"Database error in log_capture: {e}")
 
 def get_recent_sessions(limit=10):
     """Get recent sessions with their commands"""
@@ -224,6 +487,20 @@ def get_recent_sessions(limit=10):
     finally:
         conn.close()
 
+def get_response(digest):
+    """Text the honeypot answered for a response hash, None if it is not stored"""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT body FROM responses WHERE hash = ?", (digest,))
+        row = cursor.fetchone()
+        return decompress(row[0]) if row else None
+    except sqlite3.Error as e:
+        logger.error(f"Database error in get_response: {e}")
+        return None
+    finally:
+        conn.close()
+
 def get_command_stats():
     """Get statistics about command usage"""
     try:
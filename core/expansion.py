@@ -0,0 +1,169 @@
+"""
+Brace and pathname expansion of command arguments, done before a command runs.
+Wildcards are matched against the virtual filesystem. Directory listings are cached
+per directory version, so repeated globs over an unchanged tree do no listing work.
+"""
+import fnmatch
+import itertools
+import posixpath
+import re
+
+GLOB_CHARS = re.compile(r"[*?\[]")
+SEQUENCE = re.compile(r"(-?\d+|[a-zA-Z])\.\.(-?\d+|[a-zA-Z])(?:\.\.(-?\d+))?$")
+BRACE_LIMIT = 4096  # words one argument may expand to, {1..99999999} is cut short
+
+# compiled patterns and directory listings, both cleared when full
+PATTERN_CACHE_SIZE = 1024
+LISTING_CACHE_SIZE = 4096
+_patterns = {}
+
+
+def _sequence(body):
+    """Words of a {first..last[..step]} sequence, None if body is not one"""
+    match = SEQUENCE.match(body)
+    if not match:
+        return None
+    first, last, step = match.groups()
+    step = abs(int(step)) if step and int(step) else 1
+
+    if first.isalpha() != last.isalpha():
+        return None
+    if first.isalpha():
+        start, end = ord(first), ord(last)
+        values = range(start, end + 1, step) if start <= end else range(start, end - 1, -step)
+        return [chr(value) for value in itertools.islice(values, BRACE_LIMIT)]
+
+    start, end = int(first), int(last)
+    # a leading zero on either end pads every number to the same width
+    padded = any(len(number.lstrip("-")) > 1 and number.lstrip("-").startswith("0") for number in (first, last))
+    width = max(len(first), len(last)) if padded else 0
+    values = range(start, end + 1, step) if start <= end else range(start, end - 1, -step)
+    return [f"{value:0{width}d}" for value in itertools.islice(values, BRACE_LIMIT)]
+
+
+def expand_braces(word):
+    """Words produced by brace expansion of word, like a{b,c}d or file{1..3}, in order"""
+    for start, char in enumerate(word):
+        if char != "{" or (start and word[start - 1] == "$"):
+            continue
+
+        # find the matching brace and the commas at this nesting level
+        depth = 0
+        commas = []
+        for end in range(start, len(word)):
+            if word[end] == "{":
+                depth += 1
+            elif word[end] == "}":
+                depth -= 1
+                if not depth:
+                    break
+            elif word[end] == "," and depth == 1:
+                commas.append(end)
+        else:
+            return [word]  # unbalanced, taken literally like bash does
+
+        if commas:
+            bounds = [start, *commas, end]
+            alternatives = [word[left + 1:right] for left, right in zip(bounds, bounds[1:])]
+        else:
+            alternatives = _sequence(word[start + 1:end])
+            if alternatives is None:
+                continue  # {x} or {} is literal, a later brace may still expand
+
+        prefix, suffix = word[:start], word[end + 1:]
+        words = []
+        for alternative in alternatives:
+            for rest in expand_braces(alternative + suffix):
+                words.append(prefix + rest)
+                if len(words) >= BRACE_LIMIT:
+                    return words
+        return words
+    return [word]
+
+
+def _pattern(component):
+    regex = _patterns.get(component)
+    if regex is None:
+        if len(_patterns) >= PATTERN_CACHE_SIZE:
+            _patterns.clear()
+        # bash also accepts [^...] for a negated set
+        regex = _patterns[component] = re.compile(fnmatch.translate(component.replace("[^", "[!")))
+    return regex
+
+
+def _is_quoted(word):
+    return len(word) > 1 and word[0] == word[-1] and word[0] in "'\""
+
+
+class GlobExpander:
+    """Expands the arguments of a command against one VirtualFilesystem"""
+    def __init__(self, filesystem):
+        self.filesystem = filesystem
+        self.listings = {}  # (session_id or None, path) -> (directory version, [(name, is_dir)])
+
+    def expand(self, words, session_id, current_dir):
+        """Arguments after brace and pathname expansion, quoted words are left alone.
+        A pattern without matches is kept as it was written, like bash without nullglob"""
+        result = []
+        for word in words:
+            if _is_quoted(word):
+                result.append(word)
+                continue
+            for expanded in expand_braces(word) if "{" in word else (word,):
+                matches = self.glob(expanded, session_id, current_dir) if GLOB_CHARS.search(expanded) else None
+                result.extend(matches or (expanded,))
+        return result
+
+    def glob(self, pattern, session_id, current_dir):
+        """Paths matching a wildcard pattern in the session's view, relative patterns give relative paths"""
+        absolute = pattern.startswith("/")
+        components = [component for component in pattern.split("/") if component]
+        # (path as shown, real path) for every match so far
+        matches = [("/" if absolute else "", "/" if absolute else current_dir)]
+
+        for index, component in enumerate(components):
+            last = index == len(components) - 1
+            wanted_dir = not last or pattern.endswith("/")
+            found = []
+            for shown, real in matches:
+                if not GLOB_CHARS.search(component):
+                    # literal component, checked by the listing below it or at the end
+                    found.append((self._join(shown, component), posixpath.join(real, component)))
+                    continue
+                entries = self._entries(real, session_id)
+                if not entries:
+                    continue
+                regex = _pattern(component)
+                hidden = component.startswith(".")
+                for name, is_dir in entries:
+                    if (hidden or not name.startswith(".")) and (is_dir or not wanted_dir) and regex.match(name):
+                        found.append((self._join(shown, name), posixpath.join(real, name)))
+            matches = found
+            if not matches:
+                return []
+
+        if components and not GLOB_CHARS.search(components[-1]):
+            matches = [match for match in matches if self.filesystem.file_exists(match[1], session_id)]
+        suffix = "/" if pattern.endswith("/") and components else ""
+        return [shown + suffix for shown, real in matches]
+
+    @staticmethod
+    def _join(shown, name):
+        return shown + name if shown in ("", "/") else f"{shown}/{name}"
+
+    def _entries(self, path, session_id):
+        """(name, is_dir) of a directory's children, cached until the session changes the directory"""
+        version = self.filesystem.directory_version(path, session_id)
+        if version is None:
+            return None
+        # base directories the session never changed share one listing across sessions
+        key = (session_id if version else None, posixpath.normpath(path))
+        cached = self.listings.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        entries = [(entry.name, entry.is_dir) for entry in self.filesystem.scandir(path, session_id)]
+        if len(self.listings) >= LISTING_CACHE_SIZE:
+            self.listings.clear()
+        self.listings[key] = (version, entries)
+        return entries
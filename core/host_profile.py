@@ -0,0 +1,288 @@
+"""
+Profile of the emulated host and the generated files of /proc, /sys and /dev.
+Hardware, kernel and boot time are worked out once from the hostname, so every session
+and every reconnect sees the same machine. Uptime, load and free memory are computed
+from the clock when a file is read, they drift realistically without any stored state.
+"""
+import math
+import os
+import random
+import stat
+import time
+import uuid
+from config import HOSTNAME, KERNEL_RELEASE, KERNEL_BUILD, HOST_CPU_MODEL, HOST_CPU_COUNT, HOST_MEMORY_MB
+
+KERNEL_FILE_MODE = stat.S_IFREG | 0o444
+CONFIG_FILE_MODE = stat.S_IFREG | 0o644
+DEVICE_MODE = stat.S_IFCHR | 0o666
+INTERFACE = "ens18"  # matches the login banner
+
+# path -> (mode, size as ls shows it, HostProfile method rendering the content)
+GENERATED_FILES = {
+    "/proc/cpuinfo": (KERNEL_FILE_MODE, 0, "cpuinfo"),
+    "/proc/meminfo": (KERNEL_FILE_MODE, 0, "meminfo"),
+    "/proc/version": (KERNEL_FILE_MODE, 0, "version"),
+    "/proc/cmdline": (KERNEL_FILE_MODE, 0, "cmdline"),
+    "/proc/modules": (KERNEL_FILE_MODE, 0, "modules"),
+    "/proc/mounts": (KERNEL_FILE_MODE, 0, "mounts"),
+    "/proc/uptime": (KERNEL_FILE_MODE, 0, "uptime"),
+    "/proc/loadavg": (KERNEL_FILE_MODE, 0, "loadavg"),
+    "/proc/sys/kernel/hostname": (KERNEL_FILE_MODE, 0, "hostname"),
+    "/etc/hostname": (CONFIG_FILE_MODE, len(HOSTNAME) + 1, "hostname"),
+    "/sys/class/dmi/id/sys_vendor": (KERNEL_FILE_MODE, 4096, "sys_vendor"),
+    "/sys/class/dmi/id/product_name": (KERNEL_FILE_MODE, 4096, "product_name"),
+    "/sys/class/dmi/id/bios_vendor": (KERNEL_FILE_MODE, 4096, "bios_vendor"),
+    "/sys/devices/system/cpu/online": (KERNEL_FILE_MODE, 4096, "cpu_online"),
+    f"/sys/class/net/{INTERFACE}/address": (KERNEL_FILE_MODE, 4096, "mac_address"),
+    f"/sys/class/net/{INTERFACE}/operstate": (KERNEL_FILE_MODE, 4096, "operstate"),
+    "/dev/null": (DEVICE_MODE, 0, "null"),
+    "/dev/zero": (DEVICE_MODE, 0, "zero"),
+    "/dev/random": (DEVICE_MODE, 0, "random_bytes"),
+    "/dev/urandom": (DEVICE_MODE, 0, "random_bytes"),
+}
+DYNAMIC_FILES = {"meminfo", "uptime", "loadavg", "random_bytes"}  # rendered on every read
+DEVICE_READ_SIZE = 512  # bytes a read of /dev/zero or /dev/urandom returns, the real devices never end
+# random bytes folded onto printable ascii, one character stays one byte on the wire and in captures
+PRINTABLE_BYTES = bytes(0x21 + value % 94 for value in range(256))
+
+CPU_FLAGS = (
+    "fpu vme de pse tsc msr pae mce cx8 apic sep mtrr pge mca cmov pat pse36 clflush mmx fxsr sse sse2 ss ht "
+    "syscall nx pdpe1gb rdtscp lm constant_tsc arch_perfmon rep_good nopl xtopology cpuid tsc_known_freq pni "
+    "pclmulqdq ssse3 fma cx16 pcid sse4_1 sse4_2 x2apic movbe popcnt tsc_deadline_timer aes xsave avx f16c "
+    "rdrand hypervisor lahf_lm abm 3dnowprefetch cpuid_fault invpcid_single pti ssbd ibrs ibpb stibp fsgsbase "
+    "tsc_adjust bmi1 hle avx2 smep bmi2 erms invpcid rtm rdseed adx smap xsaveopt arat md_clear flush_l1d "
+    "arch_capabilities"
+)
+CPU_BUGS = "cpu_meltdown spectre_v1 spectre_v2 spec_store_bypass l1tf mds swapgs taa itlb_multihit mmio_stale_data"
+
+# (name, size, modules using it) as lsmod lists them on a small Ubuntu server
+KERNEL_MODULES = [
+    ("tls", 155648, []),
+    ("xt_conntrack", 12288, []),
+    ("nft_chain_nat", 12288, []),
+    ("xt_MASQUERADE", 16384, []),
+    ("nf_nat", 61440, ["nft_chain_nat", "xt_MASQUERADE"]),
+    ("nf_conntrack_netlink", 57344, []),
+    ("nf_conntrack", 196608, ["xt_conntrack", "nf_nat", "xt_MASQUERADE", "nf_conntrack_netlink"]),
+    ("nf_defrag_ipv6", 24576, ["nf_conntrack"]),
+    ("nf_defrag_ipv4", 12288, ["nf_conntrack"]),
+    ("xt_addrtype", 12288, []),
+    ("nft_compat", 20480, []),
+    ("nf_tables", 376832, ["nft_chain_nat", "nft_compat"]),
+    ("br_netfilter", 32768, []),
+    ("bridge", 421888, ["br_netfilter"]),
+    ("stp", 12288, ["bridge"]),
+    ("llc", 16384, ["bridge", "stp"]),
+    ("overlay", 212992, []),
+    ("binfmt_misc", 24576, []),
+    ("intel_rapl_msr", 20480, []),
+    ("intel_rapl_common", 40960, ["intel_rapl_msr"]),
+    ("kvm_intel", 487424, []),
+    ("kvm", 1437696, ["kvm_intel"]),
+    ("irqbypass", 12288, ["kvm"]),
+    ("input_leds", 12288, []),
+    ("joydev", 32768, []),
+    ("serio_raw", 20480, []),
+    ("qemu_fw_cfg", 20480, []),
+    ("sch_fq_codel", 24576, []),
+    ("dm_multipath", 45056, []),
+    ("msr", 12288, []),
+    ("efi_pstore", 12288, []),
+    ("ip_tables", 32768, []),
+    ("x_tables", 65536, ["xt_conntrack", "xt_MASQUERADE", "xt_addrtype", "nft_compat", "ip_tables"]),
+    ("autofs4", 57344, []),
+    ("btrfs", 2015232, []),
+    ("blake2b_generic", 24576, []),
+    ("raid10", 73728, []),
+    ("raid456", 196608, []),
+    ("async_raid6_recov", 20480, ["raid456"]),
+    ("async_memcpy", 16384, ["raid456", "async_raid6_recov"]),
+    ("async_pq", 20480, ["raid456", "async_raid6_recov"]),
+    ("async_xor", 16384, ["raid456", "async_raid6_recov", "async_pq"]),
+    ("async_tx", 16384, ["raid456", "async_raid6_recov", "async_memcpy", "async_pq", "async_xor"]),
+    ("xor", 20480, ["btrfs", "async_xor"]),
+    ("raid6_pq", 118784, ["btrfs", "raid456", "async_raid6_recov", "async_pq"]),
+    ("libcrc32c", 12288, ["nf_nat", "nf_conntrack", "nf_tables", "btrfs", "raid456"]),
+    ("raid1", 57344, []),
+    ("raid0", 24576, []),
+    ("crct10dif_pclmul", 12288, []),
+    ("crc32_pclmul", 12288, []),
+    ("polyval_clmulni", 12288, []),
+    ("polyval_generic", 12288, ["polyval_clmulni"]),
+    ("ghash_clmulni_intel", 16384, []),
+    ("sha256_ssse3", 32768, []),
+    ("sha1_ssse3", 32768, []),
+    ("aesni_intel", 356352, []),
+    ("crypto_simd", 16384, ["aesni_intel"]),
+    ("cryptd", 24576, ["ghash_clmulni_intel", "crypto_simd"]),
+    ("psmouse", 217088, []),
+    ("virtio_net", 77824, []),
+    ("net_failover", 20480, ["virtio_net"]),
+    ("failover", 12288, ["net_failover"]),
+    ("virtio_scsi", 28672, []),
+]
+
+
+class HostProfile:
+    """Hardware, kernel and boot time of the emulated host, shared by every session"""
+    def __init__(self, seed=HOSTNAME):
+        rng = random.Random(seed)
+        self.cpu_count = HOST_CPU_COUNT
+        # the kernel keeps part of the RAM for itself, MemTotal is always a little short
+        self.memory_kb = HOST_MEMORY_MB * 1024 - 130000 - rng.randrange(20000)
+        self.boot_time = time.time() - rng.uniform(3, 45) * 86400
+        self.root_uuid = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        self.mac = "bc:24:11:" + ":".join(f"{rng.randrange(256):02x}" for _ in range(3))
+        self.base_load = rng.uniform(0.04, 0.12) * self.cpu_count
+        self.phase = rng.uniform(0, 2 * math.pi)
+        self.rendered = {}  # method -> content of the files that never change
+
+    def render(self, path):
+        """Content of a generated file, None if path is not one"""
+        spec = GENERATED_FILES.get(path)
+        if spec is None:
+            return None
+        method = spec[2]
+        if method in DYNAMIC_FILES:
+            return getattr(self, method)()
+        content = self.rendered.get(method)
+        if content is None:
+            content = self.rendered[method] = getattr(self, method)()
+        return content
+
+    def _wave(self, period, phase_factor=1):
+        return math.sin(time.time() / period + self.phase * phase_factor)
+
+    def cpuinfo(self):
+        blocks = []
+        for cpu in range(self.cpu_count):
+            blocks.append("\n".join([
+                f"processor\t: {cpu}",
+                "vendor_id\t: GenuineIntel",
+                "cpu family\t: 6",
+                "model\t\t: 79",
+                f"model name\t: {HOST_CPU_MODEL}",
+                "stepping\t: 1",
+                "microcode\t: 0xb000040",
+                "cpu MHz\t\t: 2399.996",
+                "cache size\t: 35840 KB",
+                "physical id\t: 0",
+                f"siblings\t: {self.cpu_count}",
+                f"core id\t\t: {cpu}",
+                f"cpu cores\t: {self.cpu_count}",
+                f"apicid\t\t: {cpu}",
+                f"initial apicid\t: {cpu}",
+                "fpu\t\t: yes",
+                "fpu_exception\t: yes",
+                "cpuid level\t: 20",
+                "wp\t\t: yes",
+                f"flags\t\t: {CPU_FLAGS}",
+                f"bugs\t\t: {CPU_BUGS}",
+                "bogomips\t: 4799.99",
+                "clflush size\t: 64",
+                "cache_alignment\t: 64",
+                "address sizes\t: 46 bits physical, 48 bits virtual",
+                "power management:",
+            ]))
+        return "\n\n".join(blocks) + "\n\n"
+
+    def meminfo(self):
+        total = self.memory_kb
+        # page cache and free memory trade places slowly, the sum stays put
+        free = int(total * (0.38 + 0.04 * self._wave(900)))
+        buffers = int(total * 0.012)
+        cached = int(total * 0.47) - (free - int(total * 0.38))
+        slab = int(total * 0.035)
+        lines = [
+            ("MemTotal", total), ("MemFree", free), ("MemAvailable", free + cached + buffers - int(total * 0.03)),
+            ("Buffers", buffers), ("Cached", cached), ("SwapCached", 0),
+            ("Active", int(total * 0.21)), ("Inactive", int(total * 0.33)),
+            ("SwapTotal", 4194300), ("SwapFree", 4194300), ("Dirty", 84 + int(60 * (1 + self._wave(37)))),
+            ("Writeback", 0), ("AnonPages", int(total * 0.095)), ("Mapped", int(total * 0.028)),
+            ("Shmem", int(total * 0.004)), ("Slab", slab), ("SReclaimable", int(slab * 0.62)),
+            ("SUnreclaim", slab - int(slab * 0.62)), ("KernelStack", 3728 + self.cpu_count * 256),
+            ("PageTables", int(total * 0.0018)), ("CommitLimit", total // 2 + 4194300),
+            ("Committed_AS", int(total * 0.18)), ("VmallocTotal", 34359738367), ("VmallocUsed", 28064),
+            ("VmallocChunk", 0), ("Percpu", 1024 * self.cpu_count), ("HugePages_Total", None),
+            ("Hugepagesize", 2048), ("DirectMap4k", 176000), ("DirectMap2M", total - 176000 + 262144),
+        ]
+        output = []
+        for name, value in lines:
+            if value is None:
+                output.append(f"{name + ':':<16}{0:>8}")
+            else:
+                output.append(f"{name + ':':<16}{value:>8} kB")
+        return "\n".join(output) + "\n"
+
+    def version(self):
+        return (f"Linux version {KERNEL_RELEASE} (buildd@lcy02-amd64-017) (x86_64-linux-gnu-gcc-13 "
+                f"(Ubuntu 13.3.0-6ubuntu2~24.04) 13.3.0, GNU ld (GNU Binutils for Ubuntu) 2.42) {KERNEL_BUILD}\n")
+
+    def cmdline(self):
+        return f"BOOT_IMAGE=/vmlinuz-{KERNEL_RELEASE} root=UUID={self.root_uuid} ro\n"
+
+    def modules(self):
+        lines = []
+        for name, size, users in KERNEL_MODULES:
+            used_by = "".join(f"{user}," for user in users) or "-"
+            lines.append(f"{name} {size} {len(users)} {used_by} Live 0x0000000000000000")
+        return "\n".join(lines) + "\n"
+
+    def mounts(self):
+        return "\n".join([
+            "sysfs /sys sysfs rw,nosuid,nodev,noexec,relatime 0 0",
+            "proc /proc proc rw,nosuid,nodev,noexec,relatime 0 0",
+            f"udev /dev devtmpfs rw,nosuid,relatime,size={self.memory_kb // 2}k,nr_inodes={self.memory_kb // 8},mode=755,inode64 0 0",
+            "devpts /dev/pts devpts rw,nosuid,noexec,relatime,gid=5,mode=620,ptmxmode=000 0 0",
+            f"tmpfs /run tmpfs rw,nosuid,nodev,noexec,relatime,size={self.memory_kb // 10}k,mode=755,inode64 0 0",
+            "/dev/sda2 / ext4 rw,relatime 0 0",
+            "tmpfs /dev/shm tmpfs rw,nosuid,nodev,inode64 0 0",
+            "tmpfs /run/lock tmpfs rw,nosuid,nodev,noexec,relatime,size=5120k,inode64 0 0",
+            "cgroup2 /sys/fs/cgroup cgroup2 rw,nosuid,nodev,noexec,relatime,nsdelegate,memory_recursiveprot 0 0",
+            "/dev/sda1 /boot/efi vfat rw,relatime,fmask=0077,dmask=0077,codepage=437,iocharset=iso8859-1 0 0",
+        ]) + "\n"
+
+    def uptime(self):
+        uptime = time.time() - self.boot_time
+        # idle time is summed over all CPUs, a mostly idle server keeps it just below uptime x CPUs
+        return f"{uptime:.2f} {uptime * self.cpu_count * 0.97:.2f}\n"
+
+    def loadavg(self):
+        load1 = self.base_load * (1 + 0.5 * self._wave(150) + 0.25 * self._wave(37, 2))
+        load5 = self.base_load * (1 + 0.25 * self._wave(600))
+        load15 = self.base_load * (1 + 0.1 * self._wave(1800))
+        uptime = time.time() - self.boot_time
+        running = 1 + int(2 * (1 + self._wave(11, 3)) * self.base_load)
+        processes = 245 + int(6 * self._wave(300, 2))
+        last_pid = 1200 + int(uptime * 0.4) % 4190000
+        return f"{max(load1, 0):.2f} {load5:.2f} {load15:.2f} {running}/{processes} {last_pid}\n"
+
+    def sys_vendor(self):
+        return "QEMU\n"
+
+    def product_name(self):
+        return "Standard PC (i440FX + PIIX, 1996)\n"
+
+    def bios_vendor(self):
+        return "SeaBIOS\n"
+
+    def cpu_online(self):
+        return f"0-{self.cpu_count - 1}\n" if self.cpu_count > 1 else "0\n"
+
+    def mac_address(self):
+        return f"{self.mac}\n"
+
+    def operstate(self):
+        return "up\n"
+
+    def hostname(self):
+        return f"{HOSTNAME}\n"
+
+    def null(self):
+        return ""
+
+    def zero(self):
+        return "\0" * DEVICE_READ_SIZE
+
+    def random_bytes(self):
+        return os.urandom(DEVICE_READ_SIZE).translate(PRINTABLE_BYTES).decode('ascii')
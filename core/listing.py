@@ -0,0 +1,123 @@
+"""
+Rendering of directory listings for ls, stat, du and tab completion.
+Formatters work on the DirEntry objects from VirtualFilesystem.scandir(),
+names are never parsed back out of formatted output.
+"""
+import stat
+import time
+import zlib
+from config import USERNAME
+
+DIR_COLOR = "\033[1;34m"  # blue for directories
+RESET_COLOR = "\033[0m"
+BLOCK_SIZE = 4096
+RECENT_SECONDS = 182 * 24 * 3600  # ls shows the time instead of the year for files newer than six months
+USER_IDS = {"root": 0, "shadow": 42, USERNAME: 1000}
+
+# formatted timestamps, entries share a handful of distinct times
+TIMESTAMP_CACHE_SIZE = 4096
+_ls_dates = {}
+_stat_times = {}
+
+
+def display_name(entry, color=True, indicators=False):
+    """Name of an entry as ls shows it, with the -F suffix and color for directories"""
+    name = entry.name
+    if entry.is_dir:
+        if indicators:
+            name += "/"
+        if color:
+            name = f"{DIR_COLOR}{name}{RESET_COLOR}"
+    return name
+
+
+def disk_blocks(entry):
+    """Space used on disk in 1K blocks, rounded up to whole filesystem blocks"""
+    return -(-entry.size // BLOCK_SIZE) * (BLOCK_SIZE // 1024)
+
+
+def _cached(cache, key, render):
+    value = cache.get(key)
+    if value is None:
+        if len(cache) >= TIMESTAMP_CACHE_SIZE:
+            cache.clear()
+        value = cache[key] = render()
+    return value
+
+
+def ls_date(mtime, now):
+    """Date column of ls -l, the time for recent files and the year for old ones"""
+    recent = now - RECENT_SECONDS < mtime <= now + 3600
+    pattern = "%b %e %H:%M" if recent else "%b %e  %Y"
+    return _cached(_ls_dates, (int(mtime), recent), lambda: time.strftime(pattern, time.localtime(mtime)))
+
+
+def stat_time(timestamp):
+    """Timestamp as stat prints it, with nanoseconds and the UTC offset"""
+    def render():
+        local = time.localtime(timestamp)
+        nanoseconds = int(timestamp % 1 * 1e9)
+        return f"{time.strftime('%Y-%m-%d %H:%M:%S', local)}.{nanoseconds:09d} {time.strftime('%z', local)}"
+    return _cached(_stat_times, timestamp, render)
+
+
+def format_columns(entries, color=True, indicators=False):
+    """Short ls format, names separated by two spaces"""
+    return "  ".join(display_name(entry, color, indicators) for entry in entries)
+
+
+def format_long(entries, color=True, indicators=False, total=False):
+    """ls -l format, one aligned line per entry, with the total line of a directory listing"""
+    now = time.time()
+    rows = [(stat.filemode(entry.mode), str(entry.nlink), entry.owner, entry.group, str(entry.size),
+             ls_date(entry.mtime, now), display_name(entry, color, indicators)) for entry in entries]
+
+    lines = [f"total {sum(disk_blocks(entry) for entry in entries)}"] if total else []
+    if rows:
+        links, owners, groups, sizes = (max(len(row[column]) for row in rows) for column in range(1, 5))
+        for mode, nlink, owner, group, size, date, name in rows:
+            lines.append(f"{mode} {nlink:>{links}} {owner:<{owners}} {group:<{groups}} {size:>{sizes}} {date} {name}")
+    return "\n".join(lines)
+
+
+def format_stat(entry, name):
+    """Output of stat for one entry, name is the path as it was given"""
+    if entry.is_dir:
+        kind = "directory"
+    elif stat.S_ISCHR(entry.mode):
+        kind = "character special file"
+    elif entry.size:
+        kind = "regular file"
+    else:
+        kind = "regular empty file"
+    inode = 131072 + zlib.crc32(entry.path.encode('utf-8')) % 4000000
+    uid = USER_IDS.get(entry.owner, 1000)
+    gid = USER_IDS.get(entry.group, 1000)
+    return "\n".join([
+        f"  File: {name}",
+        f"  Size: {entry.size:<15} Blocks: {disk_blocks(entry) * 2:<10} IO Block: {BLOCK_SIZE}   {kind}",
+        f"Device: 803h/2051d\tInode: {inode:<11} Links: {entry.nlink}",
+        f"Access: ({stat.S_IMODE(entry.mode):04o}/{stat.filemode(entry.mode)})  "
+        f"Uid: ({uid:>5}/{entry.owner:>8})   Gid: ({gid:>5}/{entry.group:>8})",
+        f"Access: {stat_time(entry.atime)}",
+        f"Modify: {stat_time(entry.mtime)}",
+        f"Change: {stat_time(entry.ctime)}",
+        " Birth: -",
+    ])
+
+
+def format_size(kilobytes, human=False):
+    """du size column, 1K blocks or a -h style size"""
+    if not human or not kilobytes:
+        return str(kilobytes)
+    size = float(kilobytes)
+    for unit in ("K", "M", "G"):
+        if size < 1024:
+            return f"{size:.1f}{unit}" if size < 10 else f"{size:.0f}{unit}"
+        size /= 1024
+    return f"{size:.0f}T"
+
+
+def completion_candidates(entries, prefix):
+    """Names starting with prefix for tab completion, directories end in a slash"""
+    return [entry.name + "/" if entry.is_dir else entry.name for entry in entries if entry.name.startswith(prefix)]
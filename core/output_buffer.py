@@ -0,0 +1,75 @@
+"""
+Coalesced channel output for the SSH honeypot.
+Every channel.send becomes its own encrypted SSH packet, so session output is
+gathered here and written in a few large sends instead of one per line or keystroke.
+"""
+import threading
+from config import OUTPUT_BUFFER_SIZE, OUTPUT_FLUSH_DELAY
+
+
+class OutputBuffer:
+    """
+    Per-session write buffer in front of a paramiko channel.
+    Data is sent when flush() is called (prompt shown, input handled), once
+    max_bytes are pending, or at the latest delay seconds after the first write.
+    Both thresholds can be overridden per write, streamed tokens use larger frames.
+    """
+    def __init__(self, channel, schedule, max_bytes=OUTPUT_BUFFER_SIZE, delay=OUTPUT_FLUSH_DELAY):
+        self.channel = channel
+        self.schedule = schedule  # schedule(delay, callback) returning a handle with cancel()
+        self.max_bytes = max_bytes
+        self.delay = delay
+
+        self.lock = threading.Lock()
+        self.chunks = []
+        self.size = 0
+        self.timer = None  # pending delayed flush
+
+    def write(self, data, max_bytes=None, delay=None):
+        """Queue data for the client, sends right away once the size threshold is hit"""
+        if not data:
+            return
+        with self.lock:
+            self.chunks.append(data)
+            self.size += len(data)
+            if self.size >= (max_bytes or self.max_bytes):
+                self._flush()
+            elif self.timer is None:
+                self.timer = self.schedule(delay or self.delay, self.flush)
+
+    def flush(self):
+        """Send everything pending as a single write"""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        # caller holds the lock
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.chunks:
+            return
+
+        data = "".join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        if self.channel.closed:
+            return
+        # send() may write only part of a large buffer, sendall() loops until it is all out
+        self.channel.sendall(data.encode('utf-8'))
+
+
+class StreamedOutput:
+    """
+    Command output produced chunk by chunk, like cat of a large file.
+    The session writes each chunk to the channel as it is produced instead of
+    building the whole response first. The chunks can only be read once.
+    """
+    def __init__(self, chunks):
+        self.chunks = chunks  # iterable of str
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def __str__(self):
+        return "".join(self.chunks)
@@ -0,0 +1,144 @@
+"""
+Background teardown of finished sessions.
+Disconnecting connections hand their session to the reclaimer and return right away.
+One thread writes the session end times in a single transaction per batch and drops
+the per-session state, so a wave of disconnects does not tie up connection threads.
+Captured files are hashed, compressed and written to disk on the same thread.
+"""
+import datetime
+import os
+import queue
+import shutil
+import threading
+from utils.log_setup import logger
+from core.database import log_session_ends
+from config import RECLAIM_QUEUE_SIZE, RECLAIM_BATCH, RECLAIM_SUBMIT_TIMEOUT
+
+# job kinds
+END = "end"          # (END, session_id, end_time), write the session's end time
+RELEASE = "release"  # (RELEASE, session_id, command_processor), drop the session's state
+SWEEP = "sweep"      # (SWEEP, directory, None), remove session directories left by an earlier run
+CAPTURE = "capture"  # (CAPTURE, session_id, (store, path, content)), keep a file written in a session
+
+
+class SessionReclaimer:
+    """
+    Bounded queue of teardown jobs served by a single thread.
+    When the queue stays full for RECLAIM_SUBMIT_TIMEOUT the submitting thread does
+    the job itself, which slows disconnect handling instead of growing the backlog.
+    """
+    def __init__(self, max_pending=RECLAIM_QUEUE_SIZE, batch_size=RECLAIM_BATCH):
+        self.jobs = queue.Queue(max_pending)
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def end_session(self, session_id):
+        """Record the end time of a session that wrote its row when it opened a channel"""
+        self._submit((END, session_id, datetime.datetime.now().isoformat()))
+
+    def release_session(self, session_id, command_processor):
+        """Drop the command processor and filesystem state of a closed session"""
+        self._submit((RELEASE, session_id, command_processor))
+
+    def sweep(self, directory):
+        """Remove session_* directories an earlier run left in directory"""
+        self._submit((SWEEP, directory, None))
+
+    def capture(self, store, session_id, path, content):
+        """Record a written file in a capture store off the request path"""
+        self._submit((CAPTURE, session_id, (store, path, content)))
+
+    def pending(self):
+        return self.jobs.qsize()
+
+    def _submit(self, job):
+        self._ensure_thread()
+        try:
+            self.jobs.put(job, timeout=RECLAIM_SUBMIT_TIMEOUT)
+        except queue.Full:
+            logger.warning(f"Session reclaim queue full, doing {job[0]} for {job[1]} inline")
+            self._apply([job])
+
+    def _ensure_thread(self):
+        # started lazily so forked workers get their own thread
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="honeypot-reclaimer")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def stop(self, timeout=10):
+        """Finish every queued job and stop the thread, used on shutdown"""
+        with self._lock:
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self.jobs.put(None)
+        thread.join(timeout)
+
+    def _run(self):
+        running = True
+        while running:
+            batch = [self.jobs.get()]
+            # whatever else is already waiting goes into the same batch
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [job for job in batch if job is not None]
+            try:
+                self._apply(batch)
+            except Exception as e:
+                logger.error(f"Error reclaiming {len(batch)} sessions: {e}")
+
+    def _apply(self, batch):
+        ends = [(session_id, end_time) for kind, session_id, end_time in batch if kind == END]
+        if ends:
+            # one transaction for every end time in the batch
+            log_session_ends(ends)
+
+        for kind, target, extra in batch:
+            if kind == RELEASE:
+                try:
+                    extra.cleanup_session(target)
+                except Exception as e:
+                    logger.error(f"Error cleaning up session {target}: {e}")
+            elif kind == SWEEP:
+                self._sweep(target)
+            elif kind == CAPTURE:
+                store, path, content = extra
+                try:
+                    store.record(target, path, content)
+                except Exception as e:
+                    logger.error(f"Error capturing {path} for session {target}: {e}")
+
+        released = sum(1 for job in batch if job[0] == RELEASE)
+        if released > 1 or len(ends) > 1:
+            logger.info(f"Reclaimed {released} sessions, wrote {len(ends)} end times")
+
+    def _sweep(self, directory):
+        try:
+            leftovers = [name for name in os.listdir(directory) if name.startswith("session_")]
+        except FileNotFoundError:
+            return
+        for name in leftovers:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+        if leftovers:
+            logger.info(f"Removed {len(leftovers)} leftover session directories from {directory}")
+
+
+# one reclaimer per process, shared by all connections
+_reclaimer = None
+_reclaimer_lock = threading.Lock()
+
+def get_reclaimer():
+    """Return the process-wide session reclaimer"""
+    global _reclaimer
+    with _reclaimer_lock:
+        if _reclaimer is None:
+            _reclaimer = SessionReclaimer()
+        return _reclaimer
@@ -0,0 +1,57 @@
+"""
+Deduplicated store of what the honeypot answered.
+A command's output is normalized (carriage returns and trailing newlines dropped),
+hashed with SHA-256 and zlib compressed into the responses table once per distinct
+text. Commands reference their response by hash, so the same `uname -a` answered
+to thousands of bots costs one blob.
+"""
+import hashlib
+import zlib
+from config import RESPONSE_MAX_BYTES, RESPONSE_COMPRESS_LEVEL
+
+
+def normalize(text):
+    """Output as stored, terminal line endings and trailing newlines are presentation"""
+    return text.replace("\r", "").rstrip("\n")
+
+
+def decompress(body):
+    """Text of a stored response body"""
+    return zlib.decompress(body).decode("utf-8")
+
+
+class ResponseRecorder:
+    """Collects the output of one command as it is written"""
+    __slots__ = ("parts", "size", "newlines", "overflow")
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+        self.newlines = ""  # trailing newlines, kept back until more text follows
+        self.overflow = False
+
+    def feed(self, text):
+        if self.overflow:
+            return
+        text = text.replace("\r", "")
+        stripped = text.rstrip("\n")
+        if not stripped:
+            self.newlines += text
+            return
+        data = (self.newlines + stripped).encode("utf-8", errors="replace")
+        self.newlines = text[len(stripped):]
+        self.size += len(data)
+        if self.size > RESPONSE_MAX_BYTES:
+            # not worth keeping, and holding it would cost memory per session
+            self.overflow = True
+            self.parts = []
+            return
+        self.parts.append(data)
+
+    def finish(self):
+        """(sha256, size, compressed body) of the output, None when there was none or too much"""
+        if self.overflow or not self.parts:
+            return None
+        data = b"".join(self.parts)
+        self.parts = []
+        return hashlib.sha256(data).hexdigest(), len(data), zlib.compress(data, RESPONSE_COMPRESS_LEVEL)
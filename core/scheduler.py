@@ -0,0 +1,108 @@
+"""
+Shared timer scheduler for the SSH honeypot.
+Sessions register deadlines (next ping line, streaming heartbeat and timeouts)
+instead of polling their channels ten times a second.
+"""
+import heapq, itertools, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from utils.log_setup import logger
+from config import TIMER_CALLBACK_WORKERS
+
+
+class TimerHandle:
+    """A scheduled callback, cancel() stops it from running"""
+    __slots__ = ("when", "callback", "args", "cancelled")
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerScheduler:
+    """
+    Min-heap of deadlines served by a single thread.
+    Callbacks run on the scheduler thread and must return quickly, anything
+    slow should be handed off to an executor by the callback itself.
+    """
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()  # tie breaker so handles are never compared
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def call_later(self, delay, callback, *args):
+        """Run callback(*args) after delay seconds, returns a cancellable handle"""
+        handle = TimerHandle(time.monotonic() + delay, callback, args)
+        with self._condition:
+            self._ensure_thread()
+            heapq.heappush(self._heap, (handle.when, next(self._counter), handle))
+            # only wake the thread when the new timer is now the earliest one
+            if self._heap[0][2] is handle:
+                self._condition.notify()
+        return handle
+
+    def pending(self):
+        """Number of timers in the heap, including cancelled ones not yet discarded"""
+        with self._condition:
+            return len(self._heap)
+
+    def _ensure_thread(self):
+        # caller holds the condition, started lazily so forked workers get their own thread
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="honeypot-timers")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    when, _, handle = self._heap[0]
+                    if handle.cancelled:
+                        # cancelled timers are dropped lazily when they reach the top
+                        heapq.heappop(self._heap)
+                        continue
+                    delay = when - time.monotonic()
+                    if delay > 0:
+                        self._condition.wait(delay)
+                        continue
+                    heapq.heappop(self._heap)
+                    break
+
+            try:
+                handle.callback(*handle.args)
+            except Exception as e:
+                logger.error(f"Error in timer callback: {e}")
+
+
+# one scheduler per process, shared by all sessions
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Return the process-wide timer scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = TimerScheduler()
+        return _scheduler
+
+
+# runs timer callbacks that may block, such as a send to a client that stopped reading
+_callback_executor = None
+
+def get_callback_executor():
+    """Return the process-wide executor for blocking timer callbacks"""
+    global _callback_executor
+    with _scheduler_lock:
+        if _callback_executor is None:
+            _callback_executor = ThreadPoolExecutor(max_workers=TIMER_CALLBACK_WORKERS, thread_name_prefix="honeypot-timer")
+        return _callback_executor
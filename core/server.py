@@ -3,59 +3,56 @@ SSH server implementation for the honeypot with fixed tab completion and arrow k
 """
 import socket, threading, paramiko, os, time, datetime, random
 from utils.log_setup import logger
-from core.database import log_session_start, log_session_end, log_command, log_auth_attempt, get_db_connection
-from config import USERNAME, PASSWORD, RAG_STREAM_OUTPUT, RAG_TOKEN_DELAY
+from core.database import log_session_start, log_auth_only_session, log_command, log_auth_attempt
+from core.database import allocate_session_id
+from core.admission import AdmissionController, QUEUED, REJECTED
+from core.cancellation import CancellationToken
+from core.telemetry import CommandTelemetry, recording
+from core.scheduler import get_scheduler, get_callback_executor
+from core.reclaimer import get_reclaimer
+from core.output_buffer import OutputBuffer, StreamedOutput
+from core.listing import completion_candidates
+from config import USERNAME, PASSWORD, RAG_STREAM_OUTPUT, RAG_TOKEN_DELAY, BANNER_CACHE_SECONDS, KERNEL_RELEASE
+from config import STREAM_FLUSH_BYTES, STREAM_FLUSH_INTERVAL, HANDSHAKE_TIMEOUT, AUTH_TIMEOUT
+from config import MAX_CONCURRENT_SESSIONS, MAX_SESSIONS_PER_IP, MAX_PENDING_CONNECTIONS, PENDING_CONNECTION_TIMEOUT, ADMISSION_STATS_INTERVAL
 
 # stop event for graceful shutdown
 stop_event = threading.Event()
 
-active_command = {
-    "thread": None,
-    "interrupted": False,
-    "session_id": None
-}
-
 class HoneypotServer(paramiko.ServerInterface):
     def __init__(self, client_ip):
         self.client_ip = client_ip
         self.username = None
         self.event = threading.Event()
-        # create a session when the connection is established
-        self.session_id = log_session_start(self.client_ip, "unknown", False)
+        # optional hook called once the client requests a shell (used by the event-loop front end)
+        self.on_shell = None
+        # the id is reserved up front, the row is queued with the first auth attempt so
+        # connections that just try passwords cost no database round trip
+        self.session_id = allocate_session_id()
+        self.start_time = datetime.datetime.now().isoformat()
+        self.auth_logged = False
+        self.session_logged = False
         logger.info(f"Created new session {self.session_id} for client {self.client_ip}")
 
+    def log_session(self):
+        """Write the session row once the client has opened a channel"""
+        if not self.session_logged:
+            log_session_start(self.session_id, self.client_ip, self.username or "unknown", self.username is not None, self.start_time)
+            self.session_logged = True
+
     def check_auth_password(self, username, password):
         # for the honeypot, we'll accept the configured credentials
         success = (username == USERNAME and password == PASSWORD)
         
-        # double-check that session_id exists
-        if self.session_id is None:
-            logger.error("Session ID is None during auth attempt, creating new session")
-            self.session_id = log_session_start(self.client_ip, "unknown", False)
-        
-        # log authentication attempt with explicit session ID
+        # log authentication attempt with explicit session ID, written with the next batch
         logger.info(f"Logging auth attempt for session {self.session_id}: {username}:{password}")
-        log_auth_attempt(self.client_ip, username, password, success, self.session_id)
+        log_auth_attempt(self.client_ip, username, password, success, self.session_id,
+                         None if self.auth_logged else self.start_time)
+        self.auth_logged = True
         
         if success:
             self.username = username
             logger.info(f"Successful authentication from {self.client_ip}: username={username}, password={password}")
-            
-            # update the session with the correct username and set success to true
-            try:
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute('''
-                UPDATE sessions 
-                SET username = ?, success = ? 
-                WHERE id = ?
-                ''', (username, True, self.session_id))
-                conn.commit()
-                conn.close()
-                logger.info(f"Updated session {self.session_id} with username {username} and success=True")
-            except Exception as e:
-                logger.error(f"Error updating session: {e}")
-            
             return paramiko.AUTH_SUCCESSFUL
         
         # log failed attempt
@@ -69,6 +66,8 @@ class HoneypotServer(paramiko.ServerInterface):
 
     def check_channel_shell_request(self, channel):
         self.event.set()
+        if self.on_shell:
+            self.on_shell()
         return True
 
     def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
@@ -78,14 +77,815 @@ class HoneypotServer(paramiko.ServerInterface):
         return "password"
 
 
+# login banner rendered at most once per BANNER_CACHE_SECONDS
+_banner_cache = {"rendered_at": 0, "banner": "", "last_login": ""}
+
+def render_banner():
+    """Return the cached (banner, last login time) pair, re-rendering it when stale"""
+    now = time.time()
+    if now - _banner_cache["rendered_at"] < BANNER_CACHE_SECONDS:
+        return _banner_cache["banner"], _banner_cache["last_login"]
+
+    # get current time for system information
+    current_time = datetime.datetime.now()
+    current_time_str = current_time.strftime("%a %b %d %I:%M:%S %p %Z %Y")
+
+    # generate last login time (1 day ago)
+    last_login_time = current_time - datetime.timedelta(days=1)
+    last_login_str = last_login_time.strftime("%a %b %d %H:%M:%S %Y")
+
+    banner = (
+        f"Welcome to Ubuntu 24.04.1 LTS (GNU/Linux {KERNEL_RELEASE} x86_64)\r\n\r\n"
+        " * Documentation:  https://help.ubuntu.com\r\n"
+        " * Management:     https://landscape.canonical.com\r\n"
+        " * Support:        https://ubuntu.com/pro\r\n\r\n"
+        f" System information as of {current_time_str}\r\n\r\n"
+        "  System load:  0.08                Processes:              249\r\n"
+        "  Usage of /:   10.1% of 249.45GB   Users logged in:        0\r\n"
+        "  Memory usage: 16%                 IPv4 address for ens18: 10.0.0.51\r\n"
+        "  Swap usage:   0%\r\n\r\n"
+        " * Strictly confined Kubernetes makes edge and IoT secure. Learn how MicroK8s\r\n"
+        "   just raised the bar for easy, resilient and secure K8s cluster deployment.\r\n\r\n"
+        "   https://ubuntu.com/engage/secure-kubernetes-at-the-edge\r\n\r\n"
+        "Expanded Security Maintenance for Applications is not enabled.\r\n\r\n"
+        "144 updates can be applied immediately.\r\n"
+        "1 of these updates is a standard security update.\r\n"
+        "To see these additional updates run: apt list --upgradable\r\n\r\n"
+        "5 additional security updates can be applied with ESM Apps.\r\n"
+        "Learn more about enabling ESM Apps service at https://ubuntu.com/esm\r\n\r\n\r\n"
+        "*** System restart required ***\r\n"
+    )
+
+    _banner_cache.update(rendered_at=now, banner=banner, last_login=last_login_str)
+    return banner, last_login_str
+
+
+class ShellSession:
+    """
+    Line editor and command dispatch for a single interactive channel.
+    The threaded and event-loop front ends both drive this object by feeding
+    it received data, ping lines and streaming timeouts run off scheduled timers.
+    """
+    def __init__(self, channel, command_processor, server, client_ip, spawn=None, schedule=None):
+        self.channel = channel
+        self.command_processor = command_processor
+        self.server = server
+        self.session_id = server.session_id
+        self.client_ip = client_ip
+        # how background work (streaming commands) is started, defaults to a daemon thread
+        self.spawn = spawn or self._spawn_thread
+        # how deadlines are registered, schedule(delay, callback) returns a handle with cancel()
+        self.schedule = schedule or self._schedule_on_worker
+        # input, timers and the streaming worker all touch the session state
+        self.lock = threading.RLock()
+        # all output goes through the buffer so it leaves in a few large packets
+        self.out = OutputBuffer(channel, self.schedule)
+
+        self.prompt = ""
+        self.buffer = ""          # current command buffer
+        self.cursor_pos = 0       # cursor position in the buffer
+        self.command_history = []
+        self.history_index = -1
+        self.tab_buffer = ""      # store the original buffer when tab is pressed
+
+        # variable to track if we're in the middle of an escape sequence
+        self.in_escape_sequence = False
+        self.escape_buffer = ""
+
+        # track ping state
+        self.in_continuous_ping = False
+        self.ping_interval = 1.0  # default ping interval
+        self.last_ping_time = 0   # track last ping time
+        self.ping_timer = None    # pending timer for the next ping line
+
+        # flag to track if we're currently streaming RAG output
+        self.in_streaming_rag = False
+        self.streaming_start_time = 0
+        self.streaming_last_output = 0  # track last time we sent streaming output
+        self.streaming_heartbeat = 0.5  # send a subtle indicator every 0.5 seconds of silence
+        self.streaming_inactivity_timeout = 2.0  # consider streaming done after 2 seconds of inactivity
+        self.streaming_timeout = 45.0  # maximum time to wait for streaming output (seconds)
+        self.cancel_token = None  # cancellation token of the command currently streaming
+        self.received = None  # when the input being processed arrived, for command telemetry
+        self.streaming_timer = None  # pending timer for the next streaming heartbeat/timeout check
+
+    @staticmethod
+    def _spawn_thread(target):
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _schedule_on_worker(delay, callback):
+        # the scheduler thread only hands the callback over, so a client whose window
+        # is full blocks one worker in sendall instead of every session's timers
+        return get_scheduler().call_later(delay, get_callback_executor().submit, callback)
+
+    @property
+    def busy(self):
+        """True while continuous ping or streamed output owns the terminal"""
+        return self.in_continuous_ping or self.in_streaming_rag
+
+    def send_banner(self):
+        """Send the login banner followed by the first prompt"""
+        banner, last_login_str = render_banner()
+        random_ip = f"{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+
+        # send welcome message and initial prompt in one write
+        self.prompt = self.command_processor.get_prompt(self.session_id)
+        self.out.write(f"{banner}Last login: {last_login_str} from {random_ip}\r\n\r\n{self.prompt}")
+        self.out.flush()
+
+    def token_callback(self, token, cancel_token=None):
+        """Stream a RAG/LLM token to the client"""
+        channel = self.channel
+
+        # drop tokens that arrive after this command was interrupted
+        if cancel_token is not None and cancel_token.cancelled:
+            logger.info(f"Skipping token due to interrupt for session {self.session_id}")
+            return
+        with self.lock:
+            # streaming closed by a timeout already printed the prompt, late tokens go nowhere
+            if not self.in_streaming_rag:
+                return
+            if channel and not channel.closed:
+                # tokens arrive already cleaned by the backend's streaming sanitizer
+                # process line breaks properly for terminal display
+                token = token.replace('\n', '\r\n')
+
+                # batch tokens into frames instead of one packet per token, the buffer
+                # sends every STREAM_FLUSH_INTERVAL or once STREAM_FLUSH_BYTES are pending
+                self.out.write(token, STREAM_FLUSH_BYTES, STREAM_FLUSH_INTERVAL)
+
+                # update streaming state, the pending streaming check picks up the new deadlines
+                now = time.time()
+                self.streaming_start_time = now
+                self.streaming_last_output = now  # update last output time
+
+    def _start_ping_timer(self):
+        self.ping_timer = self.schedule(self.ping_interval, self._ping_due)
+
+    def _ping_due(self):
+        """Timer callback emitting the next continuous ping line"""
+        with self.lock:
+            self.ping_timer = None
+            if not self.in_continuous_ping or self.channel.closed:
+                return
+
+            # get the next ping line
+            ping_line = self.command_processor.ping_iteration(self.session_id)
+            if ping_line:
+                self.out.write(ping_line + "\r\n")
+                self.last_ping_time = time.time()
+                self._start_ping_timer()
+            else:
+                # ping has been stopped externally
+                self.in_continuous_ping = False
+                # send a new prompt
+                self.prompt = self.command_processor.get_prompt(self.session_id)
+                self.out.write(self.prompt)
+            self.out.flush()
+
+    def _start_streaming_timer(self, current_time):
+        # wake at the earliest streaming deadline, tokens arriving before then only move
+        # the deadlines forward and the check below simply reschedules itself
+        deadline = min(
+            self.streaming_start_time + self.streaming_timeout,
+            self.streaming_last_output + self.streaming_inactivity_timeout,
+            self.streaming_last_output + self.streaming_heartbeat
+        )
+        # small slack so the strict comparisons in the check have passed when it runs
+        self.streaming_timer = self.schedule(max(deadline - current_time, 0) + 0.01, self._streaming_due)
+
+    def _streaming_due(self):
+        """Timer callback handling the streaming heartbeat and timeouts"""
+        with self.lock:
+            self.streaming_timer = None
+            if not self.in_streaming_rag or self.channel.closed:
+                return
+
+            command_processor = self.command_processor
+            current_time = time.time()
+
+            # check for maximum timeout
+            if current_time - self.streaming_start_time > self.streaming_timeout:
+                logger.warning(f"RAG streaming timed out after {self.streaming_timeout} seconds")
+                self.in_streaming_rag = False
+                # the prompt is back, stop the generation instead of printing after it
+                self.cancel_running()
+                # send a new prompt
+                self.out.write("\r\n")
+                self.prompt = command_processor.get_prompt(self.session_id)
+                self.out.write(self.prompt)
+                self.out.flush()
+                return
+
+            # check for inactivity timeout (shorter duration)
+            elif current_time - self.streaming_last_output > self.streaming_inactivity_timeout:
+                logger.info("RAG streaming detected as complete due to inactivity")
+                self.in_streaming_rag = False
+                self.cancel_running()
+                # send a new prompt
+                self.out.write("\r\n")
+                self.prompt = command_processor.get_prompt(self.session_id)
+                self.out.write(self.prompt)
+                self.out.flush()
+                return
+
+            # check for heartbeat during pauses (very subtle cursor movement)
+            elif current_time - self.streaming_last_output > self.streaming_heartbeat:
+                # Send a subtle heartbeat during pauses to keep connection active
+                self.out.write("\033[s\033[u")  # Save then restore cursor position
+                self.streaming_last_output = current_time  # Reset heartbeat timer but not main inactivity timer
+                self.out.flush()
+
+            self._start_streaming_timer(current_time)
+
+    def stop_timers(self):
+        """Cancel any pending ping or streaming timers"""
+        if self.ping_timer is not None:
+            self.ping_timer.cancel()
+            self.ping_timer = None
+        if self.streaming_timer is not None:
+            self.streaming_timer.cancel()
+            self.streaming_timer = None
+
+    def feed(self, data, received=None):
+        """
+        Process received user input character by character.
+        received is when the input was read, it defaults to now.
+        Returns False once the session should be closed.
+        """
+        with self.lock:
+            self.received = received or time.monotonic()
+            keep_open = self._feed(data)
+            # echo and command output for this chunk of input leave together
+            self.out.flush()
+            return keep_open
+
+    def _feed(self, data):
+        i = 0
+        while i < len(data):
+            char = data[i]
+            i += 1
+
+            # handle escape sequences (for arrow keys)
+            if char == "\x1b":  # ESC character
+                self.in_escape_sequence = True
+                self.escape_buffer = char
+                continue
+
+            if self.in_escape_sequence:
+                self.escape_buffer += char
+                self._handle_escape_sequence()
+                continue
+
+            # handle tab completion
+            if char == "\t" and not self.busy:
+                self._handle_tab()
+
+            # handle Ctrl+C
+            elif char == "\x03":
+                self._handle_interrupt()
+
+            # handle enter key
+            elif char == "\r" and not self.busy:
+                if not self._handle_enter():
+                    return False
+
+            # handle newline (ignore it, we handle CR)
+            elif char == "\n":
+                continue
+
+            # handle backspace
+            elif char in ("\x7f", "\x08") and not self.busy:
+                self._handle_backspace()
+
+            # handle Ctrl+D (EOF)
+            elif char == "\x04" and not self.busy:
+                if not self.buffer:  # only exit if buffer is empty
+                    logger.info(f"Client {self.client_ip} sent EOF")
+                    self._close()
+                    return False
+
+            # handle regular characters when not in special modes
+            elif not self.busy and ord(char) >= 32:
+                self._insert_char(char)
+
+        return True
+
+    def _close(self):
+        """Send any pending output, then close the channel"""
+        self.out.flush()
+        self.channel.close()
+
+    def _redraw_line(self):
+        """Clear the current line and redraw the prompt"""
+        self.out.write("\r" + " " * (len(self.prompt) + len(self.buffer)) + "\r")
+        self.out.write(self.prompt)
+
+    def _handle_escape_sequence(self):
+        escape_buffer = self.escape_buffer
+
+        # check for arrow key sequences
+        if escape_buffer == "\x1b[A":  # Up arrow
+            self.in_escape_sequence = False
+            self.escape_buffer = ""
+
+            if not self.busy: # don't process when streaming
+                # handle up arrow (history previous)
+                if self.command_history:
+                    # move up in history
+                    if self.history_index < len(self.command_history) - 1:
+                        self.history_index += 1
+
+                    # clear current line
+                    self._redraw_line()
+
+                    # display the historical command
+                    self.buffer = self.command_history[-(self.history_index+1)]
+                    self.cursor_pos = len(self.buffer)  # place cursor at end of command
+                    self.out.write(self.buffer)
+
+        elif escape_buffer == "\x1b[B":  # down arrow
+            self.in_escape_sequence = False
+            self.escape_buffer = ""
+
+            if not self.busy:  # only when not in special modes
+                # handle down arrow (history next)
+                # move down in history
+                if self.history_index > 0:
+                    self.history_index -= 1
+                    # clear current line
+                    self._redraw_line()
+
+                    # display the historical command
+                    self.buffer = self.command_history[-(self.history_index+1)]
+                    self.cursor_pos = len(self.buffer)  # place cursor at end of command
+                    self.out.write(self.buffer)
+                else:
+                    # if at the bottom of history, clear the line
+                    self.history_index = -1
+                    self._redraw_line()
+                    self.buffer = ""
+                    self.cursor_pos = 0
+
+        elif escape_buffer == "\x1b[C":  # right arrow
+            self.in_escape_sequence = False
+            self.escape_buffer = ""
+
+            if not self.busy:  # only when not in special modes
+                # move cursor right if not at end of buffer
+                if self.cursor_pos < len(self.buffer):
+                    self.cursor_pos += 1
+                    self.out.write("\x1b[C")  # send cursor right command
+
+        elif escape_buffer == "\x1b[D":  # left arrow
+            self.in_escape_sequence = False
+            self.escape_buffer = ""
+
+            if not self.busy:  # only when not in special modes
+                # move cursor left if not at beginning of buffer
+                if self.cursor_pos > 0:
+                    self.cursor_pos -= 1
+                    self.out.write("\x1b[D")  # send cursor left command
+
+        # if we've collected enough chars and still don't have a match, cancel the sequence
+        elif len(escape_buffer) >= 3:
+            self.in_escape_sequence = False
+            self.escape_buffer = ""
+
+    def _handle_tab(self):
+        command_processor = self.command_processor
+
+        # store original buffer if this is the first tab press
+        if not self.tab_buffer:
+            self.tab_buffer = self.buffer
+
+        # get current directory
+        current_dir = command_processor.current_dirs.get(self.session_id, "/home/honeypot")
+
+        # split the command to get the last part for completion
+        cmd_parts = self.buffer.split()
+
+        # only attempt completion if we have a partial filename
+        if len(cmd_parts) > 0:
+            # get the part to complete (last part of the command)
+            to_complete = cmd_parts[-1] if cmd_parts else ""
+
+            # handle relative vs absolute paths
+            dir_path = current_dir
+            base_name = to_complete
+
+            if to_complete:
+                if to_complete.startswith('/'):
+                    # it's an absolute path
+                    dir_path = os.path.dirname(to_complete) or '/'
+                    base_name = os.path.basename(to_complete)
+                elif '/' in to_complete:
+                    # it's a relative path with subdirectories
+                    rel_dir = os.path.dirname(to_complete)
+                    dir_path = os.path.normpath(os.path.join(current_dir, rel_dir))
+                    base_name = os.path.basename(to_complete)
+
+            try:
+                # find matches among the directory entries, directories end in a slash
+                try:
+                    entries = command_processor.filesystem.scandir(dir_path, self.session_id)
+                except (FileNotFoundError, NotADirectoryError):
+                    entries = []
+                completions = completion_candidates(entries, base_name)
+
+                if len(completions) == 1:
+                    # single match - autocomplete
+                    completion = completions[0]
+
+                    # replace the partial filename with the complete one
+                    if to_complete.startswith('/'):
+                        # absolute path
+                        cmd_parts[-1] = os.path.join(os.path.dirname(to_complete), completion)
+                    elif '/' in to_complete:
+                        # relative path with directory
+                        rel_dir = os.path.dirname(to_complete)
+                        cmd_parts[-1] = os.path.join(rel_dir, completion)
+                    else:
+                        # simple filename
+                        cmd_parts[-1] = completion
+
+                    # display the completed command
+                    self._redraw_line()
+                    self.buffer = " ".join(cmd_parts)
+                    self.cursor_pos = len(self.buffer)  # place cursor at end
+                    self.out.write(self.buffer)
+
+                elif len(completions) > 1:
+                    # multiple matches - show possibilities
+                    self.out.write("\r\n")
+                    for comp in completions:
+                        self.out.write(comp + "  ")
+                    self.out.write("\r\n")
+                    self.out.write(self.prompt + self.buffer)
+            except Exception as e:
+                logger.error(f"Error during tab completion: {str(e)}")
+                self.out.write("\r\n")
+                self.out.write(self.prompt + self.buffer)
+
+    def _handle_interrupt(self):
+        command_processor = self.command_processor
+
+        # cancel streaming RAG if active
+        if self.in_streaming_rag:
+            # cancel only this session's command, which also closes the upstream stream
+            self.cancel_running()
+            self.in_streaming_rag = False
+            self.stop_timers()
+
+            # reset buffer and show new prompt
+            self.buffer = ""
+            self.cursor_pos = 0
+            self.prompt = command_processor.get_prompt(self.session_id)
+            self.out.write(self.prompt)
+        elif self.in_continuous_ping:
+            # stop the ping and show stats
+            self.in_continuous_ping = False
+            self.stop_timers()
+            self.out.write("^C\r\n")
+            stats = command_processor.stop_ping(self.session_id)
+            if stats:
+                # properly format each line of the statistics with proper CRLF
+                for line in stats.split('\n'):
+                    self.out.write(line + "\r\n")
+
+            # reset buffer and show new prompt
+            self.buffer = ""
+            self.cursor_pos = 0
+            self.prompt = command_processor.get_prompt(self.session_id)
+            self.out.write(self.prompt)
+        else:
+            # regular Ctrl+C handling
+            self.buffer = ""
+            self.cursor_pos = 0
+            self.tab_buffer = ""
+            self.out.write("^C\r\n")  # show ^C and start a new line
+            self.prompt = command_processor.get_prompt(self.session_id)
+            self.out.write(self.prompt)
+
+    def _handle_enter(self):
+        """Run the buffered command, returns False when the session should end"""
+        command_processor = self.command_processor
+
+        command = self.buffer.strip()
+        self.buffer = ""
+        self.cursor_pos = 0
+        self.tab_buffer = ""  # reset tab completion buffer
+        self.history_index = -1  # reset history position
+
+        # echo newline for proper formatting
+        self.out.write("\r\n")
+
+        if command:
+            # save to history (avoid duplicates at the end)
+            if not self.command_history or self.command_history[-1] != command:
+                self.command_history.append(command)
+                # keep history at a reasonable size
+                if len(self.command_history) > 100:
+                    self.command_history.pop(0)
+
+            logger.info(f"Command from {self.client_ip} (user {self.server.username}): {command}")
+            record = CommandTelemetry(self.received)
+            timestamp = datetime.datetime.now().isoformat()
+            # handlers further down tag the record, e.g. with the path that answered
+            with recording(record):
+                if not self._run_command(command, record, timestamp):
+                    return False
+
+        # send new prompt if not in streaming or continuous ping
+        if not self.busy:
+            self.prompt = command_processor.get_prompt(self.session_id)
+            self.out.write(self.prompt)
+        return True
+
+    def _run_command(self, command, record, timestamp):
+        """Dispatch a command to its handler, returns False when the session should end.
+        Commands are logged with their telemetry once done, streamed ones by their worker"""
+        command_processor = self.command_processor
+
+        # check for exit command
+        if command.lower() in ["exit", "quit", "logout"]:
+            logger.info(f"Client {self.client_ip} exited the session")
+            record.start()
+            self._finish_command(command, record, timestamp)
+            self._close()
+            return False
+
+        # check for ping command specifically
+        if command.startswith("ping "):
+            record.start()
+            response = command_processor.process_command(self.session_id, command)
+
+            # check if this is a continuous ping
+            lines = response.split('\n')
+            if "PING_CONTINUES" in lines:
+                # remove the PING_CONTINUES marker
+                lines = [l for l in lines if l != "PING_CONTINUES"]
+
+                # send the ping header, the command counts as done once it is out
+                header = "\n".join(lines) + "\r\n"
+                self.out.write(header)
+                record.output(header)
+                self._finish_command(command, record, timestamp)
+
+                # enter continuous ping mode
+                self.in_continuous_ping = True
+                self.last_ping_time = time.time()  # initialize last ping time
+                # -i as validated and clamped by the ping command
+                self.ping_interval = command_processor.ping_active[self.session_id]['interval']
+
+                # the first ping line is due one interval from now
+                self._start_ping_timer()
+                return True  # skip prompt display
+            else:
+                # normal ping with count, send the full response
+                lines = response.split('\n')
+                self._write_response("\r\n".join(lines) + "\r\n", record)
+        else:
+            # check if this is a RAG command with streaming enabled
+            if hasattr(command_processor, 'smart_rag') and \
+               not command_processor.smart_rag.is_native_command(command) and \
+               RAG_STREAM_OUTPUT:
+                # the worker handles prompt display and logging when finished
+                self._start_streaming(command, record, timestamp)
+                return True
+            else:
+                # process regular command without streaming
+                record.start()
+                response = command_processor.process_command(self.session_id, command)
+
+                # handle special responses
+                if response == "logout":
+                    logger.info(f"Client {self.client_ip} exited the session")
+                    self._finish_command(command, record, timestamp)
+                    self._close()
+                    return False
+                elif response == "\033[2J\033[H":  # clear screen
+                    self._write_response(response, record)
+                elif isinstance(response, StreamedOutput):
+                    # large output goes out as it is read, each chunk with CRLF line endings
+                    sent = False
+                    for chunk in response:
+                        if chunk:
+                            self._write_response(chunk.replace('\r', '').replace('\n', '\r\n'), record)
+                            sent = True
+                    if sent:
+                        self.out.write("\r\n")
+                else:
+                    # regular command output - use proper line formatting
+                    if response:
+                        # process multiline responses properly, each line ends with CRLF
+                        lines = response.replace('\r', '').split('\n')
+                        self._write_response("\r\n".join(lines) + "\r\n", record)
+
+        self._finish_command(command, record, timestamp)
+        return True
+
+    def _write_response(self, text, record):
+        self.out.write(text)
+        record.output(text)
+
+    def _finish_command(self, command, record, timestamp):
+        record.finish(self.command_processor.last_exit_code.get(self.session_id))
+        log_command(self.session_id, command, record, timestamp)
+
+    def _start_streaming(self, command, record, timestamp):
+        channel = self.channel
+        command_processor = self.command_processor
+
+        # enter streaming mode
+        self.in_streaming_rag = True
+        self.streaming_start_time = time.time()
+        self.streaming_last_output = time.time()
+        self._start_streaming_timer(self.streaming_start_time)
+
+        # every command gets its own token so one session can never cancel another
+        cancel_token = CancellationToken()
+        self.cancel_token = cancel_token
+
+        def token_callback(token):
+            if not cancel_token.cancelled:
+                record.output(token)
+            self.token_callback(token, cancel_token)
+
+        # define a function to handle the RAG processing in the background
+        def process_rag_command():
+            try:
+                # process command with streaming, the wait for this worker counts as queue time
+                record.start()
+                with recording(record):
+                    command_processor.execute_command(self.session_id, command, token_callback, cancel_token)
+                self._finish_command(command, record, timestamp)
+
+                # wait a very short time to ensure any final tokens are processed
+                time.sleep(0.1)
+
+                with self.lock:
+                    # an interrupted command already got its prompt from the Ctrl+C handler
+                    if cancel_token.cancelled:
+                        logger.info(f"RAG streaming cancelled for command: {command}")
+                        return
+
+                    # set flag that streaming is done
+                    self.in_streaming_rag = False
+                    self.stop_timers()
+
+                    # send a newline and prompt when complete
+                    if channel and not channel.closed:
+                        self.out.write("\r\n")
+                        self.prompt = command_processor.get_prompt(self.session_id)
+                        self.out.write(self.prompt)
+                        self.out.flush()
+
+                logger.info(f"RAG streaming completed for command: {command}")
+            except Exception as e:
+                if record.finished is None:
+                    self._finish_command(command, record, timestamp)
+                if cancel_token.cancelled:
+                    logger.info(f"RAG streaming cancelled for command: {command}")
+                    return
+                logger.error(f"Error in RAG command processing: {e}")
+                with self.lock:
+                    # make sure we clean up on error
+                    self.in_streaming_rag = False
+                    self.stop_timers()
+
+                    if channel and not channel.closed:
+                        self.out.write(f"\r\nError: {str(e)}\r\n")
+                        self.prompt = command_processor.get_prompt(self.session_id)
+                        self.out.write(self.prompt)
+                        self.out.flush()
+
+        # start the processing in the background
+        self.spawn(process_rag_command)
+
+    def cancel_running(self):
+        """Cancel the command currently streaming in this session, if any"""
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+            self.cancel_token = None
+
+    def _handle_backspace(self):
+        if self.cursor_pos > 0:  # only if cursor is not at the beginning
+            # if cursor is at the end of the buffer
+            if self.cursor_pos == len(self.buffer):
+                self.buffer = self.buffer[:-1]
+                self.cursor_pos -= 1
+                # send backspace sequence: move back, space over the character, move back again
+                self.out.write("\b \b")
+            else:
+                # cursor is in the middle of the buffer
+                # remove character at cursor_pos - 1
+                self.buffer = self.buffer[:self.cursor_pos-1] + self.buffer[self.cursor_pos:]
+                self.cursor_pos -= 1
+
+                # redraw the entire line from the cursor position
+                self.out.write("\b \b")  # delete the character under cursor
+                # redraw the rest of the line
+                self.out.write(self.buffer[self.cursor_pos:] + " ")
+                # move cursor back to the correct position
+                self.out.write("\b" * (len(self.buffer) - self.cursor_pos + 1))
+
+    def _insert_char(self, char):
+        # insert character at cursor position
+        if self.cursor_pos == len(self.buffer):
+            # cursor at end - simply append
+            self.buffer += char
+            self.cursor_pos += 1
+            self.out.write(char)  # echo input
+        else:
+            # cursor in the middle - insert and redraw
+            self.buffer = self.buffer[:self.cursor_pos] + char + self.buffer[self.cursor_pos:]
+            self.cursor_pos += 1
+
+            # send the new character and the rest of the line
+            self.out.write(char + self.buffer[self.cursor_pos:])
+
+            # move cursor back to the position after the inserted character
+            self.out.write("\b" * (len(self.buffer) - self.cursor_pos))
+
+
+def end_session(server, session_closed, reason):
+    """Log the session end once, returns the updated session_closed flag"""
+    if not session_closed and server is not None and server.session_id is not None:
+        if server.session_logged:
+            # written by the reclaimer together with other sessions that ended around the same time
+            get_reclaimer().end_session(server.session_id)
+        else:
+            # never got a channel, the row queued with the first attempt gets its end time
+            log_auth_only_session(server.session_id, server.client_ip, server.username or "unknown",
+                                  server.username is not None, server.start_time)
+        logger.info(f"Logged session end for {server.session_id} {reason}".rstrip())
+    return True
+
+
+def finish_connection(addr, server, transport, channel, command_processor, session_closed, session=None):
+    """Release everything held by a connection, shared by both front ends"""
+    # stop any generation and timers still running for this session
+    if session is not None:
+        session.cancel_running()
+        session.stop_timers()
+
+    # only log session end if not already closed
+    end_session(server, session_closed, "")
+
+    # close channel if still open
+    if channel and not channel.closed:
+        try:
+            channel.close()
+            logger.info(f"Closed channel for {addr[0]}")
+        except Exception as e:
+            logger.error(f"Error closing channel: {e}")
+
+    # close transport if active
+    if transport and transport.is_active():
+        try:
+            transport.close()
+            logger.info(f"Closed transport for {addr[0]}")
+        except Exception as e:
+            logger.error(f"Error closing transport: {e}")
+
+    # always clean up the session in command processor
+    if server is not None and server.session_id is not None:
+        # make sure any active pings are stopped
+        if hasattr(command_processor, 'ping_active') and server.session_id in command_processor.ping_active:
+            command_processor.ping_active[server.session_id]['active'] = False
+
+        # session state is dropped in the background, this thread is free right away
+        get_reclaimer().release_session(server.session_id, command_processor)
+
+    logger.info(f"Connection closed for {addr[0]}")
+
+
+def create_transport(client, host_key):
+    """Wrap an accepted socket in a transport with the settings shared by every connection"""
+    transport = paramiko.Transport(client)
+    # the host key is loaded once at startup and reused for every handshake
+    transport.add_server_key(host_key)
+    # credential sprayers that stall mid-handshake or never finish auth should not hold a slot for long
+    transport.banner_timeout = HANDSHAKE_TIMEOUT
+    transport.handshake_timeout = HANDSHAKE_TIMEOUT
+    transport.auth_timeout = AUTH_TIMEOUT
+    return transport
+
+
 def handle_connection(client, addr, command_processor, host_key):
     transport = None
     channel = None
+    server = None
+    session = None
     session_closed = False
-    
+
     try:
-        transport = paramiko.Transport(client)
-        transport.add_server_key(host_key)
+        transport = create_transport(client, host_key)
         server = HoneypotServer(addr[0])
         transport.start_server(server=server)
 
@@ -93,646 +893,93 @@ def handle_connection(client, addr, command_processor, host_key):
         if channel is None:
             logger.info(f"No channel from {addr[0]}")
             return
-            
+
         logger.info(f"Channel accepted from {addr[0]}")
+        server.log_session()
 
         # initialize session in command processor
         command_processor.initialize_session(server.session_id)
         logger.info(f"Initialized session {server.session_id} for client {addr[0]}")
 
-        # get current time for system information
-        current_time = datetime.datetime.now()
-        current_time_str = current_time.strftime("%a %b %d %I:%M:%S %p %Z %Y")
-
-        # generate last login time (1 day ago)
-        last_login_time = current_time - datetime.timedelta(days=1)
-        last_login_str = last_login_time.strftime("%a %b %d %H:%M:%S %Y")
-
-        random_ip = f"{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+        session = ShellSession(channel, command_processor, server, addr[0])
+        session.send_banner()
 
-        # send welcome message
-        channel.send("Welcome to Ubuntu 24.04.1 LTS (GNU/Linux 6.8.0-54-generic x86_64)\r\n\r\n")
-        channel.send(" * Documentation:  https://help.ubuntu.com\r\n")
-        channel.send(" * Management:     https://landscape.canonical.com\r\n")
-        channel.send(" * Support:        https://ubuntu.com/pro\r\n\r\n")
-        channel.send(f" System information as of {current_time_str}\r\n\r\n")
-        channel.send("  System load:  0.08                Processes:              249\r\n")
-        channel.send("  Usage of /:   10.1% of 249.45GB   Users logged in:        0\r\n")
-        channel.send("  Memory usage: 16%                 IPv4 address for ens18: 10.0.0.51\r\n")
-        channel.send("  Swap usage:   0%\r\n\r\n")
-        channel.send(" * Strictly confined Kubernetes makes edge and IoT secure. Learn how MicroK8s\r\n")
-        channel.send("   just raised the bar for easy, resilient and secure K8s cluster deployment.\r\n\r\n")
-        channel.send("   https://ubuntu.com/engage/secure-kubernetes-at-the-edge\r\n\r\n")
-        channel.send("Expanded Security Maintenance for Applications is not enabled.\r\n\r\n")
-        channel.send("144 updates can be applied immediately.\r\n")
-        channel.send("1 of these updates is a standard security update.\r\n")
-        channel.send("To see these additional updates run: apt list --upgradable\r\n\r\n")
-        channel.send("5 additional security updates can be applied with ESM Apps.\r\n")
-        channel.send("Learn more about enabling ESM Apps service at https://ubuntu.com/esm\r\n\r\n\r\n")
-        channel.send("*** System restart required ***\r\n")
-        channel.send(f"Last login: {last_login_str} from {random_ip}\r\n\r\n")
-                
-        # send initial prompt
-        prompt = command_processor.get_prompt(server.session_id)
-        channel.send(prompt)
-
-        buffer = ""          # current command buffer
-        cursor_pos = 0       # cursor position in the buffer
-        command_history = []
-        history_index = -1
-        tab_buffer = ""      # store the original buffer when tab is pressed
-        
-        # variable to track if we're in the middle of an escape sequence
-        in_escape_sequence = False
-        escape_buffer = ""
-        
-        # track ping state
-        in_continuous_ping = False
-        ping_interval = 1.0  # default ping interval
-        last_ping_time = 0   # track last ping time
-        
-        # flag to track if we're currently streaming RAG output
-        in_streaming_rag = False
-        streaming_start_time = 0
-        streaming_last_output = 0  # track last time we sent streaming output
-        streaming_heartbeat = 0.5  # send a subtle indicator every 0.5 seconds of silence
-        streaming_inactivity_timeout = 2.0  # consider streaming done after 2 seconds of inactivity
-        streaming_timeout = 45.0  # maximum time to wait for streaming output (seconds)
-        streaming_thread = None  # will hold the thread for streaming processing
-        
-        # define token callback function for streaming RAG output with real-time cleanup
-        def token_callback(token):
-            nonlocal channel, in_streaming_rag, streaming_start_time, streaming_last_output
-            
-            # add this check at the beginning
-            if active_command["interrupted"] and active_command["session_id"] == server.session_id:
-                logger.info(f"Skipping token due to interrupt for session {server.session_id}")
-                return
-            if channel and not channel.closed:
-                # clean markdown from the token in real-time
-                token = clean_token(token)
-                
-                # process line breaks properly for terminal display
-                token = token.replace('\n', '\r\n')
-                
-                # send to client
-                channel.send(token)
-                
-                # update streaming state
-                in_streaming_rag = True
-                streaming_start_time = time.time()
-                streaming_last_output = time.time()  # update last output time
-
-        # helper function to clean markdown from tokens
-        def clean_token(token):
-            # Strip bold/italic markdown
-            token = token.replace('**', '')
-            token = token.replace('*', '')
-            
-            # strip bullet points if token starts with one
-            if token.strip().startswith('- ') or token.strip().startswith('• '):
-                token = token.replace('- ', '', 1).replace('• ', '', 1)
-            
-            # strip numbered list markers
-            if len(token.strip()) > 0 and token.strip()[0].isdigit() and '. ' in token:
-                parts = token.split('. ', 1)
-                if parts[0].isdigit():
-                    token = parts[1]
-            
-            # remove code block markers
-            token = token.replace('```', '')
-            
-            return token
-        
         while not stop_event.is_set():
             try:
-                # set a timeout for data reception (allows ping to continue)
-                if in_continuous_ping or in_streaming_rag:
-                    channel.settimeout(0.1)
-                else:
-                    channel.settimeout(None)
-                
+                # block until there is input, ping lines and streaming timeouts run off the shared scheduler
                 try:
                     data = channel.recv(1024).decode('utf-8', errors='ignore')
-                    
+
                     # check for client disconnection
-                    if not data and not (in_continuous_ping or in_streaming_rag):
+                    if not data:
                         logger.info(f"Client {addr[0]} disconnected")
                         # log session end
-                        if not session_closed and hasattr(server, 'session_id') and server.session_id is not None:
-                            log_session_end(server.session_id)
-                            session_closed = True
-                            logger.info(f"Logged session end for {server.session_id} due to client disconnect")
+                        session_closed = end_session(server, session_closed, "due to client disconnect")
                         break
-                        
-                except socket.timeout:
-                    # timeout is expected during continuous ping or streaming RAG
-                    data = ""
+
                 except socket.error as e:
                     # socket error could indicate client disconnection
                     logger.info(f"Socket error with {addr[0]}: {e} - Assuming client disconnected")
-                    if not session_closed and hasattr(server, 'session_id') and server.session_id is not None:
-                        log_session_end(server.session_id)
-                        session_closed = True
-                        logger.info(f"Logged session end for {server.session_id} due to socket error")
+                    session_closed = end_session(server, session_closed, "due to socket error")
                     break
-                
-                current_time = time.time()
-                if in_continuous_ping and (current_time - last_ping_time >= ping_interval):
-                    # get the next ping line
-                    ping_line = command_processor.ping_iteration(server.session_id)
-                    if ping_line:
-                        channel.send(ping_line + "\r\n")
-                        last_ping_time = current_time
-                    else:
-                        # ping has been stopped externally
-                        in_continuous_ping = False
-                        # send a new prompt
-                        prompt = command_processor.get_prompt(server.session_id)
-                        channel.send(prompt)
-                
-                # check if streaming has timed out or completed
-                if in_streaming_rag:
-                    # check for maximum timeout
-                    if current_time - streaming_start_time > streaming_timeout:
-                        logger.warning(f"RAG streaming timed out after {streaming_timeout} seconds")
-                        in_streaming_rag = False
-                        # send a new prompt
-                        channel.send("\r\n")
-                        prompt = command_processor.get_prompt(server.session_id)
-                        channel.send(prompt)
-                    
-                    # check for inactivity timeout (shorter duration)
-                    elif current_time - streaming_last_output > streaming_inactivity_timeout:
-                        logger.info("RAG streaming detected as complete due to inactivity")
-                        in_streaming_rag = False
-                        # send a new prompt
-                        channel.send("\r\n")
-                        prompt = command_processor.get_prompt(server.session_id)
-                        channel.send(prompt)
-                    
-                    # check for heartbeat during pauses (very subtle cursor movement)
-                    elif current_time - streaming_last_output > streaming_heartbeat:
-                        # Send a subtle heartbeat during pauses to keep connection active
-                        channel.send("\033[s\033[u")  # Save then restore cursor position
-                        streaming_last_output = current_time  # Reset heartbeat timer but not main inactivity timer
-                
+
                 # process any user input
-                i = 0
-                while i < len(data):
-                    char = data[i]
-                    i += 1
-                    
-                    # handle escape sequences (for arrow keys)
-                    if char == "\x1b":  # ESC character
-                        in_escape_sequence = True
-                        escape_buffer = char
-                        continue
-                        
-                    if in_escape_sequence:
-                        escape_buffer += char
-                        
-                        # check for arrow key sequences
-                        if escape_buffer == "\x1b[A":  # Up arrow
-                            in_escape_sequence = False
-                            escape_buffer = ""
-                            
-                            if not (in_continuous_ping or in_streaming_rag): # don't process when streaming
-                                # handle up arrow (history previous)
-                                if command_history:
-                                    # move up in history
-                                    if history_index < len(command_history) - 1:
-                                        history_index += 1
-                                    
-                                    # clear current line
-                                    channel.send("\r" + " " * (len(prompt) + len(buffer)) + "\r")
-                                    channel.send(prompt)
-                                    
-                                    # display the historical command
-                                    buffer = command_history[-(history_index+1)]
-                                    cursor_pos = len(buffer)  # place cursor at end of command
-                                    channel.send(buffer)
-                        
-                        elif escape_buffer == "\x1b[B":  # down arrow
-                            in_escape_sequence = False
-                            escape_buffer = ""
-                            
-                            if not (in_continuous_ping or in_streaming_rag):  # only when not in special modes
-                                # handle down arrow (history next)
-                                # move down in history
-                                if history_index > 0:
-                                    history_index -= 1
-                                    # clear current line
-                                    channel.send("\r" + " " * (len(prompt) + len(buffer)) + "\r")
-                                    channel.send(prompt)
-                                    
-                                    # display the historical command
-                                    buffer = command_history[-(history_index+1)]
-                                    cursor_pos = len(buffer)  # place cursor at end of command
-                                    channel.send(buffer)
-                                else:
-                                    # if at the bottom of history, clear the line
-                                    history_index = -1
-                                    channel.send("\r" + " " * (len(prompt) + len(buffer)) + "\r")
-                                    channel.send(prompt)
-                                    buffer = ""
-                                    cursor_pos = 0
-                        
-                        elif escape_buffer == "\x1b[C":  # right arrow
-                            in_escape_sequence = False
-                            escape_buffer = ""
-                            
-                            if not (in_continuous_ping or in_streaming_rag):  # only when not in special modes
-                                # move cursor right if not at end of buffer
-                                if cursor_pos < len(buffer):
-                                    cursor_pos += 1
-                                    channel.send("\x1b[C")  # send cursor right command
-                        
-                        elif escape_buffer == "\x1b[D":  # left arrow
-                            in_escape_sequence = False
-                            escape_buffer = ""
-                            
-                            if not (in_continuous_ping or in_streaming_rag):  # only when not in special modes
-                                # move cursor left if not at beginning of buffer
-                                if cursor_pos > 0:
-                                    cursor_pos -= 1
-                                    channel.send("\x1b[D")  # send cursor left command
-                        
-                        # if we've collected enough chars and still don't have a match, cancel the sequence
-                        elif len(escape_buffer) >= 3:
-                            in_escape_sequence = False
-                            escape_buffer = ""
-                            
-                        continue
-                    
-                    # handle tab completion
-                    if char == "\t" and not (in_continuous_ping or in_streaming_rag):
-                        # store original buffer if this is the first tab press
-                        if not tab_buffer:
-                            tab_buffer = buffer
-                        
-                        # get current directory
-                        current_dir = command_processor.current_dirs.get(server.session_id, "/home/honeypot")
-                        
-                        # split the command to get the last part for completion
-                        cmd_parts = buffer.split()
-                        
-                        # only attempt completion if we have a partial filename
-                        if len(cmd_parts) > 0:
-                            # get the part to complete (last part of the command)
-                            to_complete = cmd_parts[-1] if cmd_parts else ""
-                            
-                            # handle relative vs absolute paths
-                            dir_path = current_dir
-                            base_name = to_complete
-                            
-                            if to_complete:
-                                if to_complete.startswith('/'):
-                                    # it's an absolute path
-                                    dir_path = os.path.dirname(to_complete) or '/'
-                                    base_name = os.path.basename(to_complete)
-                                elif '/' in to_complete:
-                                    # it's a relative path with subdirectories
-                                    rel_dir = os.path.dirname(to_complete)
-                                    dir_path = os.path.normpath(os.path.join(current_dir, rel_dir))
-                                    base_name = os.path.basename(to_complete)
-                            
-                            try:
-                                # get directory contents from virtual filesystem
-                                dir_listing = command_processor.filesystem.list_directory(dir_path, server.session_id)
-                                
-                                # parse directory listing to get filenames
-                                if isinstance(dir_listing, str) and not "cannot access" in dir_listing:
-                                    # clean up color codes and split into items
-                                    dir_listing = dir_listing.replace("\033[1;34m", "").replace("\033[1;32m", "").replace("\033[0m", "")
-                                    dir_items = dir_listing.split("  ")
-                                    dir_items = [item.rstrip('*/') for item in dir_items if item]  # Remove trailing /, *, etc.
-                                    
-                                    # find matches
-                                    completions = [item for item in dir_items if item.startswith(base_name)]
-                                    
-                                    if len(completions) == 1:
-                                        # single match - autocomplete
-                                        completion = completions[0]
-                                        
-                                        # check if it's a directory
-                                        if dir_path == '/':
-                                            full_path = '/' + completion
-                                        else:
-                                            full_path = os.path.join(dir_path, completion)
-                                            
-                                        is_dir = command_processor.filesystem.is_directory(full_path, server.session_id)
-                                        if is_dir:
-                                            completion += "/"
-                                        
-                                        # replace the partial filename with the complete one
-                                        if len(cmd_parts) > 0:
-                                            if to_complete.startswith('/'):
-                                                # absolute path
-                                                cmd_parts[-1] = os.path.join(os.path.dirname(to_complete), completion)
-                                            elif '/' in to_complete:
-                                                # relative path with directory
-                                                rel_dir = os.path.dirname(to_complete)
-                                                cmd_parts[-1] = os.path.join(rel_dir, completion)
-                                            else:
-                                                # simple filename
-                                                cmd_parts[-1] = completion
-                                        else:
-                                            cmd_parts = [completion]
-                                        
-                                        # display the completed command
-                                        channel.send("\r" + " " * (len(prompt) + len(buffer)) + "\r")
-                                        channel.send(prompt)
-                                        buffer = " ".join(cmd_parts)
-                                        cursor_pos = len(buffer)  # place cursor at end
-                                        channel.send(buffer)
-                                    
-                                    elif len(completions) > 1:
-                                        # multiple matches - show possibilities
-                                        channel.send("\r\n")
-                                        for comp in completions:
-                                            channel.send(comp + "  ")
-                                        channel.send("\r\n")
-                                        channel.send(prompt + buffer)
-                            except Exception as e:
-                                logger.error(f"Error during tab completion: {str(e)}")
-                                channel.send("\r\n")
-                                channel.send(prompt + buffer)
-                    
-                    # handle Ctrl+C
-                    elif char == "\x03":
-                        # cancel streaming RAG if active
-                        if in_streaming_rag:
-                            # set the global interrupted flag
-                            active_command["interrupted"] = True
-                            active_command["session_id"] = server.session_id
-                            in_streaming_rag = False
-
-                            # reset buffer and show new prompt
-                            buffer = ""
-                            cursor_pos = 0
-                            prompt = command_processor.get_prompt(server.session_id)
-                            channel.send(prompt)
-                        elif in_continuous_ping:
-                            # stop the ping and show stats
-                            in_continuous_ping = False
-                            channel.send("^C\r\n")
-                            stats = command_processor.stop_ping(server.session_id)
-                            if stats:
-                                # properly format each line of the statistics with proper CRLF
-                                for line in stats.split('\n'):
-                                    channel.send(line + "\r\n")
-                            
-                            # reset buffer and show new prompt
-                            buffer = ""
-                            cursor_pos = 0
-                            prompt = command_processor.get_prompt(server.session_id)
-                            channel.send(prompt)
-                        else:
-                            # regular Ctrl+C handling
-                            buffer = ""
-                            cursor_pos = 0
-                            tab_buffer = ""
-                            channel.send("^C\r\n")  # show ^C and start a new line
-                            prompt = command_processor.get_prompt(server.session_id)
-                            channel.send(prompt)
-                    
-                    # handle enter key
-                    elif char == "\r" and not (in_continuous_ping or in_streaming_rag):
-                        command = buffer.strip()
-                        buffer = ""
-                        cursor_pos = 0
-                        tab_buffer = ""  # reset tab completion buffer
-                        history_index = -1  # reset history position
-                        
-                        # echo newline for proper formatting
-                        channel.send("\r\n")
-                        
-                        if command:
-                            # save to history (avoid duplicates at the end)
-                            if not command_history or command_history[-1] != command:
-                                command_history.append(command)
-                                # keep history at a reasonable size
-                                if len(command_history) > 100:
-                                    command_history.pop(0)
-                                    
-                            logger.info(f"Command from {addr[0]} (user {server.username}): {command}")
-                            log_command(server.session_id, command)
-                            
-                            # check for exit command
-                            if command.lower() in ["exit", "quit", "logout"]:
-                                logger.info(f"Client {addr[0]} exited the session")
-                                channel.close()
-                                break
-                                
-                            # check for ping command specifically
-                            if command.startswith("ping "):
-                                response = command_processor.process_command(server.session_id, command)
-                                
-                                # check if this is a continuous ping
-                                lines = response.split('\n')
-                                if "PING_CONTINUES" in lines:
-                                    # remove the PING_CONTINUES marker
-                                    lines = [l for l in lines if l != "PING_CONTINUES"]
-                                    
-                                    # send the ping header
-                                    channel.send("\n".join(lines) + "\r\n")
-                                    
-                                    # enter continuous ping mode
-                                    in_continuous_ping = True
-                                    last_ping_time = time.time()  # initialize last ping time
-                                    
-                                    # extract ping interval if specified
-                                    parts = command.split()
-                                    for idx, part in enumerate(parts):
-                                        if part == "-i" and idx + 1 < len(parts):
-                                            try:
-                                                ping_interval = float(parts[idx + 1])
-                                            except (ValueError, IndexError):
-                                                ping_interval = 1.0
-                                    
-                                    continue  # skip prompt display
-                                else:
-                                    # normal ping with count, send the full response
-                                    lines = response.split('\n')
-                                    for line in lines:
-                                        channel.send(line + "\r\n")
-                            else:
-                                # check if this is a RAG command with streaming enabled
-                                if hasattr(command_processor, 'smart_rag') and \
-                                   not command_processor.smart_rag.is_native_command(command) and \
-                                   RAG_STREAM_OUTPUT:
-                                    # enter streaming mode
-                                    in_streaming_rag = True
-                                    streaming_start_time = time.time()
-                                    streaming_last_output = time.time()
-
-                                    active_command["interrupted"] = False
-                                    active_command["session_id"] = server.session_id
-                                    
-                                    # define a function to handle the RAG processing in a separate thread
-                                    def process_rag_command():
-                                        nonlocal in_streaming_rag
-                                        try:
-                                            # process command with streaming
-                                            command_processor.execute_command(server.session_id, command, token_callback)
-                                            
-                                            # wait a very short time to ensure any final tokens are processed
-                                            time.sleep(0.1)
-                                            
-                                            # set flag that streaming is done
-                                            in_streaming_rag = False
-                                            
-                                            # send a newline and prompt when complete
-                                            if channel and not channel.closed:
-                                                channel.send("\r\n")
-                                                prompt = command_processor.get_prompt(server.session_id)
-                                                channel.send(prompt)
-                                                
-                                            logger.info(f"RAG streaming completed for command: {command}")
-                                        except Exception as e:
-                                            logger.error(f"Error in RAG command processing: {e}")
-                                            # make sure we clean up on error
-                                            in_streaming_rag = False
-                                            
-                                            if channel and not channel.closed:
-                                                channel.send(f"\r\nError: {str(e)}\r\n")
-                                                prompt = command_processor.get_prompt(server.session_id)
-                                                channel.send(prompt)
-                                    
-                                    # start the processing in a background thread
-                                    streaming_thread = threading.Thread(target=process_rag_command)
-                                    streaming_thread.daemon = True
-                                    streaming_thread.start()
-                                    
-                                    # continue with the main loop - the thread will handle prompt display when finished
-                                else:
-                                    # process regular command without streaming
-                                    response = command_processor.process_command(server.session_id, command)
-                                    
-                                    # handle special responses
-                                    if response == "logout":
-                                        logger.info(f"Client {addr[0]} exited the session")
-                                        channel.close()
-                                        break
-                                    elif response == "\033[2J\033[H":  # clear screen
-                                        channel.send(response)
-                                    else:
-                                        # regular command output - use proper line formatting
-                                        if response:
-                                            # process multiline responses properly
-                                            lines = response.replace('\r', '').split('\n')
-                                            for line in lines:
-                                                # send each line with proper CRLF
-                                                channel.send(line + "\r\n")
-                        
-                        # send new prompt if not in streaming or continuous ping
-                        if not (in_streaming_rag or in_continuous_ping):
-                            prompt = command_processor.get_prompt(server.session_id)
-                            channel.send(prompt)
-                    
-                    # handle newline (ignore it, we handle CR)
-                    elif char == "\n":
-                        continue
-                    
-                    # handle backspace
-                    elif char in ("\x7f", "\x08") and not (in_continuous_ping or in_streaming_rag):
-                        if cursor_pos > 0:  # only if cursor is not at the beginning
-                            # if cursor is at the end of the buffer
-                            if cursor_pos == len(buffer):
-                                buffer = buffer[:-1]
-                                cursor_pos -= 1
-                                # send backspace sequence: move back, space over the character, move back again
-                                channel.send("\b \b")
-                            else:
-                                # cursor is in the middle of the buffer
-                                # remove character at cursor_pos - 1
-                                buffer = buffer[:cursor_pos-1] + buffer[cursor_pos:]
-                                cursor_pos -= 1
-                                
-                                # redraw the entire line from the cursor position
-                                channel.send("\b \b")  # delete the character under cursor
-                                # redraw the rest of the line
-                                channel.send(buffer[cursor_pos:] + " ")
-                                # move cursor back to the correct position
-                                channel.send("\b" * (len(buffer) - cursor_pos + 1))
-                    
-                    # handle Ctrl+D (EOF)
-                    elif char == "\x04" and not (in_continuous_ping or in_streaming_rag):
-                        if not buffer:  # only exit if buffer is empty
-                            logger.info(f"Client {addr[0]} sent EOF")
-                            channel.close()
-                            break
-                    
-                    # handle regular characters when not in special modes
-                    elif not (in_continuous_ping or in_streaming_rag) and ord(char) >= 32:
-                        # insert character at cursor position
-                        if cursor_pos == len(buffer):
-                            # cursor at end - simply append
-                            buffer += char
-                            cursor_pos += 1
-                            channel.send(char)  # echo input
-                        else:
-                            # cursor in the middle - insert and redraw
-                            buffer = buffer[:cursor_pos] + char + buffer[cursor_pos:]
-                            cursor_pos += 1
-                            
-                            # send the new character and the rest of the line
-                            channel.send(char + buffer[cursor_pos:])
-                            
-                            # move cursor back to the position after the inserted character
-                            channel.send("\b" * (len(buffer) - cursor_pos))
-                        
+                if not session.feed(data):
+                    break
+
             except Exception as e:
                 logger.error(f"Error handling connection data from {addr[0]}: {str(e)}")
                 break
-                
+
     except Exception as e:
         logger.error(f"Error handling connection from {addr[0]}: {str(e)}")
     finally:
-        # reset any active commands associated with this session
-        if active_command["session_id"] == server.session_id:
-            active_command["interrupted"] = True
-            active_command["session_id"] = None
-
-        # only log session end if not already closed
-        if not session_closed and hasattr(server, 'session_id') and server.session_id is not None:
-            log_session_end(server.session_id)
-            session_closed = True
-            logger.info(f"Logged session end for {server.session_id}")
-        
-        # close channel if still open
-        if channel and not channel.closed:
-            try:
-                channel.close()
-                logger.info(f"Closed channel for {addr[0]}")
-            except Exception as e:
-                logger.error(f"Error closing channel: {e}")
-        
-        # close transport if active
-        if transport and transport.is_active():
-            try:
-                transport.close()
-                logger.info(f"Closed transport for {addr[0]}")
-            except Exception as e:
-                logger.error(f"Error closing transport: {e}")
-        
-        # always clean up the session in command processor
-        if hasattr(server, 'session_id') and server.session_id is not None:
-            # make sure any active pings are stopped
-            if hasattr(command_processor, 'ping_active') and server.session_id in command_processor.ping_active:
-                command_processor.ping_active[server.session_id]['active'] = False
-            
-            # clean up the session in command processor
-            command_processor.cleanup_session(server.session_id)
-            logger.info(f"Cleaned up session {server.session_id} for client {addr[0]}")
-        
-        logger.info(f"Connection closed for {addr[0]}")
+        finish_connection(addr, server, transport, channel, command_processor, session_closed, session)
 
-def start_server(host, port, command_processor, host_key):
-    """Start the SSH honeypot server"""
+def create_admission_controller():
+    """Build the admission controller from the configured limits"""
+    return AdmissionController(
+        MAX_CONCURRENT_SESSIONS,
+        MAX_SESSIONS_PER_IP,
+        MAX_PENDING_CONNECTIONS,
+        PENDING_CONNECTION_TIMEOUT
+    )
+
+def log_admission_stats(admission, last_logged):
+    """Periodically log admission counters, returns the time of the last log"""
+    now = time.time()
+    if now - last_logged < ADMISSION_STATS_INTERVAL:
+        return last_logged
+    stats = admission.snapshot()
+    if stats["queued"] or stats["rejected_global"] or stats["rejected_per_ip"] or stats["expired"]:
+        logger.info(f"Admission stats: {stats}")
+    return now
+
+def serve_admitted(client, addr, command_processor, host_key, admission):
+    """Handle an admitted connection, then keep the thread for any queued ones"""
+    while client is not None:
+        try:
+            handle_connection(client, addr, command_processor, host_key)
+        finally:
+            next_connection = admission.release(addr[0])
+        client, addr = next_connection if next_connection else (None, None)
+        if client is not None:
+            logger.info(f"Dequeued connection from {addr[0]}:{addr[1]}")
+
+def create_listen_socket(reuse_port=False):
+    """Create the listening socket, optionally shared between worker processes"""
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        # every worker binds the same port and the kernel spreads new connections across them
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    return server_socket
+
+def start_server(host, port, command_processor, host_key, reuse_port=False):
+    """Start the SSH honeypot server"""
+    server_socket = create_listen_socket(reuse_port)
+    admission = create_admission_controller()
+    stats_logged = time.time()
     
     try:
         server_socket.bind((host, port))
@@ -743,12 +990,19 @@ def start_server(host, port, command_processor, host_key):
             try:
                 server_socket.settimeout(1.0)  # 1 second timeout for accepting connections
                 client, addr = server_socket.accept()
-                logger.info(f"Connection from {addr[0]}:{addr[1]}")
                 
-                # handle each connection in a separate thread
+                # admission control happens before any SSH negotiation
+                decision = admission.admit(client, addr)
+                if decision == REJECTED:
+                    continue
+                logger.info(f"Connection from {addr[0]}:{addr[1]} ({decision})")
+                if decision == QUEUED:
+                    continue
+                
+                # handle each admitted connection in a separate thread
                 thread = threading.Thread(
-                    target=handle_connection, 
-                    args=(client, addr, command_processor, host_key)
+                    target=serve_admitted, 
+                    args=(client, addr, command_processor, host_key, admission)
                 )
                 thread.daemon = True
                 thread.start()
@@ -758,6 +1012,9 @@ def start_server(host, port, command_processor, host_key):
             except Exception as e:
                 if not stop_event.is_set():
                     logger.error(f"Error accepting connection: {e}")
+            finally:
+                admission.expire_pending()
+                stats_logged = log_admission_stats(admission, stats_logged)
     except Exception as e:
         logger.error(f"Error starting server: {e}")
     finally:
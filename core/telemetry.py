@@ -0,0 +1,102 @@
+"""
+Per-command telemetry for the SSH honeypot.
+The session creates a record when Enter is pressed, handlers deeper in the stack
+(the RAG wrapper, the response cache, direct inference) tag the record of the
+command running on their thread, and the finished record is stored with the command.
+"""
+import threading
+import time
+from core.responses import ResponseRecorder
+
+# handler paths
+NATIVE = "native"  # implemented by the command processor
+CACHE = "cache"    # answered from the LLM response cache
+DIRECT = "direct"  # direct model inference
+RAG = "rag"        # retrieval augmented generation
+
+_current = threading.local()
+
+
+class CommandTelemetry:
+    """Timings and sizes of one command, all times from time.monotonic()"""
+    __slots__ = ("handler", "received", "started", "first_output", "finished", "output_bytes", "tokens", "exit_code",
+                 "recorder", "response")
+
+    def __init__(self, received=None):
+        self.handler = NATIVE
+        self.received = received or time.monotonic()  # when the input holding the command arrived
+        self.started = None       # when a handler began working on it
+        self.first_output = None  # when its first byte was written to the client
+        self.finished = None
+        self.output_bytes = 0
+        self.tokens = None        # LLM tokens generated, None when no model was involved
+        self.exit_code = None
+        self.recorder = ResponseRecorder()
+        self.response = None      # (sha256, size, compressed body) once finished
+
+    def start(self):
+        if self.started is None:
+            self.started = time.monotonic()
+
+    def output(self, text):
+        """Account output written to the client"""
+        if text:
+            if self.first_output is None:
+                self.first_output = time.monotonic()
+            self.output_bytes += len(text.encode("utf-8", errors="replace"))
+            self.recorder.feed(text)
+
+    def finish(self, exit_code=None):
+        self.finished = time.monotonic()
+        self.exit_code = exit_code
+        self.response = self.recorder.finish()
+
+    def _ms(self, end, begin):
+        return round((end - begin) * 1000, 3) if end is not None and begin is not None else None
+
+    def columns(self):
+        """Values of the telemetry columns of the commands table"""
+        return {
+            "handler": self.handler,
+            "queue_wait_ms": self._ms(self.started, self.received),
+            "ttfb_ms": self._ms(self.first_output, self.received),
+            "latency_ms": self._ms(self.finished, self.received),
+            "output_bytes": self.output_bytes,
+            "llm_tokens": self.tokens,
+            "exit_code": self.exit_code,
+            "response_hash": self.response[0] if self.response else None,
+        }
+
+
+class recording:
+    """Make record the current command's telemetry on this thread while the block runs"""
+    def __init__(self, record):
+        self.record = record
+
+    def __enter__(self):
+        self.previous = getattr(_current, "record", None)
+        _current.record = self.record
+        return self.record
+
+    def __exit__(self, *exc):
+        _current.record = self.previous
+        return False
+
+
+def current():
+    """Telemetry of the command running on this thread, None outside of one"""
+    return getattr(_current, "record", None)
+
+
+def mark_handler(handler):
+    """Record which path answered the command running on this thread"""
+    record = current()
+    if record is not None:
+        record.handler = handler
+
+
+def count_tokens(count=1):
+    """Add LLM tokens generated for the command running on this thread"""
+    record = current()
+    if record is not None and count:
+        record.tokens = (record.tokens or 0) + count
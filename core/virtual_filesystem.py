@@ -1,430 +1,514 @@
 """
-Virtual filesystem implementation for the SSH honeypot with session isolation
+Virtual filesystem implementation for the SSH honeypot with session isolation.
+All sessions share one read-only base image, each session only keeps a small
+copy-on-write layer with the paths it wrote, created or deleted.
+Nodes live in memory and are found through a path index, no disk access per lookup.
 """
+import errno
+import itertools
 import os
-import json
-import shutil
-import copy
+import posixpath
+import stat
+import time
 from utils.log_setup import logger
-from utils.filesystem_data import file_system, sample_files
-from config import FILESYSTEM_DIR, USERNAME
+from core.base_image import BaseImage
+from core.capture import CaptureStore
+from core.reclaimer import get_reclaimer
+from core.host_profile import HostProfile, GENERATED_FILES
+from config import FILESYSTEM_DIR, USERNAME, BASE_IMAGE_NAME, SESSION_QUOTA_BYTES, SESSION_QUOTA_INODES, MAX_FILE_SIZE
+from config import FILE_CHUNK_SIZE
+
+
+WHITEOUT = object()  # session layer entry for a path deleted in the session
+
+
+def normalize_path(virtual_path):
+    """Absolute, normalized form of a virtual path, used as the index key"""
+    if virtual_path.startswith("/") and "//" not in virtual_path and "/." not in virtual_path \
+            and (virtual_path == "/" or not virtual_path.endswith("/")):
+        return virtual_path
+    return posixpath.normpath("/" + virtual_path.strip("/"))
+
+
+DIR_MODE = stat.S_IFDIR | 0o755
+FILE_MODE = stat.S_IFREG | 0o644
+DIR_SIZE = 4096
+
+
+def _no_space(virtual_path):
+    return OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), virtual_path)
+
+
+def _stale(session_id):
+    return OSError(errno.ESTALE, os.strerror(errno.ESTALE), f"session {session_id}")
+
+
+class Inode:
+    """A file or directory with its metadata, directories keep a name -> Inode map of their children"""
+    __slots__ = ("name", "parent", "children", "content", "appended", "mode", "owner", "group", "size", "nlink",
+                 "mtime", "atime", "ctime")
+
+    def __init__(self, name, parent=None, children=None, content=None, mode=None, owner=USERNAME, group=None,
+                 mtime=None, size=None, nlink=None):
+        self.name = name
+        self.parent = parent      # containing directory, None for the root
+        self.children = children  # None for files
+        self.content = content    # None for base image files until they are first read
+        self.appended = None      # chunks appended after content, joined on the next full read
+        self.mode = mode if mode is not None else (DIR_MODE if children is not None else FILE_MODE)
+        self.owner = owner
+        self.group = owner if group is None else group
+        if size is None:
+            size = DIR_SIZE if children is not None else len(content.encode('utf-8'))
+        self.size = size
+        if nlink is None:
+            nlink = 2 if children is not None else 1
+        self.nlink = nlink
+        self.mtime = self.atime = self.ctime = time.time() if mtime is None else mtime
+
+    @property
+    def is_dir(self):
+        return self.children is not None
+
+
+class DirEntry:
+    """A directory entry as returned by scandir(), rendered by the formatters in core.listing"""
+    __slots__ = ("name", "path", "is_dir", "mode", "owner", "group", "size", "nlink", "mtime", "atime", "ctime")
+
+    def __init__(self, name, path, node, nlink, mtime):
+        self.name = name
+        self.path = path
+        self.is_dir = node.is_dir
+        self.mode = node.mode
+        self.owner = node.owner
+        self.group = node.group
+        self.size = node.size
+        self.nlink = nlink
+        self.mtime = mtime
+        self.atime = node.atime
+        self.ctime = max(node.ctime, mtime)
+
+
+class SessionLayer:
+    """Copy-on-write delta of one session over the shared base image"""
+    __slots__ = ("entries", "overlays", "touched", "versions", "bytes_used", "inodes_used", "unsaved")
+
+    def __init__(self):
+        self.entries = {}   # normalized path -> Inode or WHITEOUT, every path the session wrote, created or deleted
+        self.overlays = {}  # base directory path -> {name: Inode or WHITEOUT}, the session's changes to its children
+        self.touched = {}   # base directory path -> time the session last changed its children
+        self.versions = {}  # directory path -> version, changes with every change to its children
+        self.bytes_used = 0   # file content held by the layer, checked against SESSION_QUOTA_BYTES
+        self.inodes_used = 0  # files and directories held by the layer, checked against SESSION_QUOTA_INODES
+        self.unsaved = set()  # appended paths not yet stored in the capture store
+
 
 class VirtualFilesystem:
     def __init__(self, base_dir):
         self.base_dir = base_dir
-        self.master_fs_data = file_system  # keep an untouched master copy
-        self.fs_data = copy.deepcopy(file_system)  # working copy for default state
-        self.session_filesystems = {}  # dictionary to store per-session filesystem data
-        self.session_base_dirs = {}  # dictionary to store per-session base directories
-        
-        # initialize the master filesystem once
-        self.initialize_filesystem()
-        
-    def initialize_filesystem(self):
-        """Create the base filesystem structure from the fs_data dictionary"""
-        if not os.path.exists(self.base_dir):
-            os.makedirs(self.base_dir)
-        
-        # clear existing filesystem for a fresh start if needed
-        if os.path.exists(self.base_dir) and os.listdir(self.base_dir):
-            logger.info(f"Clearing existing filesystem at {self.base_dir}")
-            for item in os.listdir(self.base_dir):
-                item_path = os.path.join(self.base_dir, item)
-                try:
-                    if os.path.isdir(item_path):
-                        shutil.rmtree(item_path)
-                    else:
-                        os.remove(item_path)
-                except Exception as e:
-                    logger.error(f"Error removing {item_path}: {e}")
-        
-        # ensure all structures from fs_data are created in the filesystem
-        self._create_fs_structure("", self.fs_data)
-        
-        # create any additional sample files
-        for path, content in sample_files.items():
-            self.create_sample_file(path.lstrip('/'), content)
-        
-        # verify that all files and directories exist in the real filesystem
-        self._verify_filesystem_integrity()
-        
-        logger.info(f"Initialized master virtual filesystem at {self.base_dir}")
-    
+        # shared read-only base image, compiled from files.json and only rebuilt when it changes
+        self.image = BaseImage(os.path.join(base_dir, BASE_IMAGE_NAME))
+        self.image.ensure()
+        self.base_index = {}  # normalized path -> Inode
+        for path, is_dir, mode, owner, group, size, nlink, mtime in self.image.nodes():
+            parent = self.base_index.get(posixpath.dirname(path)) if path != "/" else None
+            node = Inode(posixpath.basename(path), parent, {} if is_dir else None, None, mode, owner, group,
+                         mtime, size, nlink)
+            if parent is not None:
+                parent.children[node.name] = node
+            self.base_index[path] = node
+        self.root = self.base_index["/"]
+
+        self.session_layers = {}  # session_id -> SessionLayer
+        self.default_layer = SessionLayer()  # changes made outside of a session
+        self.captures = CaptureStore()  # keeps what sessions write after their layer is gone
+        self.version_counter = itertools.count(1)  # directory versions, unique across all sessions
+        self.host = HostProfile()  # renders /proc, /sys and /dev files when they are read
+        for path in GENERATED_FILES:
+            # kernel files and device nodes are as old as the running system
+            node = self.base_index[path]
+            node.mtime = node.atime = node.ctime = self.host.boot_time
+        logger.info(f"Loaded base image with {len(self.base_index)} nodes")
+
     def initialize_session(self, session_id):
-        """Initialize a new filesystem for a specific session"""
-        # create session-specific directory
-        session_dir = os.path.join(self.base_dir, f"session_{session_id}")
-        self.session_base_dirs[session_id] = session_dir
-        
-        # create a copy of the filesystem data for this session
-        self.session_filesystems[session_id] = copy.deepcopy(self.master_fs_data)
-        
-        # create the filesystem for this session
-        if not os.path.exists(session_dir):
-            os.makedirs(session_dir)
-            
-            # clone the master filesystem to this session directory
-            self._copy_directory(self.base_dir, session_dir, exclude=["session_"])
-            
-            logger.info(f"Initialized session filesystem for session {session_id} at {session_dir}")
-        
-        return session_dir
-    
-    def _copy_directory(self, src, dst, exclude=None):
-        """Copy a directory recursively, excluding certain patterns"""
-        exclude = exclude or []
-        
-        for item in os.listdir(src):
-            if any(pattern in item for pattern in exclude):
-                continue
-                
-            s = os.path.join(src, item)
-            d = os.path.join(dst, item)
-            if os.path.isdir(s):
-                os.makedirs(d, exist_ok=True)
-                self._copy_directory(s, d, exclude)
-            else:
-                try:
-                    shutil.copy2(s, d)
-                except Exception as e:
-                    logger.error(f"Error copying {s} to {d}: {e}")
-    
+        """Start an empty copy-on-write layer for a session"""
+        self.session_layers[session_id] = SessionLayer()
+        logger.info(f"Initialized session filesystem for session {session_id}")
+
     def cleanup_session(self, session_id):
-        """Clean up a session's filesystem"""
-        if session_id in self.session_base_dirs:
-            session_dir = self.session_base_dirs[session_id]
-            if os.path.exists(session_dir):
-                try:
-                    shutil.rmtree(session_dir)
-                    logger.info(f"Cleaned up session filesystem for session {session_id}")
-                except Exception as e:
-                    logger.error(f"Error cleaning up session directory {session_dir}: {e}")
-            
-            # remove session data
-            del self.session_base_dirs[session_id]
-            
-        if session_id in self.session_filesystems:
-            del self.session_filesystems[session_id]
-    
-    def _create_fs_structure(self, current_path, directory_dict):
-        """Recursively create the filesystem structure from the dictionary"""
-        for name, content in directory_dict.items():
-            path = os.path.join(current_path, name)
-            real_path = os.path.join(self.base_dir, path)
-            
-            if isinstance(content, dict):
-                # this is a directory
-                os.makedirs(real_path, exist_ok=True)
-                self._create_fs_structure(path, content)
-            else:
-                # this is a file
-                dir_path = os.path.dirname(real_path)
-                os.makedirs(dir_path, exist_ok=True)
-                with open(real_path, 'w') as f:
-                    f.write(content)
-    
-    def create_sample_file(self, relative_path, content, session_id=None):
-        # determine the base directory based on session
-        base_dir = self.session_base_dirs.get(session_id, self.base_dir)
-        
-        file_path = os.path.join(base_dir, relative_path)
-        dir_path = os.path.dirname(file_path)
-        os.makedirs(dir_path, exist_ok=True)
-        with open(file_path, 'w') as f:
-            f.write(content)
-    
-    def get_real_path(self, virtual_path, session_id=None):
-        # determine the base directory based on session
-        base_dir = self.session_base_dirs.get(session_id, self.base_dir)
-        
-        if virtual_path.startswith('/'):
-            virtual_path = virtual_path[1:]  # remove leading slash
-        return os.path.join(base_dir, virtual_path)
-    
-    def list_directory(self, virtual_path, session_id=None):
-        # get the session-specific filesystem data
-        fs_data = self.session_filesystems.get(session_id, self.fs_data)
-        
-        # get the real path using the session-specific base directory
-        real_path = self.get_real_path(virtual_path, session_id)
-        
-        if not os.path.exists(real_path):
-            # special case for root directory
-            if virtual_path == "/" or virtual_path == "":
-                files = list(fs_data.keys())
-                result = []
-                for f in sorted(files):
-                    result.append(f"\033[1;34m{f}/\033[0m" if isinstance(fs_data[f], dict) else f)
-                return "  ".join(result)
-                
-            # for other paths, try to find them in fs_data
-            if virtual_path.startswith('/'):
-                path_parts = virtual_path.strip('/').split('/')
-            else:
-                path_parts = virtual_path.split('/')
-                
-            # try to find the directory in fs_data
-            current = fs_data
-            for part in path_parts:
-                if part and part in current:
-                    current = current[part]
-                else:
-                    return f"ls: cannot access '{virtual_path}': No such file or directory"
-                    
-            # if we found a directory, list its contents
-            if isinstance(current, dict):
-                files = list(current.keys())
-                
-                # create the directory in the real filesystem if it doesn't exist
-                os.makedirs(real_path, exist_ok=True)
-                
-                # create any files that exist in fs_data but not in real filesystem
-                for f in files:
-                    file_path = os.path.join(real_path, f)
-                    if not os.path.exists(file_path):
-                        if isinstance(current[f], dict):
-                            # this is a directory
-                            os.makedirs(file_path, exist_ok=True)
-                        else:
-                            # this is a file
-                            with open(file_path, 'w') as file:
-                                file.write(current[f])
-                
-                # now list the directory from the real filesystem
-                result = []
-                for f in sorted(files):
-                    if isinstance(current[f], dict):
-                        result.append(f"\033[1;34m{f}/\033[0m")  # blue for directories
-                    else:
-                        result.append(f)
-                
-                return "  ".join(result)
+        """Drop a session's layer, nothing is left behind on disk"""
+        layer = self.session_layers.pop(session_id, None)
+        if layer is not None:
+            for path in list(layer.unsaved):
+                self._capture(path, layer, session_id)
+            logger.info(f"Cleaned up session filesystem for session {session_id}")
+
+    def _layer(self, session_id):
+        """Layer of a session, the default layer for session_id None.
+        Raises ESTALE for a session that was never initialized or is already cleaned up,
+        so a command still running at disconnect cannot write into the shared default layer"""
+        if session_id is None:
+            return self.default_layer
+        layer = self.session_layers.get(session_id)
+        if layer is None:
+            raise _stale(session_id)
+        return layer
+
+    def _lookup(self, path, layer):
+        """Inode at a normalized path as the session sees it, None if it does not exist"""
+        entry = layer.entries.get(path)
+        if entry is not None:
+            return None if entry is WHITEOUT else entry
+        if layer.entries:
+            # an ancestor deleted or replaced in the layer hides the base below it
+            parent = path
+            while parent != "/":
+                parent = posixpath.dirname(parent)
+                if parent in layer.entries:
+                    return None
+        return self.base_index.get(path)
+
+    def _children(self, path, directory, layer):
+        """Name -> Inode map of a directory as the session sees it, must not be modified"""
+        overlay = layer.overlays.get(path)
+        if not overlay:
+            # directories created in the session hold their own children
+            return directory.children
+        children = dict(directory.children)
+        for name, entry in overlay.items():
+            if entry is WHITEOUT:
+                children.pop(name, None)
             else:
-                return f"ls: cannot access '{virtual_path}': Not a directory"
-        
-        if not os.path.isdir(real_path):
-            return f"ls: cannot access '{virtual_path}': Not a directory"
-        
-        try:
-            files = os.listdir(real_path)
-            if not files:
-                return ""  # empty directory
-            
-            # format output similar to ls command
-            result = []
-            for f in sorted(files):
-                full_path = os.path.join(real_path, f)
-                if os.path.isdir(full_path):
-                    result.append(f"\033[1;34m{f}/\033[0m")  # blue for directories
-                elif os.access(full_path, os.X_OK):
-                    result.append(f"\033[1;32m{f}*\033[0m")  # green for executables
-                else:
-                    result.append(f)
-            
-            return "  ".join(result)
-        except Exception as e:
-            logger.error(f"Error listing directory {virtual_path}: {e}")
-            return f"ls: cannot access '{virtual_path}': {str(e)}"
+                children[name] = entry
+        return children
+
+    def _content(self, path, node):
+        """Content of a file node, base image files are read from the image on first use"""
+        if node.content is None:
+            node.content = self.image.read_content(path)
+        elif node.appended:
+            node.content = "".join([node.content, *node.appended])
+            node.appended = None
+        return node.content
+
+    def _generated(self, path, node):
+        """Content of a generated /proc, /sys or /dev file, None for any other node"""
+        if path in GENERATED_FILES and self.base_index.get(path) is node:
+            return self.host.render(path)
+        return None
+
+    def _entry(self, name, path, node, layer):
+        """DirEntry for a node, base directories changed by the session get their nlink and mtime from the layer"""
+        if not node.is_dir:
+            return DirEntry(name, path, node, node.nlink, node.mtime)
+        if path in layer.entries:
+            # directory created in the session, its own children are current
+            children, mtime = node.children, node.mtime
+        else:
+            children = self._children(path, node, layer) if path in layer.overlays else None
+            mtime = layer.touched.get(path, node.mtime)
+        nlink = node.nlink if children is None else 2 + sum(1 for child in children.values() if child.is_dir)
+        return DirEntry(name, path, node, nlink, mtime)
+
+    def _touch_directory(self, path, layer):
+        """Record a change to a directory's children"""
+        now = time.time()
+        layer.versions[path] = next(self.version_counter)
+        directory = layer.entries.get(path)
+        if directory is not None:
+            directory.mtime = directory.ctime = now
+        else:
+            layer.touched[path] = now
+
+    def _charge(self, layer, path, added_bytes, added_inodes):
+        """Account a change in the layer's usage, raises ENOSPC if it would go over the session quota"""
+        if (added_bytes > 0 and layer.bytes_used + added_bytes > SESSION_QUOTA_BYTES) or \
+                (added_inodes > 0 and layer.inodes_used + added_inodes > SESSION_QUOTA_INODES):
+            logger.warning(f"Session quota exceeded writing {path}: {layer.bytes_used} bytes, "
+                           f"{layer.inodes_used} inodes in use")
+            raise _no_space(path)
+        layer.bytes_used += added_bytes
+        layer.inodes_used += added_inodes
+
+    def _link(self, path, node, layer):
+        """Add a node to the layer and to its parent directory's children, raises ENOSPC over quota"""
+        new = self._lookup(path, layer) is None
+        old = layer.entries.get(path)
+        if old is None or old is WHITEOUT:
+            self._charge(layer, path, 0 if node.is_dir else node.size, 1)
+        else:
+            self._charge(layer, path, (0 if node.is_dir else node.size) - (0 if old.is_dir else old.size), 0)
+        layer.entries[path] = node
+        if node.is_dir:
+            # a directory created in the session never shares a version with what was there before
+            layer.versions[path] = next(self.version_counter)
+        parent_path = posixpath.dirname(path)
+        parent = layer.entries.get(parent_path)
+        if parent is not None:
+            parent.children[node.name] = node
+        else:
+            layer.overlays.setdefault(parent_path, {})[node.name] = node
+        if new:
+            self._touch_directory(parent_path, layer)
+
+    def _make_parents(self, path, layer):
+        """Directory that holds path, creating missing parents in the layer. None if a parent is a file"""
+        parent_path = posixpath.dirname(path)
+        parent = self._lookup(parent_path, layer)
+        if parent is None:
+            grandparent = self._make_parents(parent_path, layer)
+            if grandparent is None:
+                return None
+            parent = Inode(posixpath.basename(parent_path), grandparent, children={})
+            self._link(parent_path, parent, layer)
+        return parent if parent.is_dir else None
+
+    def _capture(self, path, layer, session_id):
+        """Store an appended file in the capture store, once it is complete"""
+        layer.unsaved.discard(path)
+        node = layer.entries.get(path)
+        if session_id is not None and node is not None and node is not WHITEOUT and node.size:
+            get_reclaimer().capture(self.captures, session_id, path, self._content(path, node))
+
+    def _discard(self, path, layer, session_id=None):
+        """Remove a visible path and everything below it from the session's view"""
+        prefix = path + "/"
+        for entry_path in [p for p in layer.entries if p == path or p.startswith(prefix)]:
+            node = layer.entries.pop(entry_path)
+            if node is not WHITEOUT:
+                layer.bytes_used -= 0 if node.is_dir else node.size
+                layer.inodes_used -= 1
+            if entry_path in layer.unsaved:
+                self._capture(entry_path, layer, session_id)
+        for dir_path in [p for p in layer.overlays if p == path or p.startswith(prefix)]:
+            del layer.overlays[dir_path]
+            layer.touched.pop(dir_path, None)
+
+        parent_path, name = posixpath.split(path)
+        parent = layer.entries.get(parent_path)
+        if parent is not None:
+            # directory created in the session, the base has nothing below it
+            parent.children.pop(name, None)
+        elif path in self.base_index:
+            # the base node is hidden with a whiteout
+            layer.entries[path] = WHITEOUT
+            layer.overlays.setdefault(parent_path, {})[name] = WHITEOUT
+        else:
+            layer.overlays.get(parent_path, {}).pop(name, None)
+        self._touch_directory(parent_path, layer)
+
+    def scandir(self, virtual_path, session_id=None):
+        """Entries of a directory sorted by name, raises FileNotFoundError or NotADirectoryError"""
+        layer = self._layer(session_id)
+        path = normalize_path(virtual_path)
+        node = self._lookup(path, layer)
+
+        if node is None:
+            raise FileNotFoundError(virtual_path)
+        if not node.is_dir:
+            raise NotADirectoryError(virtual_path)
+
+        children = self._children(path, node, layer)
+        return [self._entry(name, posixpath.join(path, name), children[name], layer) for name in sorted(children)]
+
+    def directory_version(self, virtual_path, session_id=None):
+        """Version of a directory's children in the session's view, None if it is not a directory.
+        0 for base directories the session never changed, otherwise it changes with every change"""
+        layer = self._layer(session_id)
+        path = normalize_path(virtual_path)
+        node = self._lookup(path, layer)
+        if node is None or not node.is_dir:
+            return None
+        return layer.versions.get(path, 0)
+
+    def get_entry(self, virtual_path, session_id=None):
+        """Entry for a single path, None if it does not exist"""
+        layer = self._layer(session_id)
+        path = normalize_path(virtual_path)
+        node = self._lookup(path, layer)
+        if node is None:
+            return None
+        return self._entry(posixpath.basename(path) or "/", path, node, layer)
     
     def read_file(self, virtual_path, session_id=None):
-        # get the session-specific filesystem data
-        fs_data = self.session_filesystems.get(session_id, self.fs_data)
-        
-        # get the real path using the session-specific base directory
-        real_path = self.get_real_path(virtual_path, session_id)
-        
-        if not os.path.exists(real_path):
-            # if the file doesn't exist in the real filesystem, check if it exists in fs_data
-            if virtual_path.startswith('/'):
-                path_parts = virtual_path.strip('/').split('/')
-            else:
-                path_parts = virtual_path.split('/')
-                
-            # try to find the file in fs_data
-            current = fs_data
-            for part in path_parts[:-1]:  # navigate directories
-                if part and part in current:
-                    current = current[part]
-                else:
-                    return f"cat: {virtual_path}: No such file or directory"
-                    
-            # check if file exists
-            filename = path_parts[-1]
-            if filename in current and not isinstance(current[filename], dict):
-                # file exists in fs_data but not in real filesystem
-                # write it to the real filesystem and then read it
-                content = current[filename]
-                self.write_file(virtual_path, content, session_id)
-                return content
-            else:
-                return f"cat: {virtual_path}: No such file or directory"
-        
-        if os.path.isdir(real_path):
+        path = normalize_path(virtual_path)
+        node = self._lookup(path, self._layer(session_id))
+
+        if node is None:
+            return f"cat: {virtual_path}: No such file or directory"
+        if node.is_dir:
             return f"cat: {virtual_path}: Is a directory"
-        
-        try:
-            with open(real_path, 'r') as f:
-                content = f.read()
-                # replace literal '\n' with actual newlines if they exist
-                if '\\n' in content:
-                    content = content.replace('\\n', '\n')
-                return content
-        except Exception as e:
-            logger.error(f"Error reading file {virtual_path}: {e}")
-            return f"cat: {virtual_path}: {str(e)}"
+
+        generated = self._generated(path, node)
+        return generated if generated is not None else self._content(path, node)
+
+    def iter_file(self, virtual_path, session_id=None, chunk_size=FILE_CHUNK_SIZE):
+        """Content of a file in chunks of at most chunk_size characters, the file is never joined
+        or copied as a whole. Raises FileNotFoundError or IsADirectoryError"""
+        path = normalize_path(virtual_path)
+        node = self._lookup(path, self._layer(session_id))
+        if node is None:
+            raise FileNotFoundError(virtual_path)
+        if node.is_dir:
+            raise IsADirectoryError(virtual_path)
+        return self._chunks(path, node, chunk_size)
+
+    def _chunks(self, path, node, chunk_size):
+        generated = self._generated(path, node)
+        if generated is not None:
+            pieces = [generated]
+        else:
+            if node.content is None:
+                node.content = self.image.read_content(path)
+            # taken up front, appends made while the output is sent are not part of this read
+            pieces = [node.content, *(node.appended or ())]
+        for piece in pieces:
+            for start in range(0, len(piece), chunk_size):
+                yield piece[start:start + chunk_size]
     
-    def write_file(self, virtual_path, content, session_id=None):
-        # get the real path using the session-specific base directory
-        real_path = self.get_real_path(virtual_path, session_id)
-        
-        try:
-            os.makedirs(os.path.dirname(real_path), exist_ok=True)
-            with open(real_path, 'w') as f:
-                f.write(content)
-            
-            # update the session filesystem data
-            if session_id in self.session_filesystems:
-                # update the filesystem data structure
-                if virtual_path.startswith('/'):
-                    path_parts = virtual_path.strip('/').split('/')
-                else:
-                    path_parts = virtual_path.split('/')
-                
-                current = self.session_filesystems[session_id]
-                # navigate to the parent directory
-                for part in path_parts[:-1]:
-                    if part:
-                        if part not in current:
-                            current[part] = {}
-                        current = current[part]
-                
-                # set the file content
-                if path_parts[-1]:
-                    current[path_parts[-1]] = content
-            
+    def write_file(self, virtual_path, content, session_id=None, capture=True):
+        """Create or overwrite a file, False on failure. Raises ENOSPC over the session quota.
+        capture=False skips the capture store, for content that came unchanged from the base image"""
+        layer = self._layer(session_id)
+        path = normalize_path(virtual_path)
+        if path in GENERATED_FILES and self._lookup(path, layer) is self.base_index.get(path):
+            return self._write_generated(path)
+        # a character is at most 4 bytes in utf-8, shorter content is never encoded just for this check
+        if len(content) > MAX_FILE_SIZE // 4 and len(content.encode('utf-8')) > MAX_FILE_SIZE:
+            raise _no_space(virtual_path)
+
+        parent = self._make_parents(path, layer)
+        if parent is None:
+            logger.error(f"Error writing to file {virtual_path}: parent is not a directory")
+            return False
+        node = self._lookup(path, layer)
+        if node is not None and node.is_dir:
+            logger.error(f"Error writing to file {virtual_path}: is a directory")
+            return False
+
+        if node is None:
+            node = Inode(posixpath.basename(path), parent, content=content)
+        else:
+            # an overwrite keeps the file's ownership and permissions
+            node = Inode(node.name, parent, content=content, mode=node.mode, owner=node.owner, group=node.group)
+        self._link(path, node, layer)
+        layer.unsaved.discard(path)
+
+        if capture and session_id is not None and content:
+            # hashing, compression and the disk write happen on the reclaimer thread
+            get_reclaimer().capture(self.captures, session_id, path, content)
+        return True
+
+    def is_base_file(self, virtual_path, session_id=None):
+        """True when the session sees the base image file at a path, unchanged"""
+        path = normalize_path(virtual_path)
+        node = self._lookup(path, self._layer(session_id))
+        return node is not None and node is self.base_index.get(path)
+
+    def _write_generated(self, path):
+        """Devices swallow writes, generated kernel files are read-only"""
+        if stat.S_ISCHR(GENERATED_FILES[path][0]):
             return True
-        except Exception as e:
-            logger.error(f"Error writing to file {virtual_path}: {e}")
+        logger.info(f"Refused write to generated file {path}")
+        return False
+
+    def append_file(self, virtual_path, content, session_id=None, separator=""):
+        """Append a chunk to a file, creating it if needed, without rewriting what it already holds.
+        separator is put between existing content that does not end with it and the new content.
+        False on failure, raises ENOSPC over the session quota or the file size limit"""
+        layer = self._layer(session_id)
+        path = normalize_path(virtual_path)
+        node = self._lookup(path, layer)
+        if node is None:
+            return self.write_file(virtual_path, content, session_id)
+        if node.is_dir:
+            logger.error(f"Error appending to file {virtual_path}: is a directory")
             return False
+        if path in GENERATED_FILES and node is self.base_index.get(path):
+            return self._write_generated(path)
+
+        if path not in layer.entries:
+            # the base node is shared, the session appends to its own copy
+            node = Inode(node.name, node.parent, content=self._content(path, node), mode=node.mode,
+                         owner=node.owner, group=node.group)
+            self._link(path, node, layer)
+        last = node.appended[-1] if node.appended else node.content
+        if separator and last and not last.endswith(separator):
+            content = separator + content
+        added = len(content.encode('utf-8'))
+        if node.size + added > MAX_FILE_SIZE:
+            raise _no_space(virtual_path)
+        self._charge(layer, path, added, 0)
+
+        # small appends are merged into the last chunk, no append copies more than one chunk
+        if not node.appended:
+            node.appended = [content]
+        elif len(node.appended[-1]) < FILE_CHUNK_SIZE:
+            node.appended[-1] += content
+        else:
+            node.appended.append(content)
+        node.size += added
+        node.mtime = node.ctime = time.time()
+        if session_id is not None:
+            # stored once the file is complete, hashing it on every append would be quadratic
+            layer.unsaved.add(path)
+        return True
+
+    def touch_file(self, virtual_path, session_id=None):
+        """Create an empty file or update the timestamps of an existing one, False on failure.
+        Raises ENOSPC over the session quota"""
+        layer = self._layer(session_id)
+        path = normalize_path(virtual_path)
+        node = self._lookup(path, layer)
+
+        if node is None:
+            return self.write_file(virtual_path, "", session_id)
+        if path in layer.entries:
+            node.mtime = node.atime = node.ctime = time.time()
+        elif node.is_dir:
+            # base directories are shared, their timestamp is kept in the layer
+            layer.touched[path] = time.time()
+        else:
+            # the base node is shared, the session gets its own copy with fresh timestamps
+            own = Inode(node.name, node.parent, content=self._content(path, node), mode=node.mode,
+                        owner=node.owner, group=node.group)
+            self._link(path, own, layer)
+        return True
     
     def create_directory(self, virtual_path, session_id=None):
-        # get the real path using the session-specific base directory
-        real_path = self.get_real_path(virtual_path, session_id)
-        
-        if os.path.exists(real_path):
+        layer = self._layer(session_id)
+        path = normalize_path(virtual_path)
+
+        if self._lookup(path, layer) is not None:
             return f"mkdir: cannot create directory '{virtual_path}': File exists"
-        
         try:
-            os.makedirs(real_path)
-            
-            # update the session filesystem data
-            if session_id in self.session_filesystems:
-                # update the filesystem data structure
-                if virtual_path.startswith('/'):
-                    path_parts = virtual_path.strip('/').split('/')
-                else:
-                    path_parts = virtual_path.split('/')
-                
-                current = self.session_filesystems[session_id]
-                # navigate and create directories as needed
-                for part in path_parts:
-                    if part:
-                        if part not in current:
-                            current[part] = {}
-                        current = current[part]
-            
-            return ""  # success, no output
-        except Exception as e:
-            logger.error(f"Error creating directory {virtual_path}: {e}")
-            return f"mkdir: cannot create directory '{virtual_path}': {str(e)}"
+            parent = self._make_parents(path, layer)
+            if parent is None:
+                return f"mkdir: cannot create directory '{virtual_path}': Not a directory"
+            self._link(path, Inode(posixpath.basename(path), parent, children={}), layer)
+        except OSError as e:
+            return f"mkdir: cannot create directory '{virtual_path}': {e.strerror}"
+        return ""  # success, no output
     
     def remove_file(self, virtual_path, session_id=None, recursive=False):
         """Remove a file or directory, with support for recursive directory removal"""
-        # get the real path using the session-specific base directory
-        real_path = self.get_real_path(virtual_path, session_id)
-        
-        if not os.path.exists(real_path):
+        layer = self._layer(session_id)
+        path = normalize_path(virtual_path)
+        node = self._lookup(path, layer)
+
+        if node is None:
             return f"cannot remove '{virtual_path}': No such file or directory"
-        
-        try:
-            if os.path.isdir(real_path):
-                # check if directory is empty
-                if len(os.listdir(real_path)) > 0:
-                    if not recursive:
-                        return f"cannot remove '{virtual_path}': Is a directory"
-                    else:
-                        # recursively remove directory and all contents
-                        shutil.rmtree(real_path)
-                else:
-                    # empty directory
-                    os.rmdir(real_path)
-            else:
-                # regular file
-                os.remove(real_path)
-            
-            # update the session filesystem data structure
-            if session_id in self.session_filesystems:
-                # update the filesystem data structure
-                if virtual_path.startswith('/'):
-                    path_parts = virtual_path.strip('/').split('/')
-                else:
-                    path_parts = virtual_path.split('/')
-                
-                if not path_parts:
-                    return ""
-                
-                # navigate to the parent directory in our data structure
-                current = self.session_filesystems[session_id]
-                parent = current
-                for i, part in enumerate(path_parts[:-1]):
-                    if part and part in parent:
-                        parent = parent[part]
-                    else:
-                        # path doesn't exist in our data structure
-                        return ""
-                
-                # remove the file or directory from the data structure
-                if path_parts[-1] in parent:
-                    del parent[path_parts[-1]]
-            
-            return ""  # success, no output
-        except PermissionError:
+        if path == "/":
             return f"cannot remove '{virtual_path}': Permission denied"
-        except IsADirectoryError:
+        if node.is_dir and not recursive and self._children(path, node, layer):
             return f"cannot remove '{virtual_path}': Is a directory"
-        except Exception as e:
-            logger.error(f"Error removing {virtual_path}: {e}")
-            return f"cannot remove '{virtual_path}': {str(e)}"
+
+        self._discard(path, layer, session_id)
+        return ""  # success, no output
     
     def file_exists(self, virtual_path, session_id=None):
-        # get the real path using the session-specific base directory
-        real_path = self.get_real_path(virtual_path, session_id)
-        return os.path.exists(real_path)
+        return self._lookup(normalize_path(virtual_path), self._layer(session_id)) is not None
     
     def is_directory(self, virtual_path, session_id=None):
-        # get the real path using the session-specific base directory
-        real_path = self.get_real_path(virtual_path, session_id)
-        return os.path.isdir(real_path)
-    
-    def _verify_filesystem_integrity(self):
-        self._verify_directory_integrity("", self.fs_data)
-    
-    def _verify_directory_integrity(self, current_path, directory_dict):
-        for name, content in directory_dict.items():
-            path = os.path.join(current_path, name)
-            real_path = os.path.join(self.base_dir, path)
-            
-            if isinstance(content, dict):
-                # this is a directory
-                if not os.path.exists(real_path):
-                    os.makedirs(real_path, exist_ok=True)
-                    logger.info(f"Created missing directory: {path}")
-                self._verify_directory_integrity(path, content)
-            else:
-                # this is a file
-                if not os.path.exists(real_path):
-                    dir_path = os.path.dirname(real_path)
-                    os.makedirs(dir_path, exist_ok=True)
-                    with open(real_path, 'w') as f:
-                        f.write(content)
-                    logger.info(f"Created missing file: {path}")
+        node = self._lookup(normalize_path(virtual_path), self._layer(session_id))
+        return node is not None and node.is_dir
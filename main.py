@@ -1,16 +1,25 @@
 """
 Main file for SSH honeypot
 """
-import sys, signal, threading, os, subprocess
-from config import HOST, PORT, USERNAME, PASSWORD, FILESYSTEM_DIR, AI_ENABLED, AI_MODE, RAG_MODEL, RAG_OLLAMA_URL, FRONTEND_DIR, FRONTEND_HOST, FRONTEND_PORT
+import sys, signal, threading, os, subprocess, multiprocessing
+from config import HOST, PORT, USERNAME, PASSWORD, FILESYSTEM_DIR, AI_ENABLED, AI_MODE, RAG_MODEL, RAG_OLLAMA_URL, FRONTEND_DIR, FRONTEND_HOST, FRONTEND_PORT, SERVER_MODE, SERVER_WORKERS
 from utils.log_setup import logger
-from core.database import init_db
+from core.database import init_db, configure_shared_writer, create_session_counter, run_shared_writer, flush_buffered_writes
 from core.virtual_filesystem import VirtualFilesystem
 from core.command_processor import CommandProcessor
 from core.server import start_server, stop_event
+from core.reclaimer import get_reclaimer
 from utils.utils import get_local_ip, generate_host_key, format_connection_info
 from rag.ai_integration import integrate_ai_with_command_processor, check_ollama_availability
 
+# worker processes and the shared database writer when running in supervisor mode
+supervisor = {
+    "workers": [],
+    "write_queue": None,
+    "writer_thread": None,
+    "stopping": False
+}
+
 def start_db_exporter():
     """Starting the database to JSON exporter as a subprocess"""
     try:
@@ -69,6 +78,14 @@ def signal_handler(signum, frame):
     """Handle interrupt signals to gracefully shut down the server"""
     print("\n[*] Received shutdown signal. Cleaning up...")
     
+    # stop worker processes and flush their queued writes before touching the database
+    if supervisor["workers"]:
+        stop_workers()
+    else:
+        # sessions still waiting for teardown, then auth attempts still waiting for their batch
+        get_reclaimer().stop()
+        flush_buffered_writes()
+    
     # close all active sessions
     try:
         from core.database import get_db_connection
@@ -126,6 +143,89 @@ def start_frontend_server(frontend_dir, port):
     
     return server_thread
 
+def get_server_target():
+    """Pick the connection handling front end from the configuration"""
+    if SERVER_MODE == "async":
+        from core.async_server import start_async_server
+        return start_async_server
+    return start_server
+
+def run_worker(worker_id, command_processor, host_key, write_queue, session_counter):
+    """Entry point of a forked listener process"""
+    # the supervisor owns shutdown, a worker only stops accepting and exits
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    
+    # all database writes go through the supervisor's single writer
+    configure_shared_writer(write_queue, session_counter)
+    
+    # AI clients hold sockets and threads, so they are created after the fork
+    if AI_ENABLED:
+        command_processor = integrate_ai_with_command_processor(command_processor)
+    
+    logger.info(f"Worker {worker_id} (pid {os.getpid()}) listening on {HOST}:{PORT}")
+    try:
+        get_server_target()(HOST, PORT, command_processor, host_key, True)
+    finally:
+        # hand session end times and queued writes to the shared writer before exiting
+        get_reclaimer().stop()
+        flush_buffered_writes()
+
+def start_worker(context, worker_id, command_processor, host_key, session_counter):
+    """Fork a single listener process"""
+    process = context.Process(
+        target=run_worker,
+        args=(worker_id, command_processor, host_key, supervisor["write_queue"], session_counter),
+        name=f"honeypot-worker-{worker_id}"
+    )
+    process.daemon = True
+    process.start()
+    return process
+
+def stop_workers():
+    """Terminate worker processes and drain the shared writer"""
+    supervisor["stopping"] = True
+    for process in supervisor["workers"]:
+        if process.is_alive():
+            process.terminate()
+    for process in supervisor["workers"]:
+        process.join(5)
+    supervisor["workers"] = []
+    
+    # the sentinel makes the writer commit what is left and exit
+    if supervisor["writer_thread"]:
+        supervisor["write_queue"].put(None)
+        supervisor["writer_thread"].join(10)
+        supervisor["writer_thread"] = None
+
+def run_supervisor(command_processor, host_key):
+    """Fork SERVER_WORKERS listener processes sharing the port with SO_REUSEPORT"""
+    print(f"[*] Starting {SERVER_WORKERS} worker processes on port {PORT}...")
+    context = multiprocessing.get_context("fork")
+    
+    # one writer in this process keeps the SQLite database consistent
+    supervisor["write_queue"] = context.Queue()
+    session_counter = create_session_counter(context)
+    writer_thread = threading.Thread(target=run_shared_writer, args=(supervisor["write_queue"],))
+    writer_thread.daemon = True
+    writer_thread.start()
+    supervisor["writer_thread"] = writer_thread
+    
+    # each worker gets its own copy of the command processor and filesystem
+    for worker_id in range(SERVER_WORKERS):
+        supervisor["workers"].append(start_worker(context, worker_id, command_processor, host_key, session_counter))
+    
+    # restart workers that die unexpectedly
+    try:
+        while not supervisor["stopping"]:
+            for worker_id, process in enumerate(supervisor["workers"]):
+                process.join(1.0 / SERVER_WORKERS)
+                if not process.is_alive() and not supervisor["stopping"]:
+                    logger.error(f"Worker {worker_id} exited with code {process.exitcode}, restarting")
+                    supervisor["workers"][worker_id] = start_worker(context, worker_id, command_processor, host_key, session_counter)
+    except KeyboardInterrupt:
+        signal_handler(None, None)
+
 def main():
     # register signal handlers
     signal.signal(signal.SIGINT, signal_handler)
@@ -145,10 +245,19 @@ def main():
     # initialize virtual filesystem
     print("[*] Initializing virtual filesystem...")
     filesystem = VirtualFilesystem(FILESYSTEM_DIR)
+    # session directories of older versions are removed in the background
+    get_reclaimer().sweep(FILESYSTEM_DIR)
     
     # initialize command processor
     command_processor = CommandProcessor(filesystem)
 
+    # in supervisor mode each worker process sets up AI and its own listener
+    if SERVER_WORKERS > 1:
+        local_ip = get_local_ip()
+        print(format_connection_info(USERNAME, local_ip, PORT, PASSWORD))
+        run_supervisor(command_processor, host_key)
+        return
+
     # initialize AI integration if enabled
     if AI_ENABLED:
         print(f"[*] Initializing AI capabilities in {AI_MODE} mode...")
@@ -161,9 +270,13 @@ def main():
     local_ip = get_local_ip()
     print(format_connection_info(USERNAME, local_ip, PORT, PASSWORD))
     
-    # start the server
+    # start the server, either thread per connection or on an event loop
+    server_target = get_server_target()
+    if SERVER_MODE == "async":
+        print("[*] Using event-loop connection handling")
+
     server_thread = threading.Thread(
-        target=start_server,
+        target=server_target,
         args=(HOST, PORT, command_processor, host_key)
     )
     server_thread.daemon = True
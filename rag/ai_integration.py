@@ -121,7 +121,7 @@ def integrate_ai_with_command_processor(command_processor):
                     return original_process(session_id, command)
             
             # enhance the execute_command method for streaming
-            def enhanced_execute_command(session_id, command, token_callback=None):
+            def enhanced_execute_command(session_id, command, token_callback=None, cancel_token=None):
                 # split command and arguments
                 parts = command.split()
                 if not parts:
@@ -137,7 +137,7 @@ def integrate_ai_with_command_processor(command_processor):
                         return original_execute(session_id, command)
                     else:
                         # this is a recognized but not natively implemented command - use AI
-                        return direct_inference.process_command(session_id, command, token_callback)
+                        return direct_inference.process_command(session_id, command, token_callback, cancel_token)
                 else:
                     # not a recognized command - use original (which will show command not found)
                     return original_execute(session_id, command)
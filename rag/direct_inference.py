@@ -6,8 +6,9 @@ import json
 import time
 from utils.log_setup import logger
 from utils.command_utils import NATIVE_COMMANDS
+from core import telemetry
 from config import RAG_OLLAMA_URL, RAG_MODEL, RAG_TOKEN_DELAY, RAG_STREAM_OUTPUT
-from core.server import active_command
+from rag.output_sanitizer import MarkdownSanitizer, sanitize_output
 
 class DirectOllamaInference:
     
@@ -46,7 +47,8 @@ class DirectOllamaInference:
             result = cmd not in self.known_commands
         return result
         
-    def process_command(self, session_id, command, token_callback=None):
+    def process_command(self, session_id, command, token_callback=None, cancel_token=None):
+        telemetry.mark_handler(telemetry.DIRECT)
         # Maintain minimal session context
         if session_id not in self.active_sessions:
             self.active_sessions[session_id] = []
@@ -54,9 +56,9 @@ class DirectOllamaInference:
         try:
             # Handle streaming vs non-streaming mode based on config
             if RAG_STREAM_OUTPUT and token_callback:
-                return self._stream_response(command, token_callback)
+                return self._stream_response(command, token_callback, cancel_token)
             else:
-                return self._generate_response(command)
+                return sanitize_output(command, self._generate_response(command))
                 
         except Exception as e:
             logger.error(f"Error in direct inference: {e}")
@@ -76,12 +78,13 @@ class DirectOllamaInference:
             response = requests.post(self.api_url, json=request_data, timeout=3000)
             response.raise_for_status()
             result = response.json()
+            telemetry.count_tokens(result.get("eval_count", 0))
             return result.get("response", "")
         except requests.exceptions.RequestException as e:
             logger.error(f"Ollama API error: {e}")
             return f"Error: Could not connect to Ollama API: {str(e)}"
     
-    def _stream_response(self, command, token_callback):
+    def _stream_response(self, command, token_callback, cancel_token=None):
         request_data = {
             "model": self.model,
             "prompt": command,
@@ -91,41 +94,76 @@ class DirectOllamaInference:
             }
         }
         
+        full_response = ""
+        # markdown is stripped as tokens arrive, so the client sees exactly what is returned
+        sanitizer = MarkdownSanitizer(command)
         try:
             with requests.post(self.api_url, json=request_data, timeout=3000, stream=True) as response:
                 response.raise_for_status()
                 
-                # process the streaming response
-                full_response = ""
-                for line in response.iter_lines():
-                    # Add interruption check here
-                    if active_command.get("interrupted", False):
-                        logger.info(f"Direct inference streaming interrupted by user")
-                        response.close()  # Important: Close the HTTP connection
-                        break
-                        
-                    if line:
-                        # decode and parse the JSON line
-                        line_data = json.loads(line.decode('utf-8'))
-                        if 'response' in line_data:
-                            token = line_data['response']
-                            full_response += token
-                            
-                            # call the token callback
-                            token_callback(token)
+                # closing the HTTP connection on cancel makes Ollama stop generating straight away
+                unregister = cancel_token.on_cancel(lambda: self._abort_stream(response)) if cancel_token else None
+                
+                try:
+                    # process the streaming response
+                    for line in response.iter_lines():
+                        if cancel_token is not None and cancel_token.cancelled:
+                            logger.info(f"Direct inference streaming interrupted by user")
+                            break
                             
-                            # apply token delay if configured
-                            if RAG_TOKEN_DELAY > 0:
-                                time.sleep(RAG_TOKEN_DELAY)
+                        if line:
+                            # decode and parse the JSON line
+                            line_data = json.loads(line.decode('utf-8'))
+                            if 'response' in line_data:
+                                # ollama streams one token per line
+                                telemetry.count_tokens()
+                                token = sanitizer.feed(line_data['response'])
+                                if token:
+                                    full_response += token
+                                    
+                                    # call the token callback
+                                    token_callback(token)
+                                
+                                # apply token delay if configured
+                                if RAG_TOKEN_DELAY > 0:
+                                    time.sleep(RAG_TOKEN_DELAY)
+                finally:
+                    if unregister:
+                        unregister()
+                
+                # send whatever the sanitizer was still holding back
+                tail = sanitizer.close()
+                if tail and not (cancel_token is not None and cancel_token.cancelled):
+                    full_response += tail
+                    token_callback(tail)
                 
                 return full_response
-        except requests.exceptions.RequestException as e:
+        except Exception as e:
+            # reading from a stream closed by cancellation raises, that is expected
+            if cancel_token is not None and cancel_token.cancelled:
+                logger.info(f"Direct inference stream closed after interrupt")
+                return full_response
+            if not isinstance(e, requests.exceptions.RequestException):
+                raise
             logger.error(f"Ollama streaming API error: {e}")
             error_message = f"Error: Could not connect to Ollama API: {str(e)}"
             if token_callback:
                 token_callback(error_message)
             return error_message
             
+    @staticmethod
+    def _abort_stream(response):
+        """Close a streaming response from another thread"""
+        # close() alone doesn't wake a thread blocked in recv, urllib3 2.3+ has a public
+        # shutdown() for that, older versions only stop once the next chunk arrives
+        try:
+            shutdown = getattr(response.raw, "shutdown", None)
+            if shutdown is not None:
+                shutdown()
+            response.close()
+        except Exception:
+            pass
+        
     def cleanup_session(self, session_id):
         """Clean up session data"""
         if session_id in self.active_sessions:
@@ -28,8 +28,9 @@ from config import RAG_OLLAMA_URL, RAG_COMMANDS_FILE, RAG_STREAM_OUTPUT, RAG_TOK
 
 # honeypot imports
 from utils.log_setup import logger
-from core.server import active_command
 from utils.command_utils import NATIVE_COMMANDS
+from rag.output_sanitizer import MarkdownSanitizer, sanitize_output
+from core import telemetry
 
 # file paths
 DOCS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
@@ -216,7 +217,7 @@ class LlamaIndexRAG:
             del self.session_memories[session_id]
             logger.info(f"Cleaned up memory for session {session_id}")
     
-    def generate_response(self, session_id, command_input, token_callback=None):
+    def generate_response(self, session_id, command_input, token_callback=None, cancel_token=None):
         """generate a response for a command using rag with optimized handling"""
         if not self.initialized or not self.index:
             logger.error("RAG not initialized or index not available")
@@ -233,6 +234,7 @@ class LlamaIndexRAG:
         # check if response is in cache and not expired
         if cache_key in self.response_cache and current_time - self.cache_timestamps.get(cache_key, 0) < self.cache_ttl:
             logger.info(f"Using cached response for: '{command_input}'")
+            telemetry.mark_handler(telemetry.CACHE)
             cached_response = self.response_cache[cache_key]
             
             # for streaming, simulate streaming from cache
@@ -240,7 +242,7 @@ class LlamaIndexRAG:
                 # Always stream by lines to preserve exact formatting
                 for line in cached_response.split('\n'):
                     # check for interruption
-                    if active_command.get("interrupted", False) and active_command.get("session_id") == session_id:
+                    if cancel_token is not None and cancel_token.cancelled:
                         logger.info(f"Interrupting cached response streaming for session {session_id}")
                         break
                     # Send complete line with newline to preserve exact formatting
@@ -291,20 +293,41 @@ class LlamaIndexRAG:
                     # get streaming response
                     stream_response = query_engine.query(command_input)
                     
-                    # process tokens as they arrive - simpler streaming like notebook
+                    # process tokens as they arrive, cleaned on the fly so the streamed
+                    # text is exactly what ends up in the cache
                     full_response = ""
-                    for token in stream_response.response_gen:
-                        # check for interruption
-                        if active_command.get("interrupted", False) and active_command.get("session_id") == session_id:
-                            logger.info(f"interrupting response streaming for session {session_id}")
-                            break
+                    sanitizer = MarkdownSanitizer(command_input)
+                    response_gen = stream_response.response_gen
+                    try:
+                        for token in response_gen:
+                            # check for interruption
+                            if cancel_token is not None and cancel_token.cancelled:
+                                logger.info(f"interrupting response streaming for session {session_id}")
+                                break
+                                
+                            telemetry.count_tokens()
+                            token = sanitizer.feed(token)
+                            if not token:
+                                continue
+                            full_response += token
+                            token_callback(token)
                             
-                        full_response += token
-                        token_callback(token)
-                        
-                        # token delay if configured
-                        if RAG_TOKEN_DELAY > 0:
-                            time.sleep(RAG_TOKEN_DELAY)
+                            # token delay if configured
+                            if RAG_TOKEN_DELAY > 0:
+                                time.sleep(RAG_TOKEN_DELAY)
+                    finally:
+                        # closing the generator unwinds the ollama client's HTTP stream
+                        response_gen.close()
+                    
+                    # an interrupted response is partial, don't cache it
+                    if cancel_token is not None and cancel_token.cancelled:
+                        return full_response
+                    
+                    # send whatever the sanitizer was still holding back
+                    tail = sanitizer.close()
+                    if tail:
+                        full_response += tail
+                        token_callback(tail)
                             
                     logger.info(f"streaming complete for: '{command_input}'")
                         
@@ -316,14 +339,11 @@ class LlamaIndexRAG:
                 logger.info(f"Using non-streaming mode for command: '{command_input}'")
                 try:
                     response = query_engine.chat(command_input)
-                    full_response = response.response
+                    full_response = self.clean_command_output(command_input, response.response)
                 except Exception as e:
                     logger.error(f"Error in non-streaming mode: {e}")
                     full_response = f"Error executing command: {str(e)}"
             
-            # clean the response
-            full_response = self.clean_command_output(command_input, full_response)
-            
             # cache the response if it's not an error and not too long
             if not full_response.startswith("Error") and len(full_response) < 10000:
                 self.response_cache[cache_key] = full_response
@@ -345,52 +365,6 @@ class LlamaIndexRAG:
             return f"Error executing command: {str(e)}"
 
     def clean_command_output(self, command_input, response_text):
-        """enhanced cleaning of command output to remove markdown and explanatory elements"""
-        import re
-        
-        # extract command for context-aware cleaning
-        cmd = command_input.split()[0].lower() if command_input else ""
-        
-        # 1. remove markdown code block markers more aggressively
-        response_text = re.sub(r'```(?:bash|shell|console|terminal)?', '', response_text)
-        response_text = re.sub(r'```', '', response_text)
-        
-        # 2. remove instruction/explanation paragraphs (often start with "here's", "this is", etc.)
-        response_text = re.sub(r'^(?:here\'s|this is|the following|i\'ll|let me|this command|when you).+?:\n', '', response_text, flags=re.MULTILINE|re.IGNORECASE)
-        
-        # 3. remove explanatory lines at the end (common in rag responses)
-        response_text = re.sub(r'\n(?:this shows|this displays|this lists|this command).+$', '', response_text, flags=re.MULTILINE|re.IGNORECASE)
-        
-        # 4. remove bold/italic markdown more thoroughly
-        response_text = re.sub(r'\*\*(.*?)\*\*', r'\1', response_text)  # bold
-        response_text = re.sub(r'\*(.*?)\*', r'\1', response_text)      # italic
-        response_text = re.sub(r'__(.*?)__', r'\1', response_text)      # alternative bold
-        response_text = re.sub(r'_(.*?)_', r'\1', response_text)        # alternative italic
-        
-        # 5. better handling of command line prompts
-        response_text = re.sub(r'^.+?@.+?:~[$#]\s*', '', response_text, flags=re.MULTILINE)
-        
-        # 6. remove markdown headers
-        response_text = re.sub(r'^#+\s+.*$', '', response_text, flags=re.MULTILINE)
-        
-        # 7. remove numbered lists and bullet points
-        response_text = re.sub(r'^\s*\d+\.\s+', '', response_text, flags=re.MULTILINE)
-        response_text = re.sub(r'^\s*[\*\-•]\s+', '', response_text, flags=re.MULTILINE)
-        
-        # 8. command-specific cleaning
-        if cmd in ['ls', 'dir']:
-            # for ls, prefer columnar format without additional text
-            response_text = re.sub(r'total \d+\s*\n', '', response_text)
-        elif cmd in ['cat', 'less', 'more']:
-            # for file viewing commands, remove any leading spaces on new lines
-            response_text = re.sub(r'\n\s+', '\n', response_text)
-        elif cmd in ['grep', 'find']:
-            # for search commands, ensure results are properly formatted
-            # remove any "matches found" summary lines
-            response_text = re.sub(r'\n\d+ matches found\.?$', '', response_text, flags=re.IGNORECASE)
-        
-        # 9. clean up whitespace
-        response_text = re.sub(r'\n{3,}', '\n\n', response_text)  # max double newlines
-        response_text = response_text.strip()
-        
-        return response_text
+        """remove markdown and explanatory elements from a complete response"""
+        # same rules as the streaming path, see rag/output_sanitizer.py
+        return sanitize_output(command_input, response_text)
@@ -0,0 +1,201 @@
+"""
+Streaming cleanup of model output for the AI backends.
+Strips markdown and explanatory chatter from tokens as they arrive, so the text
+streamed to the client is exactly the text that gets cached.
+"""
+import re
+
+# markers that are removed wherever they appear
+INLINE_STRIP = "*"
+FENCE = "```"
+
+# line prefixes that are stripped, the rest of the line is kept
+PREFIX_PATTERNS = [
+    re.compile(r"\s*\d+\.\s+"),                 # numbered list
+    re.compile(r"\s*[*\-•]\s+"),                # bullet points
+    re.compile(r"[^\s@]+@[^\s:]+:~[$#]\s*"),    # shell prompt echoed by the model
+]
+
+# prefixes that could still grow into one of the patterns above (or a header / fence),
+# a line is held back while its start matches one of these
+PENDING_PATTERNS = [
+    re.compile(r"\s*(\d+(\.\s*)?)?"),
+    re.compile(r"\s*([*\-•]\s*)?"),
+    re.compile(r"[^\s@]*(@[^\s:]*(:(~([$#])?)?)?)?"),
+    re.compile(r"#*"),
+    re.compile(r"\s*`{0,3}[a-z]*"),
+]
+
+# lines that are dropped entirely
+HEADER = re.compile(r"#+\s")
+FENCE_LINE = re.compile(r"\s*```(?:bash|shell|console|terminal|sh)?\s*")
+INTRO_PHRASES = ("here's", "this is", "the following", "i'll", "let me", "this command", "when you")
+OUTRO_PHRASES = ("this shows", "this displays", "this lists", "this command")
+EXPLANATION_INTRO = re.compile(r"(?:here's|this is|the following|i'll|let me|this command|when you).+?:\s*", re.IGNORECASE)
+EXPLANATION_OUTRO = re.compile(r"(?:this shows|this displays|this lists|this command).+", re.IGNORECASE)
+
+# command specific lines that are dropped: (line pattern, prefix that may still grow into it)
+TOTAL_LINE = (re.compile(r"total \d+\s*"), re.compile(r"(?:t|to|tot|tota|total)|total .*"))
+MATCHES_LINE = (re.compile(r"\d+ matches found\.?", re.IGNORECASE), re.compile(r"\d+(?: .*)?"))
+COMMAND_LINE_DROPS = {
+    "ls": TOTAL_LINE,
+    "dir": TOTAL_LINE,
+    "grep": MATCHES_LINE,
+    "find": MATCHES_LINE,
+}
+# commands whose output loses indentation and blank lines
+UNINDENT_COMMANDS = ("cat", "less", "more")
+
+BLANK_RUN = re.compile(r"\n{3,}")
+
+
+class MarkdownSanitizer:
+    """
+    Incremental cleaner for one model response.
+    feed() takes raw tokens and returns the text that is safe to show so far,
+    close() returns whatever was still held back. Only the start of the current
+    line and trailing whitespace are held back, the rest streams straight through.
+    """
+    def __init__(self, command_input=""):
+        cmd = command_input.split()[0].lower() if command_input and command_input.split() else ""
+        self.line_drop = COMMAND_LINE_DROPS.get(cmd)
+        self.unindent = cmd in UNINDENT_COMMANDS
+
+        self.line = ""          # held start of the current line
+        self.decided = False    # current line is streaming through
+        self.dropping = False   # current line is being discarded
+        self.backticks = 0      # run of backticks not yet known to be a fence
+        self.started = False    # leading whitespace of the response is dropped
+        self.pending_ws = ""    # trailing whitespace, only sent once more text follows
+        self.out = []
+
+    def feed(self, text):
+        """Consume a raw token, return the cleaned text that can be sent now"""
+        for char in text:
+            if char == "\n":
+                self._end_line()
+            elif self.dropping:
+                continue
+            elif self.decided:
+                self._inline(char)
+            else:
+                self.line += char
+                self._classify(complete=False)
+
+        out = "".join(self.out)
+        self.out = []
+        return out
+
+    def close(self):
+        """Flush the held-back tail at the end of the response"""
+        if not self.dropping and not self.decided and self.line:
+            self._classify(complete=True)
+        self._flush_backticks()
+        # trailing whitespace of the response is dropped
+        self.pending_ws = ""
+
+        out = "".join(self.out)
+        self.out = []
+        return out
+
+    def _classify(self, complete):
+        """Decide what to do with the held start of the line once it is unambiguous"""
+        line = self.line
+
+        # explanations and command specific lines can only be judged as a whole
+        if not complete and self._needs_whole_line(line):
+            return
+        if complete and self._is_noise_line(line):
+            self._drop_line()
+            return
+
+        if HEADER.match(line):
+            self._drop_line()
+            return
+
+        if not complete and any(pattern.fullmatch(line) for pattern in PENDING_PATTERNS):
+            return
+
+        # the line is ordinary text, strip a list marker or prompt and stream the rest
+        for pattern in PREFIX_PATTERNS:
+            match = pattern.match(line)
+            if match:
+                line = line[match.end():]
+                break
+
+        if self.unindent:
+            line = line.lstrip()
+
+        self.line = ""
+        self.decided = True
+        for char in line:
+            self._inline(char)
+
+    def _needs_whole_line(self, line):
+        lowered = line.lower()
+        for phrase in INTRO_PHRASES + OUTRO_PHRASES:
+            if lowered.startswith(phrase) or phrase.startswith(lowered):
+                return True
+        return self.line_drop is not None and bool(self.line_drop[1].fullmatch(line))
+
+    def _is_noise_line(self, line):
+        if FENCE_LINE.fullmatch(line) or EXPLANATION_INTRO.fullmatch(line) or EXPLANATION_OUTRO.fullmatch(line):
+            return True
+        return self.line_drop is not None and bool(self.line_drop[0].fullmatch(line))
+
+    def _drop_line(self):
+        self.line = ""
+        self.dropping = True
+
+    def _end_line(self):
+        """Handle a newline, finishing whatever the current line turned out to be"""
+        if not self.decided and not self.dropping and self.line:
+            self._classify(complete=True)
+        self._flush_backticks()
+
+        dropped = self.dropping
+        self.line = ""
+        self.decided = False
+        self.dropping = False
+
+        # a dropped line takes its newline with it, blank lines go away for unindented output
+        if dropped or (self.unindent and self.pending_ws.endswith("\n")):
+            return
+        self._emit("\n")
+
+    def _inline(self, char):
+        """Strip inline markdown from a character of a line that is streaming through"""
+        if char == "`":
+            self.backticks += 1
+            return
+        self._flush_backticks()
+        if char in INLINE_STRIP:
+            return
+        self._emit(char)
+
+    def _flush_backticks(self):
+        # three or more in a row are a code fence and vanish, shorter runs are kept
+        if self.backticks:
+            if self.backticks < len(FENCE):
+                for char in "`" * self.backticks:
+                    self._emit(char)
+            self.backticks = 0
+
+    def _emit(self, char):
+        """Append output, holding whitespace back until something visible follows it"""
+        if char.isspace():
+            if self.started:
+                self.pending_ws += char
+            return
+
+        self.started = True
+        if self.pending_ws:
+            self.out.append(BLANK_RUN.sub("\n\n", self.pending_ws))
+            self.pending_ws = ""
+        self.out.append(char)
+
+
+def sanitize_output(command_input, response_text):
+    """Clean a complete response, gives the same result as streaming it through a sanitizer"""
+    sanitizer = MarkdownSanitizer(command_input)
+    return sanitizer.feed(response_text) + sanitizer.close()
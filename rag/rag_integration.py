@@ -6,8 +6,8 @@ import sys
 import types
 from utils.log_setup import logger
 from utils.command_utils import NATIVE_COMMANDS
+from core import telemetry
 from config import RAG_OLLAMA_URL, RAG_MODEL, RAG_COMMANDS_FILE, RAG_STREAM_OUTPUT
-from core.server import active_command
 
 # absolute paths
 DOCS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
@@ -79,7 +79,7 @@ class SmartRAGIntegration:
         except:
             return False
     
-    def generate_response(self, session_id, command_input, token_callback=None):
+    def generate_response(self, session_id, command_input, token_callback=None, cancel_token=None):
         """Generate a response using RAG, but only for non-native commands"""
         if not self.initialized or not self.rag:
             logger.warning("RAG not initialized, cannot generate response")
@@ -110,10 +110,10 @@ class SmartRAGIntegration:
                 logger.info(f"Enabled streaming for session {session_id}")
             
             # Check for interruption before making the RAG request
-            return self.rag.generate_response(session_id, command_input, token_callback)
+            return self.rag.generate_response(session_id, command_input, token_callback, cancel_token)
         except Exception as e:
             # Check if the exception was caused by an interruption
-            if active_command.get("interrupted", False) and active_command.get("session_id") == session_id:
+            if cancel_token is not None and cancel_token.cancelled:
                 logger.info(f"RAG request interrupted by user for session {session_id}")
                 return "^C"
             logger.error(f"Error generating RAG response: {e}")
@@ -157,7 +157,7 @@ def integrate_rag_with_command_processor(command_processor):
         original_cleanup = command_processor.cleanup_session
         
         # define the wrapper for execute_command
-        def execute_wrapper(self, session_id, command, token_callback=None):
+        def execute_wrapper(self, session_id, command, token_callback=None, cancel_token=None):
             try:
                 # handle empty commands
                 if not command or command.strip() == "":
@@ -176,7 +176,8 @@ def integrate_rag_with_command_processor(command_processor):
                 if hasattr(self, 'smart_rag') and self.smart_rag.initialized:
                     try:
                         logger.info(f"Attempting RAG for non-native command: {main_cmd}")
-                        rag_response = self.smart_rag.generate_response(session_id, command, token_callback)
+                        telemetry.mark_handler(telemetry.RAG)
+                        rag_response = self.smart_rag.generate_response(session_id, command, token_callback, cancel_token)
                         
                         # if RAG response is available, use it
                         if rag_response:
@@ -190,6 +191,7 @@ def integrate_rag_with_command_processor(command_processor):
                 
                 # if RAG fails or isn't available, fall back to original command execution
                 logger.info(f"Falling back to default handling for command: {main_cmd}")
+                telemetry.mark_handler(telemetry.NATIVE)
                 return original_execute(session_id, command)
             except Exception as e:
                 logger.error(f"Unhandled exception in execute_command: {e}")
@@ -209,8 +211,8 @@ def integrate_rag_with_command_processor(command_processor):
         
         # create a custom class that will replace the methods
         class PatchedCommandProcessor(type(command_processor)):
-            def execute_command(self, session_id, command, token_callback=None):
-                return execute_wrapper(self, session_id, command, token_callback)
+            def execute_command(self, session_id, command, token_callback=None, cancel_token=None):
+                return execute_wrapper(self, session_id, command, token_callback, cancel_token)
                 
             def cleanup_session(self, session_id):
                 return cleanup_wrapper(self, session_id)
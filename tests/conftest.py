@@ -0,0 +1,21 @@
+"""
+Shared fixtures, keeps the suite's database writes out of the repository
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from core import database
+
+
+@pytest.fixture(scope="session", autouse=True)
+def honeypot_db(tmp_path_factory):
+    """Point the database module at a fresh file for the whole run.
+    The writer thread keeps the connection it opened first, so this is session scoped"""
+    db_file = str(tmp_path_factory.mktemp("db") / "honeypot.db")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(database, "DB_FILE", db_file)
+        database.init_db()
+        yield db_file
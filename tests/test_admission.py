@@ -0,0 +1,85 @@
+"""
+Admission control before the SSH handshake
+"""
+import pytest
+from core import admission
+from core.admission import AdmissionController, ADMITTED, QUEUED, REJECTED
+
+
+class Client:
+    """Stands in for an accepted socket"""
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission, "time", clock)
+    return clock
+
+
+def test_per_ip_cap(clock):
+    controller = AdmissionController(max_sessions=10, max_per_ip=2, max_pending=5, pending_timeout=30)
+    clients = [Client() for _ in range(3)]
+    assert [controller.admit(client, ("10.0.0.1", 22)) for client in clients] == [ADMITTED, ADMITTED, REJECTED]
+    assert clients[2].closed and not clients[0].closed
+    # another address is not affected
+    assert controller.admit(Client(), ("10.0.0.2", 22)) == ADMITTED
+    # a released slot lets the first address in again
+    assert controller.release("10.0.0.1") is None
+    assert controller.admit(Client(), ("10.0.0.1", 22)) == ADMITTED
+    assert controller.snapshot()["rejected_per_ip"] == 1
+
+
+def test_global_cap_queues_then_rejects(clock):
+    controller = AdmissionController(max_sessions=2, max_per_ip=10, max_pending=1, pending_timeout=30)
+    decisions = [controller.admit(Client(), (f"10.0.0.{n}", 22)) for n in range(4)]
+    assert decisions == [ADMITTED, ADMITTED, QUEUED, REJECTED]
+    stats = controller.snapshot()
+    assert (stats["active"], stats["pending"], stats["rejected_global"]) == (2, 1, 1)
+
+
+def test_release_hands_slot_to_queued_connection(clock):
+    controller = AdmissionController(max_sessions=1, max_per_ip=10, max_pending=2, pending_timeout=30)
+    controller.admit(Client(), ("10.0.0.1", 22))
+    queued = Client()
+    assert controller.admit(queued, ("10.0.0.2", 22)) == QUEUED
+    assert controller.release("10.0.0.1") == (queued, ("10.0.0.2", 22))
+    stats = controller.snapshot()
+    assert (stats["active"], stats["pending"]) == (1, 0)
+    assert controller.per_ip == {"10.0.0.2": 1}
+
+
+def test_stale_queued_connections_expire(clock):
+    controller = AdmissionController(max_sessions=1, max_per_ip=10, max_pending=2, pending_timeout=30)
+    controller.admit(Client(), ("10.0.0.1", 22))
+    stale, fresh = Client(), Client()
+    controller.admit(stale, ("10.0.0.2", 22))
+    clock.now += 20
+    controller.admit(fresh, ("10.0.0.3", 22))
+    clock.now += 15
+
+    # release skips the connection that waited too long and closes it
+    assert controller.release("10.0.0.1") == (fresh, ("10.0.0.3", 22))
+    assert stale.closed and not fresh.closed
+    assert controller.snapshot()["expired"] == 1
+
+    queued = Client()
+    controller.admit(queued, ("10.0.0.4", 22))
+    clock.now += 31
+    controller.expire_pending()
+    assert queued.closed
+    assert controller.snapshot()["pending"] == 0
+    assert "10.0.0.4" not in controller.per_ip
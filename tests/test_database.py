@@ -0,0 +1,54 @@
+"""
+Session rows and auth attempts written through the batching writer
+"""
+import sqlite3
+
+from core import database
+from core.telemetry import CommandTelemetry
+
+
+def _rows(db_file, sql, params=()):
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def test_first_auth_attempt_writes_session_row(honeypot_db):
+    session_id = database.allocate_session_id()
+    database.log_auth_attempt("10.0.0.1", "root", "toor", False, session_id, "2026-01-01T00:00:00")
+    database.log_auth_attempt("10.0.0.1", "root", "123456", False, session_id)
+    database.flush_buffered_writes()
+    assert _rows(honeypot_db, "SELECT ip, username, end_time FROM sessions WHERE id = ?", (session_id,)) == [
+        ("10.0.0.1", "unknown", None)]
+
+    # the restart repair leaves attempts of a session with a row alone
+    database.repair_auth_attempts()
+    assert _rows(honeypot_db, "SELECT COUNT(*) FROM auth_attempts WHERE session_id = ?", (session_id,)) == [(2,)]
+
+    database.log_auth_only_session(session_id, "10.0.0.1", "unknown", False, "2026-01-01T00:00:00")
+    database.flush_buffered_writes()
+    [(end_time,)] = _rows(honeypot_db, "SELECT end_time FROM sessions WHERE id = ?", (session_id,))
+    assert end_time is not None
+
+
+def test_channel_open_updates_row_from_auth(honeypot_db):
+    session_id = database.allocate_session_id()
+    database.log_auth_attempt("10.0.0.2", "haskoli", "secret", True, session_id, "2026-01-01T00:00:00")
+    database.log_session_start(session_id, "10.0.0.2", "haskoli", True, "2026-01-01T00:00:00")
+    database.flush_buffered_writes()
+    assert _rows(honeypot_db, "SELECT username, success FROM sessions WHERE id = ?", (session_id,)) == [("haskoli", 1)]
+
+
+def test_repeated_response_is_stored_once(honeypot_db):
+    session_id = database.allocate_session_id()
+    for _ in range(2):
+        record = CommandTelemetry()
+        record.output("total 0\r\n")
+        record.finish(0)
+        database.log_command(session_id, "ls -l", record)
+    database.flush_buffered_writes()
+    [(digest,), (again,)] = _rows(honeypot_db, "SELECT response_hash FROM commands WHERE session_id = ?", (session_id,))
+    assert digest == again
+    assert _rows(honeypot_db, "SELECT COUNT(*) FROM responses WHERE hash = ?", (digest,)) == [(1,)]
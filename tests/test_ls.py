@@ -0,0 +1,42 @@
+"""
+ls operand handling after glob expansion
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from core.capture import CaptureStore
+from core.virtual_filesystem import VirtualFilesystem
+from core.command_processor import CommandProcessor
+
+SESSION = 1
+
+
+@pytest.fixture
+def processor(tmp_path):
+    filesystem = VirtualFilesystem(str(tmp_path / "fs"))
+    filesystem.captures = CaptureStore(str(tmp_path / "captures"))
+    command_processor = CommandProcessor(filesystem)
+    command_processor.initialize_session(SESSION)
+    for name in ("a.log", "b.log", "c.log"):
+        command_processor.filesystem.write_file(f"/tmp/globbed/{name}", "x\n", SESSION)
+    return command_processor
+
+
+def test_glob_of_files_is_one_listing(processor):
+    output = processor.process_command(SESSION, "ls /tmp/globbed/*.log")
+    assert output == "/tmp/globbed/a.log  /tmp/globbed/b.log  /tmp/globbed/c.log"
+    assert processor.last_exit_code[SESSION] == 0
+
+
+def test_long_glob_of_files_has_no_headers(processor):
+    lines = processor.process_command(SESSION, "ls -l /tmp/globbed/*.log").split("\n")
+    assert len(lines) == 3
+    assert [line.rsplit(" ", 1)[1] for line in lines] == [f"/tmp/globbed/{name}" for name in ("a.log", "b.log", "c.log")]
+
+
+def test_files_come_before_directory_blocks(processor):
+    output = processor.process_command(SESSION, "ls /tmp/globbed /tmp/globbed/a.log")
+    assert output.split("\n") == ["/tmp/globbed/a.log", "", "/tmp/globbed:", "a.log  b.log  c.log"]
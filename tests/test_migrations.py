@@ -0,0 +1,79 @@
+"""
+Upgrading a honeypot.db created before schema versioning
+"""
+import sqlite3
+
+from core import database
+
+# tables as the unversioned releases created them, user_version 0
+BASELINE_SCHEMA = """
+CREATE TABLE sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ip TEXT NOT NULL,
+    username TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT,
+    success BOOLEAN NOT NULL
+);
+CREATE TABLE commands (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER NOT NULL,
+    command TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    FOREIGN KEY (session_id) REFERENCES sessions(id)
+);
+CREATE TABLE auth_attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER NOT NULL,
+    ip TEXT NOT NULL,
+    username TEXT NOT NULL,
+    password TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    success BOOLEAN NOT NULL,
+    FOREIGN KEY (session_id) REFERENCES sessions(id)
+);
+INSERT INTO sessions VALUES (1, '10.0.0.1', 'haskoli', '2025-01-01T10:00:00', '2025-01-01T10:05:00', 1);
+INSERT INTO sessions VALUES (2, '10.0.0.2', 'unknown', '2025-01-02T10:00:00', NULL, 0);
+INSERT INTO commands VALUES (1, 1, 'uname -a', '2025-01-01T10:01:00');
+INSERT INTO commands VALUES (2, 1, 'cat /etc/passwd', '2025-01-01T10:02:00');
+INSERT INTO auth_attempts VALUES (1, 1, '10.0.0.1', 'haskoli', 'secret', '2025-01-01T10:00:00', 1);
+INSERT INTO auth_attempts VALUES (2, 2, '10.0.0.2', 'root', 'toor', '2025-01-02T10:00:01', 0);
+"""
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def test_baseline_database_is_upgraded_in_place(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "honeypot.db")
+    conn = sqlite3.connect(db_file)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.close()
+    monkeypatch.setattr(database, "DB_FILE", db_file)
+
+    database.init_db()
+    # a second start finds nothing to do
+    database.init_db()
+
+    conn = sqlite3.connect(db_file)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION == 5
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert {"sessions", "commands", "auth_attempts", "captures", "responses"} <= tables
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_commands_session", "idx_auth_attempts_session", "idx_sessions_ip", "idx_commands_handler",
+                "idx_commands_response"} <= indexes
+        assert {"handler", "latency_ms", "response_hash"} <= set(_columns(conn, "commands"))
+
+        # existing rows survive, the telemetry of old commands is simply unknown
+        assert conn.execute("SELECT id, command, handler, response_hash FROM commands ORDER BY id").fetchall() == [
+            (1, "uname -a", None, None), (2, "cat /etc/passwd", None, None)]
+        assert conn.execute("SELECT id, session_id, password FROM auth_attempts ORDER BY id").fetchall() == [
+            (1, 1, "secret"), (2, 2, "toor")]
+        sessions = conn.execute("SELECT id, username, end_time FROM sessions ORDER BY id").fetchall()
+        assert [row[:2] for row in sessions] == [(1, "haskoli"), (2, "unknown")]
+        # the session left open by the last run is closed on start
+        assert sessions[0][2] == "2025-01-01T10:05:00" and sessions[1][2] is not None
+    finally:
+        conn.close()
@@ -0,0 +1,38 @@
+"""
+Output redirection into the file a command reads
+"""
+import pytest
+from core.capture import CaptureStore
+from core.virtual_filesystem import VirtualFilesystem
+from core.command_processor import CommandProcessor
+
+SESSION = 1
+
+
+@pytest.fixture
+def processor(tmp_path):
+    filesystem = VirtualFilesystem(str(tmp_path / "fs"))
+    filesystem.captures = CaptureStore(str(tmp_path / "captures"))
+    command_processor = CommandProcessor(filesystem)
+    command_processor.initialize_session(SESSION)
+    command_processor.filesystem.write_file("/tmp/f", "old content\n", SESSION)
+    return command_processor
+
+
+def test_cat_into_itself_truncates(processor):
+    assert processor.process_command(SESSION, "cat /tmp/f > /tmp/f") == ""
+    assert processor.filesystem.read_file("/tmp/f", SESSION) == ""
+
+
+def test_cat_appended_to_itself_is_refused(processor):
+    output = processor.process_command(SESSION, "cat /tmp/f >> /tmp/f")
+    assert output == "cat: /tmp/f: input file is output file"
+    assert processor.last_exit_code[SESSION] == 1
+    assert processor.filesystem.read_file("/tmp/f", SESSION) == "old content\n"
+
+
+def test_relative_target_is_resolved(processor):
+    processor.process_command(SESSION, "cd /tmp")
+    assert processor.process_command(SESSION, "cat f >> f") == "cat: f: input file is output file"
+    assert processor.process_command(SESSION, "cat f > copy") == ""
+    assert processor.filesystem.read_file("/tmp/copy", SESSION) == "old content\n"
@@ -0,0 +1,84 @@
+"""
+Session layers of the copy-on-write filesystem and their quotas
+"""
+import errno
+
+import pytest
+from core import virtual_filesystem
+from core.capture import CaptureStore
+from core.virtual_filesystem import VirtualFilesystem
+
+SESSION = 1
+
+
+@pytest.fixture
+def filesystem(tmp_path):
+    filesystem = VirtualFilesystem(str(tmp_path / "fs"))
+    filesystem.captures = CaptureStore(str(tmp_path / "captures"))
+    filesystem.initialize_session(SESSION)
+    return filesystem
+
+
+def test_unknown_session_is_stale(filesystem):
+    with pytest.raises(OSError) as error:
+        filesystem.write_file("/tmp/x", "data", 2)
+    assert error.value.errno == errno.ESTALE
+    with pytest.raises(OSError):
+        filesystem.read_file("/etc/passwd", 2)
+
+
+def test_cleaned_up_session_does_not_write_default_layer(filesystem):
+    filesystem.write_file("/tmp/x", "data", SESSION)
+    filesystem.cleanup_session(SESSION)
+    with pytest.raises(OSError):
+        filesystem.append_file("/tmp/x", "more", SESSION)
+    assert not filesystem.default_layer.entries
+    assert not filesystem.file_exists("/tmp/x")
+
+
+@pytest.fixture
+def quota(monkeypatch):
+    monkeypatch.setattr(virtual_filesystem, "SESSION_QUOTA_BYTES", 100)
+    monkeypatch.setattr(virtual_filesystem, "SESSION_QUOTA_INODES", 4)
+
+
+def _layer(filesystem):
+    return filesystem.session_layers[SESSION]
+
+
+def test_write_over_byte_quota_is_rejected(filesystem, quota):
+    assert filesystem.write_file("/tmp/a", "x" * 60, SESSION)
+    with pytest.raises(OSError) as error:
+        filesystem.write_file("/tmp/b", "y" * 60, SESSION)
+    assert error.value.errno == errno.ENOSPC
+    with pytest.raises(OSError):
+        filesystem.append_file("/tmp/a", "z" * 50, SESSION)
+    assert not filesystem.file_exists("/tmp/b", SESSION)
+    assert _layer(filesystem).bytes_used == 60
+    assert filesystem.read_file("/tmp/a", SESSION) == "x" * 60
+
+
+def test_rm_refunds_bytes_and_inodes(filesystem, quota):
+    filesystem.write_file("/tmp/a", "x" * 60, SESSION)
+    assert filesystem.remove_file("/tmp/a", SESSION) == ""
+    assert (_layer(filesystem).bytes_used, _layer(filesystem).inodes_used) == (0, 0)
+    assert filesystem.write_file("/tmp/b", "y" * 90, SESSION)
+
+
+def test_overwrite_charges_only_the_difference(filesystem, quota):
+    filesystem.write_file("/tmp/a", "x" * 90, SESSION)
+    filesystem.write_file("/tmp/a", "x" * 10, SESSION)
+    assert (_layer(filesystem).bytes_used, _layer(filesystem).inodes_used) == (10, 1)
+    assert filesystem.write_file("/tmp/b", "y" * 90, SESSION)
+
+
+def test_inode_quota_counts_created_directories(filesystem, quota):
+    filesystem.write_file("/tmp/one/two/file", "", SESSION)
+    assert _layer(filesystem).inodes_used == 3
+    filesystem.write_file("/tmp/other", "", SESSION)
+    with pytest.raises(OSError) as error:
+        filesystem.write_file("/tmp/more", "", SESSION)
+    assert error.value.errno == errno.ENOSPC
+    filesystem.remove_file("/tmp/one", SESSION, recursive=True)
+    assert _layer(filesystem).inodes_used == 1
+    assert filesystem.write_file("/tmp/more", "", SESSION)
@@ -5,7 +5,7 @@ centralized utility for managing native commands across the honeypot
 # list of native commands explicitly implemented in CommandProcessor
 NATIVE_COMMANDS = [
     # file and Directory Management
-    'ls', 'cd', 'pwd', 'cat', 'echo', 'mkdir', 'rm', 'touch', 'cp', 'mv',
+    'ls', 'cd', 'pwd', 'cat', 'echo', 'mkdir', 'rm', 'touch', 'cp', 'mv', 'stat', 'du',
     
     # system Information
     'whoami', 'uname', 'ps', 'date', 